@@ -1,6 +1,7 @@
 from fastapi import HTTPException, Security, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth
+import asyncio
 import logging
 
 security = HTTPBearer()
@@ -21,12 +22,19 @@ async def verify_firebase_token(
             detail="Invalid authentication credentials"
         )
 
-async def get_current_user(
-    decoded_token: dict = Depends(verify_firebase_token)
-) -> dict:
-    """Get current user from token"""
+async def verify_token(token: str) -> dict:
+    """Verify a raw Firebase ID token (for WebSocket sessions, which can't send headers)"""
+    return await asyncio.to_thread(auth.verify_id_token, token)
+
+def user_from_token(decoded_token: dict) -> dict:
     return {
         "uid": decoded_token['uid'],
         "email": decoded_token.get('email'),
         "name": decoded_token.get('name')
     }
+
+async def get_current_user(
+    decoded_token: dict = Depends(verify_firebase_token)
+) -> dict:
+    """Get current user from token"""
+    return user_from_token(decoded_token)
@@ -0,0 +1,39 @@
+from datetime import date, datetime
+from typing import Any, Collection, List, Optional
+import orjson
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+    # orjson hands datetime subclasses (Firestore timestamps) and unknown types to us
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # Fail loudly like json.dumps rather than send a repr the client can't use
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-backed response. Return it directly from a route to skip
+    FastAPI's jsonable_encoder pass over large lists.
+    """
+    media_type = "application/json"
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def parse_fields(fields: Optional[str], required: List[str], allowed: Collection[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated `fields=` projection, always keeping the required
+    fields. Raises a 400 for fields outside the collection's `allowed` set.
+    """
+    if not fields:
+        return None
+    
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(required + selected))
@@ -0,0 +1,30 @@
+import math
+from fastapi import APIRouter, Depends, HTTPException
+from app.services.briefing_service import briefing_service
+from app.services.admission_control import AdmissionRejected
+from app.api.middleware.auth import get_current_user
+from app.api.responses import FastJSONResponse
+
+router = APIRouter()
+
+@router.get("")
+@router.get("/")
+async def get_briefing(
+    current_user: dict = Depends(get_current_user),
+    refresh: bool = False
+):
+    """
+    Get today's briefing: urgent emails, tasks due, today's events and a summary.
+    Served from the precomputed copy when it is fresh; refresh=true rebuilds it.
+    """
+    try:
+        briefing = await briefing_service.get(current_user['uid'], refresh=refresh)
+        return FastJSONResponse(briefing)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.services.calendar_index import calendar_index
+from app.api.middleware.auth import get_current_user
+from app.api.responses import FastJSONResponse
+from datetime import datetime, timedelta
+
+router = APIRouter()
+
+# Longest window one request may cover
+MAX_RANGE = timedelta(days=31)
+
+def _check_range(start: datetime, end: datetime):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if end - start > MAX_RANGE:
+        raise HTTPException(status_code=400, detail=f"range must be at most {MAX_RANGE.days} days")
+
+@router.get("/events")
+async def get_events(
+    start: datetime,
+    end: datetime,
+    limit: int = 50,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get events that overlap [start, end), in start order"""
+    _check_range(start, end)
+    try:
+        events = await calendar_index.overlapping(current_user['uid'], start, end, limit=limit)
+        return FastJSONResponse({"events": events, "count": len(events)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/freebusy")
+async def get_free_busy(
+    start: datetime,
+    end: datetime,
+    min_minutes: int = 30,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get busy blocks and free slots of at least min_minutes in [start, end)"""
+    _check_range(start, end)
+    try:
+        return FastJSONResponse(await calendar_index.free_busy(current_user['uid'], start, end, min_minutes))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+import math
+import time
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
 from app.models.schemas import ChatRequest, ChatResponse
 from app.services.rag_engine import RAGEngine
-from app.api.middleware.auth import get_current_user
+from app.services.admission_control import AdmissionRejected
+from app.api.middleware.auth import get_current_user, verify_token, user_from_token
+from app.api.responses import FastJSONResponse
+from app.config import settings
+from typing import List
 
 router = APIRouter()
 
+# Most questions one batch request may ask
+MAX_BATCH_QUESTIONS = 10
+
+class ChatBatchRequest(BaseModel):
+    messages: List[str]
+
 @router.post("", response_model=ChatResponse)
 @router.post("/", response_model=ChatResponse)
 async def chat(
@@ -24,9 +38,131 @@ async def chat(
         
         return ChatResponse(**response)
     
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Response generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Answer several questions at once (e.g. dashboard widgets) with shared
+    retrieval and one LLM call. Answers come back in the order asked.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="messages must not be empty")
+    if len(request.messages) > MAX_BATCH_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"at most {MAX_BATCH_QUESTIONS} messages per batch")
+    
+    try:
+        rag_engine = RAGEngine(user_id=current_user['uid'])
+        return FastJSONResponse(await rag_engine.process_batch(request.messages))
+    
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Response generation timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.websocket("/ws")
+async def chat_session(websocket: WebSocket):
+    """
+    Persistent chat session.
+    
+    The client authenticates once with {"type": "auth", "token": ...}, then
+    sends {"type": "message", "message": ..., "conversation_id": ...} per turn
+    and receives "context", "delta" and "done" events as the answer streams.
+    The session keeps one RAGEngine with warm caches for all its turns.
+    Send another auth message to refresh the token before it expires.
+    """
+    await websocket.accept()
+    
+    try:
+        first = await asyncio.wait_for(websocket.receive_json(), timeout=settings.SESSION_AUTH_TIMEOUT_SECONDS)
+        decoded_token = await verify_token(first.get('token', '')) if first.get('type') == 'auth' else None
+    except WebSocketDisconnect:
+        return
+    except Exception:
+        decoded_token = None
+    
+    if decoded_token is None:
+        await websocket.send_json({"type": "error", "status": 401, "detail": "Invalid authentication credentials"})
+        await websocket.close(code=4401)
+        return
+    
+    current_user = user_from_token(decoded_token)
+    expires_at = decoded_token.get('exp', 0)
+    rag_engine = RAGEngine(user_id=current_user['uid'], session=True)
+    conversation_id = None
+    await websocket.send_json({"type": "ready", "uid": current_user['uid']})
+    
+    try:
+        while True:
+            data = await websocket.receive_json()
+            
+            if not isinstance(data, dict):
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Expected a JSON object"})
+                continue
+            
+            if data.get('type') == 'auth':
+                try:
+                    refreshed = await verify_token(data.get('token', ''))
+                except Exception:
+                    refreshed = None
+                if refreshed is None or refreshed['uid'] != current_user['uid']:
+                    await websocket.send_json({"type": "error", "status": 401, "detail": "Invalid authentication credentials"})
+                    continue
+                expires_at = refreshed.get('exp', 0)
+                await websocket.send_json({"type": "ready", "uid": current_user['uid']})
+                continue
+            
+            if time.time() >= expires_at:
+                await websocket.send_json({"type": "error", "status": 401, "detail": "Token expired, send a new auth message"})
+                continue
+            
+            message = (data.get('message') or '').strip()
+            if not message:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "message is required"})
+                continue
+            
+            # Follow-up turns continue the session's conversation unless told otherwise
+            conversation_id = data.get('conversation_id', conversation_id)
+            
+            try:
+                async for event in rag_engine.stream_query(message, conversation_id):
+                    if event['type'] == 'done':
+                        conversation_id = event['conversation_id']
+                    await websocket.send_json(event)
+            except AdmissionRejected as e:
+                await websocket.send_json({
+                    "type": "error",
+                    "status": 429,
+                    "detail": str(e),
+                    "retry_after": math.ceil(e.retry_after)
+                })
+            except asyncio.TimeoutError:
+                await websocket.send_json({"type": "error", "status": 504, "detail": "Response generation timed out"})
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                await websocket.send_json({"type": "error", "status": 500, "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+
 @router.get("/conversations")
 async def get_conversations(
     current_user: dict = Depends(get_current_user)
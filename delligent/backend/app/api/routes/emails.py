@@ -1,42 +1,57 @@
 from fastapi import APIRouter, Depends, HTTPException
 from app.services.firebase_service import firebase_service
+from app.services.sync_service import sync_service
 from app.api.middleware.auth import get_current_user
-from typing import List
+from app.api.responses import FastJSONResponse, parse_fields
+from typing import List, Optional
 
 router = APIRouter()
 
+# Fields an email projection (fields=...) may select
+EMAIL_FIELDS = {
+    "emailId", "threadId", "subject", "sender", "body", "bodyPreview",
+    "receivedAt", "priority", "isRead", "isStarred", "labels", "extractedActions",
+    "summary", "urgencyScore", "createdAt", "updatedAt"
+}
+
 @router.get("")
 @router.get("/")
 async def get_emails(
     current_user: dict = Depends(get_current_user),
-    limit: int = 20
+    limit: int = 20,
+    fields: Optional[str] = None
 ):
     """
-    Get user's emails
+    Get user's emails (fields=subject,sender,... returns only those fields)
     """
+    projection = parse_fields(fields, required=['emailId'], allowed=EMAIL_FIELDS)
     try:
         emails = await firebase_service.get_emails(
             user_id=current_user['uid'],
-            limit=limit
+            limit=limit,
+            fields=projection
         )
-        return {"emails": emails, "count": len(emails)}
+        return FastJSONResponse({"emails": emails, "count": len(emails)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/urgent")
 async def get_urgent_emails(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    fields: Optional[str] = None
 ):
     """
     Get urgent emails
     """
+    projection = parse_fields(fields, required=['emailId'], allowed=EMAIL_FIELDS)
     try:
         emails = await firebase_service.get_emails(
             user_id=current_user['uid'],
             filters={"priority": "high"},
-            limit=10
+            limit=10,
+            fields=projection
         )
-        return {"emails": emails, "count": len(emails)}
+        return FastJSONResponse({"emails": emails, "count": len(emails)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -53,9 +68,17 @@ async def get_email(
 
 @router.post("/sync")
 async def sync_emails(
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    full: bool = False
 ):
     """
-    Trigger email sync (for demo purposes)
+    Incrementally sync the user's mailbox (only new or changed emails are re-embedded)
     """
-    return {"message": "Email sync triggered", "status": "success"}
+    try:
+        result = await sync_service.sync_emails(
+            user_id=current_user['uid'],
+            full=full
+        )
+        return {"message": "Email sync complete", "status": "success", **result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,24 +1,80 @@
 from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
 from app.services.firebase_service import firebase_service
+from app.services.ingestion_pipeline import task_record, index_record
+from app.services.due_date_index import due_date_index
+from app.services.lexical_index import lexical_index
+from app.services.enrichment_service import enrichment_service
+from app.services.working_set import working_sets
 from app.api.middleware.auth import get_current_user
+from app.api.responses import FastJSONResponse, parse_fields
+from datetime import datetime
+from typing import List, Optional
 
 router = APIRouter()
 
+# Fields a task projection (fields=...) may select
+TASK_FIELDS = {
+    "taskId", "title", "description", "dueDate", "priority", "status", "category", "tags",
+    "estimatedHours", "actualHours", "summary", "extractedActions", "urgencyScore",
+    "createdAt", "updatedAt", "completedAt"
+}
+
+class TaskCreate(BaseModel):
+    title: str
+    description: str = ""
+    dueDate: Optional[datetime] = None
+    priority: str = "medium"
+    status: str = "pending"
+    category: Optional[str] = None
+    tags: List[str] = []
+
+class TaskUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    dueDate: Optional[datetime] = None
+    priority: Optional[str] = None
+    status: Optional[str] = None
+    category: Optional[str] = None
+    tags: Optional[List[str]] = None
+
+async def index_task(user_id: str, task: dict, replaces: bool = False):
+    """Keep the indexes, working set, task vectors and enrichment in step with a task write"""
+    due_date_index.apply_task(user_id, task)
+    lexical_index.apply(user_id, 'task', task)
+    enrichment_service.submit('task', task)
+    
+    try:
+        await working_sets.apply(user_id, 'task', [task])
+    except Exception as e:
+        print(f"Error updating working set for task {task.get('taskId')}: {e}")
+    
+    try:
+        record = task_record({**task, 'userId': user_id})
+        # Long descriptions are chunked; an update may leave fewer chunks than before
+        record['replaces'] = replaces
+        await index_record(record)
+    except Exception as e:
+        print(f"Error indexing task {task.get('taskId')}: {e}")
+
 @router.get("")
 @router.get("/")
 async def get_tasks(
     current_user: dict = Depends(get_current_user),
-    limit: int = 20
+    limit: int = 20,
+    fields: Optional[str] = None
 ):
     """
-    Get user's tasks
+    Get user's tasks (fields=title,dueDate,... returns only those fields)
     """
+    projection = parse_fields(fields, required=['taskId'], allowed=TASK_FIELDS)
     try:
         tasks = await firebase_service.get_tasks(
             user_id=current_user['uid'],
-            limit=limit
+            limit=limit,
+            fields=projection
         )
-        return {"tasks": tasks, "count": len(tasks)}
+        return FastJSONResponse({"tasks": tasks, "count": len(tasks)})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -29,26 +85,70 @@ async def get_overdue_tasks(
     """
     Get overdue tasks
     """
-    # TODO: Implement overdue task filtering
-    return {"tasks": [], "count": 0}
+    try:
+        tasks = await due_date_index.overdue(current_user['uid'])
+        return FastJSONResponse({"tasks": tasks, "count": len(tasks)})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/due")
+async def get_due_tasks(
+    current_user: dict = Depends(get_current_user),
+    window: str = "today"
+):
+    """
+    Get open tasks due today or this week
+    """
+    if window not in ("today", "week"):
+        raise HTTPException(status_code=400, detail="window must be 'today' or 'week'")
+    
+    try:
+        if window == "today":
+            tasks = await due_date_index.due_today(current_user['uid'])
+        else:
+            tasks = await due_date_index.due_this_week(current_user['uid'])
+        return FastJSONResponse({"tasks": tasks, "count": len(tasks), "window": window})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/")
 async def create_task(
+    task: TaskCreate,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Create new task
     """
-    # TODO: Implement task creation
-    return {"message": "Task created", "task_id": "task_new"}
+    try:
+        task_data = await firebase_service.create_task(
+            user_id=current_user['uid'],
+            task=task.model_dump()
+        )
+        await index_task(current_user['uid'], task_data)
+        return {"message": "Task created", "task_id": task_data['taskId']}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 @router.patch("/{task_id}")
 async def update_task(
     task_id: str,
+    updates: TaskUpdate,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Update task
     """
-    # TODO: Implement task update
+    try:
+        task_data = await firebase_service.update_task(
+            user_id=current_user['uid'],
+            task_id=task_id,
+            updates=updates.model_dump(exclude_unset=True)
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if task_data is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    await index_task(current_user['uid'], task_data, replaces=True)
     return {"message": "Task updated", "task_id": task_id}
@@ -15,6 +15,82 @@ class Settings:
     PINECONE_ENVIRONMENT: str = os.getenv("PINECONE_ENVIRONMENT", "")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "employee-assistant")
     
+    # Retrieval
+    RETRIEVAL_BUDGET_MS: int = int(os.getenv("RETRIEVAL_BUDGET_MS", "800"))
+    # Users whose in-memory indexes (keywords, due dates, calendar, working set) stay loaded
+    INDEX_MAX_USERS: int = int(os.getenv("INDEX_MAX_USERS", "500"))
+    
+    # Vector quantization: none | int8 | binary (compressed in-memory copies, rescored at full precision)
+    VECTOR_QUANTIZATION: str = os.getenv("VECTOR_QUANTIZATION", "none")
+    VECTOR_RESCORE_MULTIPLIER: int = int(os.getenv("VECTOR_RESCORE_MULTIPLIER", "4"))
+    VECTOR_LOCAL_INDEX_MAX_USERS: int = int(os.getenv("VECTOR_LOCAL_INDEX_MAX_USERS", "256"))
+    
+    # Chunking (long documents get one vector per chunk)
+    CHUNK_MAX_CHARS: int = int(os.getenv("CHUNK_MAX_CHARS", "2000"))
+    CHUNK_OVERLAP_CHARS: int = int(os.getenv("CHUNK_OVERLAP_CHARS", "200"))
+    CHUNK_AGGREGATION: str = os.getenv("CHUNK_AGGREGATION", "max")  # max | sum
+    CHUNK_SUM_TOP: int = int(os.getenv("CHUNK_SUM_TOP", "2"))
+    
+    # Deadlines (milliseconds)
+    REQUEST_DEADLINE_MS: int = int(os.getenv("REQUEST_DEADLINE_MS", "20000"))
+    RETRIEVAL_DEADLINE_MS: int = int(os.getenv("RETRIEVAL_DEADLINE_MS", "2500"))
+    RETRIEVAL_CALL_TIMEOUT_MS: int = int(os.getenv("RETRIEVAL_CALL_TIMEOUT_MS", "1500"))
+    RETRIEVAL_HEDGE_AFTER_MS: int = int(os.getenv("RETRIEVAL_HEDGE_AFTER_MS", "400"))
+    LLM_TIMEOUT_MS: int = int(os.getenv("LLM_TIMEOUT_MS", "15000"))
+    
+    # LLM
+    LLM_CONTEXT_CACHE: bool = os.getenv("LLM_CONTEXT_CACHE", "false").lower() == "true"
+    LLM_CONTEXT_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+    
+    # Enrichment (summary, action items and urgency computed once per item at ingestion)
+    ENRICHMENT_ENABLED: bool = os.getenv("ENRICHMENT_ENABLED", "true").lower() == "true"
+    ENRICHMENT_BATCH_SIZE: int = int(os.getenv("ENRICHMENT_BATCH_SIZE", "10"))
+    ENRICHMENT_MAX_WAIT_SECONDS: float = float(os.getenv("ENRICHMENT_MAX_WAIT_SECONDS", "5"))
+    
+    # Working set (materialized recent emails and open tasks per user)
+    WORKING_SET_ENABLED: bool = os.getenv("WORKING_SET_ENABLED", "true").lower() == "true"
+    WORKING_SET_EMAILS: int = int(os.getenv("WORKING_SET_EMAILS", "50"))
+    WORKING_SET_TASKS: int = int(os.getenv("WORKING_SET_TASKS", "100"))
+    WORKING_SET_MAX_AGE_SECONDS: int = int(os.getenv("WORKING_SET_MAX_AGE_SECONDS", "3600"))
+    
+    # Calendar (working hours that availability questions are answered within)
+    WORKDAY_START_HOUR: int = int(os.getenv("WORKDAY_START_HOUR", "9"))
+    WORKDAY_END_HOUR: int = int(os.getenv("WORKDAY_END_HOUR", "18"))
+    
+    # Daily briefings (precomputed at BRIEFING_HOUR local time, refreshed after data changes)
+    BRIEFING_SCHEDULER_ENABLED: bool = os.getenv("BRIEFING_SCHEDULER_ENABLED", "true").lower() == "true"
+    BRIEFING_HOUR: int = int(os.getenv("BRIEFING_HOUR", "6"))
+    BRIEFING_RELOAD_SECONDS: int = int(os.getenv("BRIEFING_RELOAD_SECONDS", "300"))
+    BRIEFING_REFRESH_DELAY_SECONDS: int = int(os.getenv("BRIEFING_REFRESH_DELAY_SECONDS", "120"))
+    BRIEFING_CONCURRENCY: int = int(os.getenv("BRIEFING_CONCURRENCY", "4"))
+    
+    # Conversation persistence (write-behind: turns are acknowledged at once and written in batches)
+    CONVERSATION_WRITE_BEHIND: bool = os.getenv("CONVERSATION_WRITE_BEHIND", "true").lower() == "true"
+    CONVERSATION_FLUSH_INTERVAL_MS: int = int(os.getenv("CONVERSATION_FLUSH_INTERVAL_MS", "250"))
+    CONVERSATION_FLUSH_MAX_TURNS: int = int(os.getenv("CONVERSATION_FLUSH_MAX_TURNS", "100"))
+    CONVERSATION_WRITE_RETRIES: int = int(os.getenv("CONVERSATION_WRITE_RETRIES", "5"))
+    
+    # Chat sessions (WebSocket)
+    SESSION_CONTEXT_TTL_SECONDS: int = int(os.getenv("SESSION_CONTEXT_TTL_SECONDS", "60"))
+    SESSION_AUTH_TIMEOUT_SECONDS: int = int(os.getenv("SESSION_AUTH_TIMEOUT_SECONDS", "10"))
+    
+    # Admission control
+    LLM_MAX_CONCURRENT: int = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+    LLM_MAX_QUEUE: int = int(os.getenv("LLM_MAX_QUEUE", "32"))
+    LLM_USER_RATE_PER_MINUTE: float = float(os.getenv("LLM_USER_RATE_PER_MINUTE", "20"))
+    LLM_USER_BURST: int = int(os.getenv("LLM_USER_BURST", "5"))
+    EMBEDDING_MAX_CONCURRENT: int = int(os.getenv("EMBEDDING_MAX_CONCURRENT", "16"))
+    EMBEDDING_MAX_QUEUE: int = int(os.getenv("EMBEDDING_MAX_QUEUE", "64"))
+    ADMISSION_MAX_WAIT_MS: int = int(os.getenv("ADMISSION_MAX_WAIT_MS", "5000"))
+    
+    # Circuit breakers (per backend)
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS: float = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+    CIRCUIT_SLOW_CALL_MS: int = int(os.getenv("CIRCUIT_SLOW_CALL_MS", "10000"))
+    
+    # Responses
+    GZIP_MIN_SIZE: int = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+    
     # CORS
     CORS_ORIGINS: list = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
     
@@ -1,13 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import chat, emails, tasks
+from fastapi.middleware.gzip import GZipMiddleware
+from app.api.routes import chat, emails, tasks, briefing, calendar
 from app.config import settings
+from app.services.circuit_breaker import breaker_states
+from app.services.admission_control import admission_metrics
+from app.services.singleflight import flight_metrics
+from app.services.scheduler import briefing_scheduler
+from app.services.conversation_writer import conversation_writer
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background jobs run for the lifetime of the worker
+    if settings.BRIEFING_SCHEDULER_ENABLED:
+        briefing_scheduler.start()
+    yield
+    await briefing_scheduler.stop()
+    # Queued chat turns are written before the worker exits
+    await conversation_writer.stop()
 
 app = FastAPI(
     title="Employee Work Assistant API",
     description="RAG-powered personal work assistant for employees",
     version="1.0.0",
-    redirect_slashes=False  # Disable automatic trailing slash redirects
+    redirect_slashes=False,  # Disable automatic trailing slash redirects
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -19,10 +37,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (list endpoints); small ones aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=settings.GZIP_MIN_SIZE)
+
 # Include routers
 app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(emails.router, prefix="/api/emails", tags=["emails"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
+app.include_router(briefing.router, prefix="/api/briefing", tags=["briefing"])
+app.include_router(calendar.router, prefix="/api/calendar", tags=["calendar"])
 
 @app.get("/")
 async def root():
@@ -34,4 +57,14 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    circuits = breaker_states()
+    degraded = any(circuit['state'] != "closed" for circuit in circuits.values())
+    return {"status": "degraded" if degraded else "healthy", "circuits": circuits}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "admission": admission_metrics(),
+        "circuits": breaker_states(),
+        "coalescing": flight_metrics()
+    }
@@ -0,0 +1,194 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from app.config import settings
+from app.services.resilience import remaining
+
+# Drop idle (full) per-user buckets once this many are tracked
+MAX_TRACKED_USERS = 10000
+
+# How often background work waiting for a low-priority slot checks again
+BACKGROUND_POLL_SECONDS = 0.5
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't be admitted; maps to HTTP 429"""
+    
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many requests ({reason}), retry in {math.ceil(retry_after)}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def take(self) -> float:
+        """Take a token; returns 0 on success, else seconds until one is available"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+    
+    @property
+    def full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class AdmissionController:
+    """
+    Admission control for one expensive backend call (generation, embedding).
+    
+    - Per-user token buckets stop a single user from bursting through the quota.
+    - A global concurrency limit caps in-flight calls.
+    - Callers over the limit wait in a bounded queue until their deadline;
+      a full queue or an expired wait is rejected straight away with a
+      Retry-After estimate instead of piling up.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int,
+        user_rate_per_minute: Optional[float] = None,
+        user_burst: int = 5,
+        max_wait_seconds: float = 5.0
+    ):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.user_rate = user_rate_per_minute / 60 if user_rate_per_minute else None
+        self.user_burst = user_burst
+        self.max_wait_seconds = max_wait_seconds
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._active = 0
+        self._waiting = 0
+        self._hold_seconds = 1.0
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+    
+    def _reject(self, reason: str, retry_after: float):
+        self._rejected[reason] += 1
+        raise AdmissionRejected(reason, max(1.0, retry_after))
+    
+    def _queue_retry_after(self) -> float:
+        # Time for the queue ahead to drain at the observed hold time
+        return self._hold_seconds * (self._waiting + 1) / self.max_concurrent
+    
+    def reserve(self, user_id: str):
+        """Charge the user's bucket; raises AdmissionRejected when they are over their rate"""
+        if self.user_rate is None:
+            return
+        
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_USERS:
+                self._buckets = {uid: b for uid, b in self._buckets.items() if not b.full}
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        
+        wait = bucket.take()
+        if wait > 0:
+            self._reject("rate_limited", wait)
+    
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        """Hold one of the concurrent slots, waiting in the queue until the deadline"""
+        if self._semaphore.locked():
+            if self._waiting >= self.max_queue:
+                self._reject("queue_full", self._queue_retry_after())
+            
+            timeout = self.max_wait_seconds
+            if deadline is not None:
+                timeout = min(timeout, remaining(deadline))
+            
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+            except asyncio.TimeoutError:
+                self._reject("queue_timeout", self._queue_retry_after())
+            finally:
+                self._waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        
+        async with self._held():
+            yield
+    
+    @asynccontextmanager
+    async def background_slot(self, headroom: int = 1):
+        """
+        Low-priority slot for background work: waits (never rejected) until
+        no interactive caller is queued and `headroom` slots would stay free.
+        """
+        # Keep at least one slot usable, or a limit of 1 would never admit background work
+        headroom = min(headroom, self.max_concurrent - 1)
+        while self._waiting or self._active + headroom >= self.max_concurrent:
+            await asyncio.sleep(BACKGROUND_POLL_SECONDS)
+        await self._semaphore.acquire()
+        
+        async with self._held():
+            yield
+    
+    @asynccontextmanager
+    async def _held(self):
+        """Bookkeeping around an acquired slot; releases it on exit"""
+        self._active += 1
+        self._admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - started)
+    
+    def metrics(self) -> Dict:
+        return {
+            "active": self._active,
+            "queue_depth": self._waiting,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+            "avg_hold_ms": round(self._hold_seconds * 1000, 1),
+            "tracked_users": len(self._buckets)
+        }
+
+generation_admission = AdmissionController(
+    "generation",
+    max_concurrent=settings.LLM_MAX_CONCURRENT,
+    max_queue=settings.LLM_MAX_QUEUE,
+    user_rate_per_minute=settings.LLM_USER_RATE_PER_MINUTE,
+    user_burst=settings.LLM_USER_BURST,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_MS / 1000
+)
+
+embedding_admission = AdmissionController(
+    "embedding",
+    max_concurrent=settings.EMBEDDING_MAX_CONCURRENT,
+    max_queue=settings.EMBEDDING_MAX_QUEUE,
+    max_wait_seconds=settings.ADMISSION_MAX_WAIT_MS / 1000
+)
+
+def admission_metrics() -> Dict[str, Dict]:
+    return {
+        "generation": generation_admission.metrics(),
+        "embedding": embedding_admission.metrics()
+    }
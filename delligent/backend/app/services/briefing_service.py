@@ -0,0 +1,210 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from app.config import settings
+from app.services.firebase_service import firebase_service
+from app.services.due_date_index import due_date_index
+from app.services.calendar_index import calendar_index
+from app.services.working_set import working_sets
+from app.services.llm_service import llm_service
+from app.services.admission_control import generation_admission
+from app.services.resilience import deadline_in
+from app.services.dedup import collapse_near_duplicates
+from app.services.data_version import data_versions
+from app.services.singleflight import SingleFlight
+from app.services.query_classifier import normalize_query
+from app.services.time_utils import to_epoch
+
+BRIEFING_QUERY = (
+    "Give me my briefing for today: the urgent emails that need my attention, "
+    "the tasks that are overdue or due today, and today's meetings."
+)
+
+# "What do I need to do today?" and its variations
+BRIEFING_PATTERNS = [
+    r"\bbriefing\b",
+    r"\bwhat (do|should) i (need to )?(do|focus on|work on) today\b",
+    r"\bwhat('s| is) on (my plate|my agenda|for today)\b",
+    r"\b(plan|overview|summary) (of|for) (my|the) day\b",
+    r"\btoday'?s (priorities|agenda|plan)\b",
+    r"\bmy day\b"
+]
+
+# Fields kept per item in the stored artifact
+EMAIL_FIELDS = ("emailId", "subject", "sender", "receivedAt", "priority", "summary", "extractedActions", "urgencyScore")
+TASK_FIELDS = ("taskId", "title", "dueDate", "priority", "status")
+EVENT_FIELDS = ("eventId", "title", "startTime", "endTime", "location")
+
+# Urgent emails considered for a briefing: high priority, received in this window
+URGENT_EMAIL_WINDOW = timedelta(days=2)
+
+# Candidates read from the working set (most recent first) before the window filter
+URGENT_EMAIL_CANDIDATES = 50
+
+
+def is_briefing_query(query: str) -> bool:
+    normalized = normalize_query(query)
+    return any(re.search(pattern, normalized) for pattern in BRIEFING_PATTERNS)
+
+
+def _project(item: Dict, fields: Tuple[str, ...]) -> Dict:
+    return {field: item[field] for field in fields if field in item}
+
+
+class BriefingService:
+    """
+    Per-user daily briefing: urgent emails, tasks overdue or due today,
+    today's events and an LLM summary of them.
+    
+    Briefings are precomputed by the scheduler and stored in Firestore
+    (`briefings/{userId}`, with a version bumped on every rebuild), so "what
+    do I need to do today?" is a document read instead of a live pipeline run.
+    A briefing stays good all day; data changes trigger a rebuild instead.
+    
+    Each briefing records when its data was read (`dataAsOf`); a stored copy
+    read before this worker's latest write to the user's data is stale.
+    """
+    
+    def __init__(self):
+        # user_id -> (briefing, data version it was built or loaded at, monotonic load time)
+        self._briefings: Dict[str, Tuple[Dict, int, float]] = {}
+        # user_id -> when this worker last wrote the user's data
+        self._written_at: Dict[str, datetime] = {}
+        self.builds = SingleFlight("briefings")
+        data_versions.subscribe(self._on_write)
+    
+    def _on_write(self, user_id: str):
+        self._written_at[user_id] = datetime.now(timezone.utc)
+    
+    def _predates_write(self, user_id: str, briefing: Dict) -> bool:
+        """Whether the briefing was built from data read before the user's latest local write"""
+        written_at = self._written_at.get(user_id)
+        if written_at is None:
+            return False
+        data_as_of = briefing.get('dataAsOf')
+        return not isinstance(data_as_of, datetime) or data_as_of < written_at
+    
+    def _is_fresh(self, user_id: str, entry: Optional[Tuple[Dict, int, float]]) -> bool:
+        """Today's, not degraded, and no local writes since"""
+        if entry is None:
+            return False
+        
+        briefing, data_version, _ = entry
+        return (
+            briefing.get('date') == datetime.now().date().isoformat()
+            and not briefing.get('degraded')
+            and data_version == data_versions.get(user_id)
+        )
+    
+    def has_today(self, user_id: str) -> bool:
+        """Whether this worker holds a briefing for the user from today (fresh or not)"""
+        entry = self._briefings.get(user_id)
+        return entry is not None and entry[0].get('date') == datetime.now().date().isoformat()
+    
+    async def cached(self, user_id: str) -> Optional[Dict]:
+        """A fresh briefing from memory or Firestore, without building one"""
+        entry = self._briefings.get(user_id)
+        # Re-read the stored copy now and then, to pick up rebuilds made by other workers
+        if self._is_fresh(user_id, entry) and time.monotonic() - entry[2] < settings.BRIEFING_RELOAD_SECONDS:
+            return entry[0]
+        
+        data_version = data_versions.get(user_id)
+        stored = await firebase_service.get_briefing(user_id)
+        if stored is None or self._predates_write(user_id, stored):
+            return None
+        
+        entry = (stored, data_version, time.monotonic())
+        if not self._is_fresh(user_id, entry):
+            return None
+        self._briefings[user_id] = entry
+        return stored
+    
+    async def get(self, user_id: str, refresh: bool = False) -> Dict:
+        """
+        The user's briefing, built now if there is no fresh one (or refresh is set).
+        Raises AdmissionRejected when a build can't be admitted.
+        """
+        if not refresh:
+            briefing = await self.cached(user_id)
+            if briefing is not None:
+                return briefing
+        return await self.refresh(user_id)
+    
+    async def refresh(self, user_id: str, background: bool = False) -> Dict:
+        """
+        Rebuild and store the briefing; concurrent rebuilds for a user share one run.
+        User-triggered builds are admitted like chat generations (per-user rate
+        and a bounded queue); scheduled builds (background) wait for a
+        low-priority slot instead.
+        """
+        if not background:
+            generation_admission.reserve(user_id)
+        return await self.builds.do(user_id, lambda: self._build(user_id, background))
+    
+    async def _build(self, user_id: str, background: bool) -> Dict:
+        data_version = data_versions.get(user_id)
+        data_as_of = datetime.now(timezone.utc)
+        now = datetime.now()
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        emails, overdue, due_today, events, previous = await asyncio.gather(
+            working_sets.emails(user_id, priority="high", limit=URGENT_EMAIL_CANDIDATES),
+            due_date_index.overdue(user_id, now),
+            due_date_index.due_today(user_id, now),
+            calendar_index.overlapping(user_id, start_of_day, start_of_day + timedelta(days=1)),
+            firebase_service.get_briefing(user_id)
+        )
+        
+        # Most urgent recent emails first (enriched urgency, then recency)
+        recent_after = to_epoch(now - URGENT_EMAIL_WINDOW)
+        emails = [email for email in emails if (to_epoch(email.get('receivedAt')) or 0) >= recent_after]
+        emails.sort(key=lambda email: (email.get('urgencyScore', 0), to_epoch(email.get('receivedAt')) or 0), reverse=True)
+        
+        items = collapse_near_duplicates(
+            [{**email, 'type': 'email', 'relevance': 1.0} for email in emails[:5]]
+            + [{**task, 'type': 'task', 'relevance': 1.0} for task in overdue + due_today]
+            + [{**event, 'type': 'event', 'relevance': 1.0} for event in events]
+        )
+        sources = [
+            {
+                "type": item['type'],
+                "id": item.get('emailId') or item.get('taskId') or item.get('eventId', ''),
+                "title": item.get('subject') or item.get('title', ''),
+                "relevance": 1.0
+            }
+            for item in items
+        ]
+        
+        if background:
+            admission = generation_admission.background_slot()
+        else:
+            admission = generation_admission.slot(deadline_in(settings.REQUEST_DEADLINE_MS / 1000))
+        async with admission:
+            response = await llm_service.generate_response(
+                query=BRIEFING_QUERY,
+                context={"items": items, "sources": sources, "partial": False},
+                user_id=user_id
+            )
+        
+        briefing = {
+            "userId": user_id,
+            "date": now.date().isoformat(),
+            "version": (previous or {}).get('version', 0) + 1,
+            "generatedAt": datetime.now(timezone.utc),
+            "dataAsOf": data_as_of,
+            "summary": response['response'],
+            "degraded": response.get('degraded', False),
+            "tokensUsed": response['tokens_used'],
+            "emails": [_project(item, EMAIL_FIELDS) for item in items if item['type'] == 'email'],
+            "tasks": [_project(item, TASK_FIELDS) for item in items if item['type'] == 'task'],
+            "events": [_project(item, EVENT_FIELDS) for item in items if item['type'] == 'event'],
+            "sources": sources
+        }
+        
+        await firebase_service.save_briefing(user_id, briefing)
+        self._briefings[user_id] = (briefing, data_version, time.monotonic())
+        return briefing
+
+briefing_service = BriefingService()
@@ -0,0 +1,220 @@
+import bisect
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.firebase_service import firebase_service
+from app.services.user_indexes import UserIndexCache
+from app.services.time_utils import to_epoch, day_bounds
+
+# Rebuild from Firestore after this long, to pick up writes made by other workers
+INDEX_TTL_SECONDS = 300
+
+# Events stored without an end time block this long
+DEFAULT_EVENT_MINUTES = 30
+
+EVENT_FIELDS = ["eventId", "title", "startTime", "endTime", "location", "attendees"]
+
+# Hours an availability question covers when it names a part of the day
+DAY_PARTS = {
+    "morning": (settings.WORKDAY_START_HOUR, 12),
+    "afternoon": (12, settings.WORKDAY_END_HOUR),
+    "evening": (settings.WORKDAY_END_HOUR, 21)
+}
+
+
+def _from_epoch(seconds: float) -> datetime:
+    # Epochs come from to_epoch, which reads naive datetimes as UTC
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+class IntervalTree:
+    """
+    Static interval tree over events: an implicit balanced BST on the events
+    sorted by start, where each node also holds the latest end in its
+    subtree. Overlap queries prune subtrees that end before the window or
+    start after it, so they take O(log n + k).
+    """
+    
+    def __init__(self, intervals: List[Tuple[float, float, Dict]]):
+        self.intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.starts = [interval[0] for interval in self.intervals]
+        self.max_end = [0.0] * len(self.intervals)
+        self._build(0, len(self.intervals))
+    
+    def __len__(self) -> int:
+        return len(self.intervals)
+    
+    def _build(self, low: int, high: int) -> float:
+        if low >= high:
+            return float("-inf")
+        
+        mid = (low + high) // 2
+        self.max_end[mid] = max(self.intervals[mid][1], self._build(low, mid), self._build(mid + 1, high))
+        return self.max_end[mid]
+    
+    def overlapping(self, start: float, end: float) -> List[Tuple[float, float, Dict]]:
+        """Intervals with interval.start < end and interval.end > start, in start order"""
+        found: List[Tuple[float, float, Dict]] = []
+        self._overlapping(0, len(self.intervals), start, end, found)
+        return found
+    
+    def _overlapping(self, low: int, high: int, start: float, end: float, found: List):
+        if low >= high:
+            return
+        
+        mid = (low + high) // 2
+        if self.max_end[mid] <= start:
+            # Everything in this subtree is over before the window opens
+            return
+        
+        self._overlapping(low, mid, start, end, found)
+        interval = self.intervals[mid]
+        if interval[0] >= end:
+            # The right subtree starts even later
+            return
+        if interval[1] > start:
+            found.append(interval)
+        self._overlapping(mid + 1, high, start, end, found)
+    
+    def starting_between(self, start: float, end: float) -> List[Tuple[float, float, Dict]]:
+        """Intervals with start <= interval.start < end"""
+        low = bisect.bisect_left(self.starts, start)
+        high = bisect.bisect_left(self.starts, end)
+        return self.intervals[low:high]
+
+
+class UserCalendar:
+    """One user's events, indexed by [startTime, endTime)"""
+    
+    def __init__(self, events: List[Dict]):
+        intervals = []
+        for event in events:
+            start = to_epoch(event.get('startTime'))
+            if start is None:
+                continue
+            end = to_epoch(event.get('endTime'))
+            if end is None or end <= start:
+                end = start + DEFAULT_EVENT_MINUTES * 60
+            intervals.append((start, end, event))
+        
+        self.tree = IntervalTree(intervals)
+    
+    def busy(self, start: float, end: float) -> List[Dict]:
+        """Overlapping events merged into busy blocks, clipped to the window"""
+        blocks: List[Dict] = []
+        for event_start, event_end, event in self.tree.overlapping(start, end):
+            event_start, event_end = max(event_start, start), min(event_end, end)
+            if blocks and event_start <= blocks[-1]['end']:
+                blocks[-1]['end'] = max(blocks[-1]['end'], event_end)
+                blocks[-1]['events'].append(event)
+            else:
+                blocks.append({"start": event_start, "end": event_end, "events": [event]})
+        return blocks
+    
+    def free(self, start: float, end: float, min_minutes: int = 30) -> List[Tuple[float, float]]:
+        """Gaps of at least min_minutes between busy blocks inside the window"""
+        slots = []
+        cursor = start
+        for block in self.busy(start, end) + [{"start": end, "end": end}]:
+            if block['start'] - cursor >= min_minutes * 60:
+                slots.append((cursor, block['start']))
+            cursor = max(cursor, block['end'])
+        return slots
+
+
+class CalendarIndex:
+    """
+    Per-user interval index over calendar events for range, overlap and
+    free/busy queries, built in the background from one Firestore fetch per
+    user. Events are only written outside this service (calendar imports),
+    so the index is refreshed on a timer: it is rebuilt once it is older
+    than INDEX_TTL_SECONDS.
+    """
+    
+    def __init__(self):
+        self._users: UserIndexCache[UserCalendar] = UserIndexCache("calendar", self._build, INDEX_TTL_SECONDS)
+    
+    async def _build(self, user_id: str) -> UserCalendar:
+        query = firebase_service.db.collection('calendar_events').where('userId', '==', user_id).select(EVENT_FIELDS)
+        return UserCalendar(await firebase_service.fetch(query))
+    
+    async def overlapping(
+        self,
+        user_id: str,
+        start_time: datetime,
+        end_time: datetime,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Events that overlap [start_time, end_time), in start order"""
+        calendar = await self._users.get(user_id)
+        events = calendar.tree.overlapping(to_epoch(start_time), to_epoch(end_time))
+        return [dict(event) for _, _, event in events[:limit]]
+    
+    async def starting_between(
+        self,
+        user_id: str,
+        start_time: datetime,
+        end_time: datetime,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """Events that start in [start_time, end_time), in start order"""
+        calendar = await self._users.get(user_id)
+        events = calendar.tree.starting_between(to_epoch(start_time), to_epoch(end_time))
+        return [dict(event) for _, _, event in events[:limit]]
+    
+    async def free_busy(
+        self,
+        user_id: str,
+        start_time: datetime,
+        end_time: datetime,
+        min_minutes: int = 30
+    ) -> Dict:
+        """Busy blocks (with their events) and free slots of at least min_minutes in the window"""
+        calendar = await self._users.get(user_id)
+        start, end = to_epoch(start_time), to_epoch(end_time)
+        
+        return {
+            "start": _from_epoch(start),
+            "end": _from_epoch(end),
+            "busy": [
+                {
+                    "start": _from_epoch(block['start']),
+                    "end": _from_epoch(block['end']),
+                    "events": [
+                        {"eventId": event.get('eventId'), "title": event.get('title')}
+                        for event in block['events']
+                    ]
+                }
+                for block in calendar.busy(start, end)
+            ],
+            "free": [
+                {"start": _from_epoch(slot_start), "end": _from_epoch(slot_end)}
+                for slot_start, slot_end in calendar.free(start, end, min_minutes)
+            ]
+        }
+
+
+def availability_windows(intent: Dict, now: Optional[datetime] = None) -> List[Tuple[datetime, datetime]]:
+    """
+    The windows an availability question asks about: one per day of its
+    time range (today by default), narrowed to working hours or the named
+    part of the day, leaving out time that has already passed.
+    """
+    now = now or datetime.now()
+    first_day, last_day = day_bounds(intent.get('time_range'), now)
+    
+    start_hour, end_hour = DAY_PARTS.get(
+        intent.get('day_part'),
+        (settings.WORKDAY_START_HOUR, settings.WORKDAY_END_HOUR)
+    )
+    
+    windows = []
+    for offset in range((last_day - first_day).days):
+        day = first_day + timedelta(days=offset)
+        start = max(day + timedelta(hours=start_hour), now)
+        end = day + timedelta(hours=end_hour)
+        if start < end:
+            windows.append((start, end))
+    return windows
+
+calendar_index = CalendarIndex()
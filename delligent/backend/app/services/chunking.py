@@ -0,0 +1,94 @@
+import re
+from typing import List, Tuple
+from app.config import settings
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def _pieces(text: str, max_chars: int) -> List[Tuple[str, str]]:
+    """
+    Split text into paragraphs, then sentences, then hard slices, each at most
+    max_chars. Each piece comes with the separator that joins it to the one before.
+    """
+    pieces = []
+    for paragraph in PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, "\n\n"))
+            continue
+        
+        separator = "\n\n"
+        for sentence in SENTENCE_END.split(paragraph):
+            # A "sentence" with no punctuation (logs, pasted tables) still has to fit
+            for start in range(0, len(sentence), max_chars):
+                pieces.append((sentence[start:start + max_chars], separator))
+                separator = " "
+    return pieces
+
+
+def _join(pieces: List[Tuple[str, str]]) -> str:
+    return "".join(
+        piece if i == 0 else separator + piece
+        for i, (piece, separator) in enumerate(pieces)
+    )
+
+
+def chunk_text(
+    text: str,
+    max_chars: int = settings.CHUNK_MAX_CHARS,
+    overlap_chars: int = settings.CHUNK_OVERLAP_CHARS,
+    header: str = ""
+) -> List[str]:
+    """
+    Split text into chunks of at most max_chars on paragraph and sentence
+    boundaries. Consecutive chunks share up to overlap_chars of whole pieces,
+    and every chunk after the first starts with `header` so it stays
+    attributable (e.g. the subject line).
+    """
+    if len(text) <= max_chars:
+        return [text]
+    
+    budget = max_chars - len(header) - 1 if header else max_chars
+    chunks: List[str] = []
+    current: List[Tuple[str, str]] = []
+    size = 0
+    
+    # Sizes count two characters per piece for the separator
+    for piece, separator in _pieces(text, budget - 2):
+        if current and size + len(piece) + 2 > budget:
+            chunks.append(_join(current))
+            
+            # Carry trailing pieces forward as overlap
+            overlap: List[Tuple[str, str]] = []
+            overlap_size = 0
+            for previous in reversed(current):
+                if overlap_size + len(previous[0]) + 2 > overlap_chars:
+                    break
+                overlap.insert(0, previous)
+                overlap_size += len(previous[0]) + 2
+            current, size = overlap, overlap_size
+            
+            # Overlap never pushes a chunk over budget
+            while current and size + len(piece) + 2 > budget:
+                size -= len(current.pop(0)[0]) + 2
+        
+        current.append((piece, separator))
+        size += len(piece) + 2
+    
+    if current:
+        chunks.append(_join(current))
+    
+    if header:
+        chunks = [chunks[0]] + [f"{header}\n{chunk}" for chunk in chunks[1:]]
+    return chunks
+
+
+def chunk_document(text: str) -> List[str]:
+    """Chunk an item's embedding text; its first line (Subject:/Title:) heads every chunk"""
+    header = text.split("\n", 1)[0]
+    if len(header) > settings.CHUNK_MAX_CHARS // 4:
+        header = ""
+    return chunk_text(text, header=header)
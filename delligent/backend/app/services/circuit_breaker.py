@@ -0,0 +1,143 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from app.config import settings
+from app.services.resilience import HEDGE_LOST
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+    
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Per-backend circuit breaker.
+    
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail immediately with CircuitOpenError. Once `reset_timeout` has passed, a
+    single probe call is let through (half-open): success closes the circuit,
+    failure opens it again.
+    
+    Calls cancelled by a caller's deadline count as failures once they have
+    run for `slow_call_seconds`, so a hanging backend trips the breaker too.
+    Hedged attempts cancelled because another attempt won don't count.
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        slow_call_seconds: float = 10.0
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+    
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+    
+    @property
+    def available(self) -> bool:
+        """Whether a call made now would be attempted"""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and not self._probing)
+    
+    @property
+    def failures(self) -> int:
+        """Failures since the last success"""
+        return self._failures
+    
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+    
+    def acquire(self) -> bool:
+        """
+        Admit a call made outside call(); returns True if it is the half-open
+        probe. Raises CircuitOpenError otherwise. The caller records the
+        outcome and, for a probe, calls release() when done.
+        """
+        state = self.state
+        if state == CLOSED:
+            return False
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        raise CircuitOpenError(self.name, self.retry_after())
+    
+    def release(self):
+        """End the half-open probe admitted by acquire()"""
+        self._probing = False
+    
+    def record_success(self):
+        self._state = CLOSED
+        self._failures = 0
+    
+    def record_failure(self):
+        self._failures += 1
+        if self._state != CLOSED or self._failures >= self.failure_threshold:
+            if self._state == CLOSED:
+                print(f"Circuit for {self.name} opened after {self._failures} failures")
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+    
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() through the breaker"""
+        probe = self.acquire()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except asyncio.CancelledError as e:
+            if e.args != (HEDGE_LOST,) and time.monotonic() - started >= self.slow_call_seconds:
+                self.record_failure()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        else:
+            self.record_success()
+            return result
+        finally:
+            if probe:
+                self.release()
+    
+    def snapshot(self) -> Dict:
+        return {"state": self.state, "failures": self._failures}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str, slow_call_seconds: Optional[float] = None) -> CircuitBreaker:
+    """Shared breaker for a backend ("gemini", "embedding", "pinecone", "firestore")"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_SECONDS,
+            slow_call_seconds=slow_call_seconds or settings.CIRCUIT_SLOW_CALL_MS / 1000
+        )
+        _breakers[name] = breaker
+    return breaker
+
+def breaker_states() -> Dict[str, Dict]:
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -1,52 +1,134 @@
 import asyncio
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from app.services.firebase_service import firebase_service
 from app.services.vector_service import vector_service
 from app.services.embedding_service import embedding_service
+from app.services.due_date_index import due_date_index
+from app.services.lexical_index import lexical_index
+from app.services.dedup import collapse_near_duplicates
+from app.services.working_set import working_sets
+from app.services.calendar_index import calendar_index, availability_windows
+from app.services.retrieval_planner import retrieval_planner
+from app.services.resilience import hedged, remaining, deadline_in
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.admission_control import AdmissionRejected
+from app.services.query_classifier import normalize_query
+from app.services.time_utils import day_bounds
+from app.services.cache import TTLCache
+from app.config import settings
+
+# Event questions without a time range are about what's coming up in this many days
+UPCOMING_EVENT_DAYS = 14
+
+EMPTY_VECTOR_RESULTS = {"ids": [[]], "distances": [[]], "metadatas": [[]], "documents": [[]]}
+
+# Errors meaning a source couldn't answer in time (as opposed to a bug), flagged as degraded
+UNAVAILABLE = (asyncio.TimeoutError, CircuitOpenError, AdmissionRejected)
+
+class RetrievalRun:
+    """Per-request retrieval state: the stage deadline and the sources that were unavailable"""
+    
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.degraded: List[str] = []
+    
+    async def call(self, fn, breaker: CircuitBreaker):
+        """
+        Run one backend call with hedging, bounded by the call timeout and the
+        stage deadline. No hedge is sent while the backend's breaker has
+        recent failures: doubling the load on a struggling backend makes it worse.
+        """
+        timeout = settings.RETRIEVAL_CALL_TIMEOUT_MS / 1000
+        return await hedged(
+            fn,
+            hedge_after=settings.RETRIEVAL_HEDGE_AFTER_MS / 1000,
+            attempts=1 if breaker.failures else 2,
+            timeout=min(timeout, remaining(self.deadline))
+        )
+    
+    def missed(self, source: str):
+        if source not in self.degraded:
+            self.degraded.append(source)
 
 class ContextBuilder:
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, embedding_cache: Optional[TTLCache] = None):
         self.user_id = user_id
         self.max_context_items = 10
+        # Set for long-lived sessions: repeated queries skip the embedding call
+        self.embedding_cache = embedding_cache
     
-    async def build_context(self, query: str, intent: Dict) -> Dict:
-        """Build context from Firebase + Vector DB"""
+    async def build_context(
+        self,
+        query: str,
+        intent: Dict,
+        deadline: Optional[float] = None,
+        plan: Optional[Dict] = None
+    ) -> Dict:
+        """
+        Build context from Firebase + Vector DB.
         
-        # Generate query embedding (use query-specific embedding for Gemini)
-        query_embedding = await embedding_service.generate_query_embedding(query)
-
+        Retrieval stops at the stage deadline (capped by the request deadline);
+        sources that miss it, or whose circuit is open, are left out and
+        flagged in the returned sources.
+        """
+        run = RetrievalRun(deadline_in(settings.RETRIEVAL_DEADLINE_MS / 1000, cap=deadline))
+        
+        # Decide which sources to hit, whether to embed, and top-k per source
+        if plan is None:
+            plan = retrieval_planner.plan(query, intent)
+        sources = plan['sources']
+        if plan['vectors_down']:
+            run.missed("vector")
+        
+        vector_search = None
+        if plan['embed']:
+            # One vector query covers every source; retrievers share its result
+            vector_search = asyncio.ensure_future(self._vector_search(run, query, intent, plan))
         
         # Parallel retrieval
-        tasks = []
-        
-        for intent_type in intent['intents']:
-            if intent_type == "email_query":
-                tasks.append(self._retrieve_emails(query_embedding, intent))
-            elif intent_type == "task_query":
-                tasks.append(self._retrieve_tasks(query_embedding, intent))
-            elif intent_type == "calendar_query":
-                tasks.append(self._retrieve_events(intent))
-        
-        # If no specific intent, try all
-        if not tasks or intent['intents'] == ["general_query"]:
-            tasks = [
-                self._retrieve_emails(query_embedding, intent),
-                self._retrieve_tasks(query_embedding, intent),
-                self._retrieve_events(intent)
-            ]
+        retrievals = {}
+        if "email" in sources:
+            retrievals["email"] = self._retrieve_emails(run, vector_search, intent, sources['email'])
+        if "task" in sources:
+            retrievals["task"] = self._retrieve_tasks(run, vector_search, intent, sources['task'])
+        if "event" in sources:
+            retrievals["event"] = self._retrieve_events(run, vector_search, intent, sources['event'])
+        if "deadline" in sources:
+            retrievals["deadline"] = self._retrieve_deadlines(intent)
+        if "availability" in sources:
+            retrievals["availability"] = self._retrieve_availability(intent)
+        if plan['lexical_types']:
+            retrievals["lexical"] = self._retrieve_lexical(query, plan['lexical_types'])
         
-        # Execute all retrieval tasks in parallel
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Execute all retrieval tasks in parallel, answering with whatever arrives in time
+        tasks = {name: asyncio.ensure_future(coro) for name, coro in retrievals.items()}
+        done, pending = await asyncio.wait(tasks.values(), timeout=remaining(run.deadline))
         
-        # Merge and rank
-        all_items = []
-        for result in results:
+        for name, task in tasks.items():
+            if task in pending:
+                task.cancel()
+                run.missed(name)
+        if vector_search is not None and not vector_search.done():
+            vector_search.cancel()
+        
+        # Merge and rank (an item can come from several paths; its best relevance wins)
+        by_key = {}
+        for task in done:
+            result = task.result() if not task.exception() else None
             if isinstance(result, list):
-                all_items.extend(result)
+                for item in result:
+                    key = (item.get('type'), item.get('emailId') or item.get('taskId') or item.get('eventId'))
+                    if key not in by_key or item.get('relevance', 0) > by_key[key].get('relevance', 0):
+                        by_key[key] = item
+        all_items = list(by_key.values())
         
         # Sort by relevance
         all_items.sort(key=lambda x: x.get('relevance', 0), reverse=True)
         
+        # Recurring events and repeated reminders take one slot, not all of them
+        all_items = collapse_near_duplicates(all_items)
+        
         # Limit to max items
         top_items = all_items[:self.max_context_items]
         
@@ -60,115 +142,312 @@ class ContextBuilder:
                     "relevance": item.get('relevance', 1.0)
                 }
                 for item in top_items
+            ] + [
+                # Flag unavailable sources so clients know the context is partial
+                {
+                    "type": "degraded",
+                    "id": source,
+                    "title": f"{source} unavailable",
+                    "relevance": 0.0
+                }
+                for source in run.degraded
             ],
-            "intent": intent
+            "intent": intent,
+            "plan": plan,
+            "partial": bool(run.degraded)
         }
     
-    async def _retrieve_emails(self, query_embedding: List[float], intent: Dict) -> List[Dict]:
-        """Retrieve relevant emails"""
+    async def prefetch_embeddings(self, queries: List[str], deadline: Optional[float] = None):
+        """
+        Embed several queries in one call and cache the results, so their
+        vector searches skip the embedding round trip. On failure each query
+        is embedded on its own as usual.
+        """
+        if self.embedding_cache is None:
+            return
+        
+        pending: Dict[str, str] = {}
+        for query in queries:
+            cache_key = normalize_query(query)
+            if self.embedding_cache.get(cache_key) is None:
+                pending.setdefault(cache_key, query)
+        if not pending:
+            return
+        
+        timeout = settings.RETRIEVAL_CALL_TIMEOUT_MS / 1000
         try:
-            # Firebase structured query
-            firebase_emails = await firebase_service.get_emails(
+            embeddings = await asyncio.wait_for(
+                embedding_service.generate_query_embeddings(list(pending.values())),
+                timeout=min(timeout, remaining(deadline)) if deadline is not None else timeout
+            )
+        except Exception as e:
+            print(f"Error embedding {len(pending)} queries in one batch: {e}")
+            return
+        
+        for cache_key, embedding in zip(pending, embeddings):
+            self.embedding_cache.set(cache_key, embedding)
+    
+    def _time_windows(self, time_range: Optional[Dict]) -> Optional[Dict]:
+        """Per-type time windows pushed down into the vector search"""
+        if not time_range:
+            return None
+        
+        # Whole days: "today" runs to midnight, so later tasks and events aren't filtered out
+        start, end = day_bounds(time_range)
+        return {
+            # Emails are about the recent past: "this week" means received in the last 7 days
+            "email": {
+                "start": time_range['start'] - timedelta(days=time_range['days']),
+                "end": end
+            },
+            # Tasks and events are about what falls inside the window
+            "task": {"start": start, "end": end},
+            "event": {"start": start, "end": end}
+        }
+    
+    async def _vector_search(self, run: RetrievalRun, query: str, intent: Dict, plan: Dict) -> Dict:
+        """Embed the query and run the combined vector search"""
+        cache_key = normalize_query(query)
+        query_embedding = self.embedding_cache.get(cache_key) if self.embedding_cache is not None else None
+        
+        if query_embedding is None:
+            # Generate query embedding (use query-specific embedding for Gemini)
+            with retrieval_planner.tracker.measure("embedding"):
+                query_embedding = await run.call(
+                    lambda: embedding_service.generate_query_embedding(query),
+                    embedding_service.breaker
+                )
+            if self.embedding_cache is not None:
+                self.embedding_cache.set(cache_key, query_embedding)
+        
+        with retrieval_planner.tracker.measure("vector"):
+            return await run.call(lambda: vector_service.search(
                 user_id=self.user_id,
+                query_embedding=query_embedding,
+                types=plan['vector_types'],
                 filters={
                     "priority": "high" if intent['is_urgent'] else None,
-                    "time_range": intent.get('time_range')
+                    "time_ranges": self._time_windows(intent.get('time_range'))
                 },
-                limit=5
-            )
+                per_type_k=max(plan['sources'].get(t, 5) for t in plan['vector_types'])
+            ), vector_service.breaker)
+    
+    async def _vector_results(self, run: RetrievalRun, vector_search: Optional[asyncio.Future], item_type: str) -> Dict:
+        """Get one type's share of the combined vector search"""
+        if vector_search is None:
+            return EMPTY_VECTOR_RESULTS
+        
+        try:
+            # Shielded: other retrievers share the same search
+            results = await asyncio.wait_for(asyncio.shield(vector_search), timeout=remaining(run.deadline))
+            return results.get(item_type, EMPTY_VECTOR_RESULTS)
+        except UNAVAILABLE:
+            # Structured results still go out without the semantic boost
+            run.missed("vector")
+            return EMPTY_VECTOR_RESULTS
+        except Exception as e:
+            print(f"Error in vector search: {e}")
+            return EMPTY_VECTOR_RESULTS
+    
+    async def _structured_emails(self, intent: Dict, top_k: int) -> List[Dict]:
+        """Recent emails from the user's working set (one cached read), or a Firestore query"""
+        priority = "high" if intent['is_urgent'] else None
+        if settings.WORKING_SET_ENABLED:
+            return await working_sets.emails(self.user_id, priority=priority, limit=top_k)
+        
+        return await firebase_service.get_emails(
+            user_id=self.user_id,
+            filters={
+                "priority": priority,
+                "time_range": intent.get('time_range')
+            },
+            limit=top_k
+        )
+    
+    async def _structured_tasks(self, intent: Dict, top_k: int) -> List[Dict]:
+        """Open tasks from the user's working set, or a Firestore query"""
+        priority = "high" if intent['is_urgent'] else None
+        if settings.WORKING_SET_ENABLED:
+            return await working_sets.tasks(self.user_id, priority=priority, limit=top_k)
+        
+        return await firebase_service.get_tasks(
+            user_id=self.user_id,
+            filters={
+                "priority": priority
+            },
+            limit=top_k
+        )
+    
+    async def _structured_events(self, time_range: Optional[Dict], top_k: int) -> List[Dict]:
+        """Events on the days of the time range (upcoming ones without a range), from the calendar index"""
+        if time_range:
+            start_time, end_time = day_bounds(time_range)
+        else:
+            start_time = datetime.now()
+            end_time = start_time + timedelta(days=UPCOMING_EVENT_DAYS)
+        return await calendar_index.overlapping(self.user_id, start_time, end_time, limit=top_k)
+    
+    async def _retrieve_emails(self, run: RetrievalRun, vector_search: Optional[asyncio.Future], intent: Dict, top_k: int = 5) -> List[Dict]:
+        """Retrieve relevant emails"""
+        try:
+            # Firebase structured query
+            with retrieval_planner.tracker.measure("email"):
+                firebase_emails = await run.call(lambda: self._structured_emails(intent, top_k), firebase_service.breaker)
             
             # Vector semantic search
-            vector_results = await vector_service.search_emails(
-                user_id=self.user_id,
-                query_embedding=query_embedding,
-                filters={
-                    "priority": "high" if intent['is_urgent'] else None
-                },
-                top_k=5
-            )
+            vector_results = await self._vector_results(run, vector_search, "email")
             
             # Merge results
             merged = self._merge_results(firebase_emails, vector_results, 'emailId')
             
             return merged
+        except UNAVAILABLE:
+            run.missed("email")
+            return []
         except Exception as e:
             print(f"Error retrieving emails: {e}")
             return []
     
-    async def _retrieve_tasks(self, query_embedding: List[float], intent: Dict) -> List[Dict]:
+    async def _retrieve_tasks(self, run: RetrievalRun, vector_search: Optional[asyncio.Future], intent: Dict, top_k: int = 5) -> List[Dict]:
         """Retrieve relevant tasks"""
         try:
             # Firebase structured query
-            firebase_tasks = await firebase_service.get_tasks(
-                user_id=self.user_id,
-                filters={
-                    "priority": "high" if intent['is_urgent'] else None
-                },
-                limit=5
-            )
+            with retrieval_planner.tracker.measure("task"):
+                firebase_tasks = await run.call(lambda: self._structured_tasks(intent, top_k), firebase_service.breaker)
             
             # Vector semantic search
-            vector_results = await vector_service.search_tasks(
-                user_id=self.user_id,
-                query_embedding=query_embedding,
-                filters={
-                    "priority": "high" if intent['is_urgent'] else None
-                },
-                top_k=5
-            )
+            vector_results = await self._vector_results(run, vector_search, "task")
             
             # Merge results
             merged = self._merge_results(firebase_tasks, vector_results, 'taskId')
             
             return merged
+        except UNAVAILABLE:
+            run.missed("task")
+            return []
         except Exception as e:
             print(f"Error retrieving tasks: {e}")
             return []
     
-    async def _retrieve_events(self, intent: Dict) -> List[Dict]:
+    async def _retrieve_events(self, run: RetrievalRun, vector_search: Optional[asyncio.Future], intent: Dict, top_k: int = 5) -> List[Dict]:
         """Retrieve relevant calendar events"""
         try:
             time_range = intent.get('time_range')
             
-            events = await firebase_service.get_calendar_events(
-                user_id=self.user_id,
-                start_time=time_range['start'] if time_range else None,
-                end_time=time_range['end'] if time_range else None,
-                limit=5
-            )
+            with retrieval_planner.tracker.measure("event"):
+                events = await run.call(lambda: self._structured_events(time_range, top_k), firebase_service.breaker)
             
-            # Add type and relevance
-            for event in events:
-                event['type'] = 'event'
-                event['relevance'] = 0.7  # Base relevance for events
+            # Vector semantic search
+            vector_results = await self._vector_results(run, vector_search, "event")
             
-            return events
+            # Base relevance for events is higher: they are already time-filtered
+            return self._merge_results(events, vector_results, 'eventId', base_relevance=0.7)
+        except UNAVAILABLE:
+            run.missed("event")
+            return []
         except Exception as e:
             print(f"Error retrieving events: {e}")
             return []
     
-    def _merge_results(self, firebase_items: List, vector_results: Dict, id_field: str) -> List[Dict]:
+    async def _retrieve_availability(self, intent: Dict) -> List[Dict]:
+        """Free and busy time for availability questions, one day per window"""
+        try:
+            windows = availability_windows(intent)
+            if not windows:
+                return []
+            
+            with retrieval_planner.tracker.measure("availability"):
+                days = [
+                    await calendar_index.free_busy(self.user_id, start, end)
+                    for start, end in windows
+                ]
+            
+            return [{
+                'type': 'availability',
+                'title': f"Free time from {windows[0][0]:%a %b %d}",
+                'days': days,
+                'relevance': 1.0
+            }]
+        except Exception as e:
+            print(f"Error retrieving availability: {e}")
+            return []
+    
+    async def _retrieve_deadlines(self, intent: Dict) -> List[Dict]:
+        """Retrieve overdue and soon-due tasks from the due-date index"""
+        try:
+            now = datetime.now()
+            time_range = intent.get('time_range')
+            
+            with retrieval_planner.tracker.measure("deadline"):
+                overdue = await due_date_index.overdue(self.user_id, now)
+                if time_range and time_range.get('keyword') == 'today':
+                    upcoming = await due_date_index.due_today(self.user_id, now)
+                elif time_range:
+                    # Whole days: "tomorrow" runs to midnight, not to this time tomorrow
+                    start, end = day_bounds(time_range, now)
+                    upcoming = await due_date_index.due_between(self.user_id, max(start, now), end)
+                else:
+                    upcoming = await due_date_index.due_this_week(self.user_id, now)
+            
+            # Overdue work ranks first, then soonest due
+            items = []
+            for task in overdue:
+                items.append({**task, 'type': 'task', 'relevance': 0.9})
+            for task in upcoming:
+                items.append({**task, 'type': 'task', 'relevance': 0.8})
+            
+            return items[:self.max_context_items]
+        except Exception as e:
+            print(f"Error retrieving deadlines: {e}")
+            return []
+    
+    async def _retrieve_lexical(self, query: str, item_types: List[str]) -> List[Dict]:
+        """Retrieve exact-token matches from the in-memory keyword index"""
+        try:
+            with retrieval_planner.tracker.measure("lexical"):
+                hits = await lexical_index.search(self.user_id, query, item_types, self.max_context_items)
+            if not hits:
+                return []
+            
+            # Scale BM25 scores so the best keyword hit ranks with a strong semantic one
+            top_score = hits[0]['score']
+            if top_score <= 0:
+                return []
+            return [
+                {**hit['item'], 'type': hit['type'], 'relevance': round(0.6 + 0.4 * hit['score'] / top_score, 3)}
+                for hit in hits
+            ]
+        except Exception as e:
+            print(f"Error in keyword search: {e}")
+            return []
+    
+    def _merge_results(
+        self,
+        firebase_items: List,
+        vector_results: Dict,
+        id_field: str,
+        base_relevance: float = 0.5
+    ) -> List[Dict]:
         """Merge Firebase and vector results, add relevance scores"""
+        item_type = {'emailId': 'email', 'taskId': 'task', 'eventId': 'event'}[id_field]
         merged = {}
         
         # Add Firebase items
         for item in firebase_items:
-            item['relevance'] = 0.5  # Base relevance
-            item['type'] = 'email' if id_field == 'emailId' else 'task'
+            item['relevance'] = base_relevance
+            item['type'] = item_type
             merged[item.get(id_field, '')] = item
         
         # Enhance with vector scores
         if vector_results.get('ids') and len(vector_results['ids']) > 0:
-            for i, vec_id in enumerate(vector_results['ids'][0]):
-                # Extract ID from "userId_emailId"
-                parts = vec_id.split('_')
-                if len(parts) >= 2:
-                    item_id = '_'.join(parts[1:])
-                    
-                    if item_id in merged:
-                        # Boost relevance with vector score
-                        distance = vector_results['distances'][0][i]
-                        similarity = max(0, 1 - distance)  # Convert distance to similarity
-                        merged[item_id]['relevance'] = max(merged[item_id]['relevance'], similarity)
+            for i, metadata in enumerate(vector_results['metadatas'][0]):
+                # Vector metadata carries the source document ID
+                item_id = (metadata or {}).get(id_field)
+                
+                if item_id in merged:
+                    # Boost relevance with vector score
+                    distance = vector_results['distances'][0][i]
+                    similarity = max(0, 1 - distance)  # Convert distance to similarity
+                    merged[item_id]['relevance'] = max(merged[item_id]['relevance'], similarity)
         
         return list(merged.values())
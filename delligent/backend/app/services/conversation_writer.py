@@ -0,0 +1,179 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.cache import TTLCache
+from app.services.firebase_service import firebase_service
+
+# Message counts of recently written conversations, so appends skip the read.
+# Kept short: another worker may append to the same conversation.
+COUNT_TTL_SECONDS = 600
+
+# Longest pause between retries of a failed write
+MAX_BACKOFF_SECONDS = 30
+
+
+class ConversationWriter:
+    """
+    Write-behind persistence for chat turns.
+    
+    save() hands back the conversation ID and timestamp at once and queues
+    the turn. A background worker writes queued turns every
+    CONVERSATION_FLUSH_INTERVAL_MS (sooner once CONVERSATION_FLUSH_MAX_TURNS
+    are waiting) as one batched write, with all turns of a conversation
+    appended in the order they were saved. Failed writes stay queued and are
+    retried with backoff; stop() writes what's left on shutdown.
+    """
+    
+    def __init__(self):
+        self._pending: List[Dict] = []
+        self._counts = TTLCache(maxsize=10000, ttl=COUNT_TTL_SECONDS)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def save(
+        self,
+        user_id: str,
+        conversation_id: Optional[str],
+        user_message: str,
+        assistant_message: str,
+        context_sources: List[Dict]
+    ) -> Dict:
+        """Save one chat turn; returns the conversation's id and the turn's timestamp"""
+        if not settings.CONVERSATION_WRITE_BEHIND:
+            conversation = await firebase_service.save_conversation(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                user_message=user_message,
+                assistant_message=assistant_message,
+                context_sources=context_sources,
+                message_count=self._counts.get(conversation_id)
+            )
+            self._counts.set(conversation['id'], conversation['messageCount'])
+            return conversation
+        
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._lock = asyncio.Lock()
+            self._worker = asyncio.ensure_future(self._run())
+        
+        turn = {
+            "conversationId": conversation_id or firebase_service.new_conversation_id(),
+            "userId": user_id,
+            "new": not conversation_id,
+            "userMessage": user_message,
+            "assistantMessage": assistant_message,
+            "contextSources": context_sources,
+            "timestamp": datetime.now()
+        }
+        self._pending.append(turn)
+        self._wakeup.set()
+        return {"id": turn['conversationId'], "timestamp": turn['timestamp']}
+    
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        failures = 0
+        while True:
+            await self._wakeup.wait()
+            
+            # Let turns arriving shortly after join the batch
+            flush_at = loop.time() + settings.CONVERSATION_FLUSH_INTERVAL_MS / 1000
+            while len(self._pending) < settings.CONVERSATION_FLUSH_MAX_TURNS and loop.time() < flush_at:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=flush_at - loop.time())
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.flush()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                print(f"Error writing conversations (attempt {failures}): {e}")
+                if failures >= settings.CONVERSATION_WRITE_RETRIES:
+                    dropped = self._pending[:settings.CONVERSATION_FLUSH_MAX_TURNS]
+                    del self._pending[:len(dropped)]
+                    print(f"Dropped {len(dropped)} conversation turns after {failures} failed writes")
+                    failures = 0
+                await asyncio.sleep(min(2 ** failures, MAX_BACKOFF_SECONDS))
+            
+            if not self._pending:
+                self._wakeup.clear()
+    
+    async def flush(self):
+        """Write the oldest queued turns (up to CONVERSATION_FLUSH_MAX_TURNS); they stay queued if it fails"""
+        async with self._lock:
+            turns = self._pending[:settings.CONVERSATION_FLUSH_MAX_TURNS]
+            if not turns:
+                return
+            
+            await self._write(turns)
+            # save() only appends, so the written turns are still at the front
+            del self._pending[:len(turns)]
+    
+    async def _write(self, turns: List[Dict]):
+        by_conversation: Dict[str, List[Dict]] = {}
+        for turn in turns:
+            by_conversation.setdefault(turn['conversationId'], []).append(turn)
+        
+        # Continued conversations this worker hasn't written recently: read their counts in one go
+        unknown = [
+            conversation_id for conversation_id, conversation_turns in by_conversation.items()
+            if not conversation_turns[0]['new'] and self._counts.get(conversation_id) is None
+        ]
+        stored = await firebase_service.get_message_counts(unknown) if unknown else {}
+        
+        conversations = []
+        for conversation_id, conversation_turns in by_conversation.items():
+            if conversation_turns[0]['new']:
+                message_count = None
+            else:
+                # An ID that doesn't exist (yet) starts the conversation under that ID
+                message_count = stored.get(conversation_id, self._counts.get(conversation_id))
+            
+            messages: List[Dict] = []
+            for turn in conversation_turns:
+                messages += firebase_service._turn_messages(
+                    (message_count or 0) + len(messages),
+                    turn['userMessage'],
+                    turn['assistantMessage'],
+                    turn['contextSources'],
+                    turn['timestamp']
+                )
+            conversations.append({
+                "conversationId": conversation_id,
+                "userId": conversation_turns[0]['userId'],
+                "messageCount": message_count,
+                "messages": messages
+            })
+        
+        await firebase_service.write_conversations(conversations)
+        
+        for conversation in conversations:
+            self._counts.set(conversation['conversationId'], (conversation['messageCount'] or 0) + len(conversation['messages']))
+    
+    async def stop(self):
+        """Stop the worker and write every queued turn (on shutdown)"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        
+        for attempt in range(settings.CONVERSATION_WRITE_RETRIES):
+            try:
+                while self._pending:
+                    await self.flush()
+                return
+            except Exception as e:
+                print(f"Error writing conversations on shutdown (attempt {attempt + 1}): {e}")
+                await asyncio.sleep(min(2 ** attempt, MAX_BACKOFF_SECONDS))
+        
+        print(f"Dropped {len(self._pending)} conversation turns that could not be written")
+        self._pending.clear()
+
+conversation_writer = ConversationWriter()
@@ -0,0 +1,29 @@
+from typing import Callable, Dict, List
+
+
+class DataVersions:
+    """
+    Per-user counter bumped on every write to that user's emails, tasks or
+    events made by this worker. Lets callers key work on "the user's data as
+    of now" and never share a result computed before a write.
+    """
+    
+    def __init__(self):
+        self._versions: Dict[str, int] = {}
+        self._listeners: List[Callable[[str], None]] = []
+    
+    def get(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+    
+    def bump(self, user_id: str) -> int:
+        version = self._versions.get(user_id, 0) + 1
+        self._versions[user_id] = version
+        for listener in self._listeners:
+            listener(user_id)
+        return version
+    
+    def subscribe(self, listener: Callable[[str], None]):
+        """Call listener(user_id) after every bump (it must not block)"""
+        self._listeners.append(listener)
+
+data_versions = DataVersions()
@@ -0,0 +1,86 @@
+import hashlib
+import re
+from typing import Dict, List
+
+# Items whose 64-bit SimHashes differ in at most this many bits count as near-duplicates
+MAX_DISTANCE = 6
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Dates and times, folded together so recurring items match. Other numbers
+# (PR #234, Sprint 23, invoice numbers) tell items apart and are kept.
+MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+DATE_TIME = re.compile(
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b"
+    r"|\b\d{1,2}[/.]\d{1,2}(?:[/.]\d{2,4})?\b"
+    r"|\b\d{1,2}:\d{2}(?::\d{2})?\s*(?:am|pm)?\b"
+    r"|\b\d{1,2}\s*(?:am|pm)\b"
+    rf"|\b{MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?\b"
+    rf"|\b\d{{1,2}}(?:st|nd|rd|th)?\s+{MONTH}(?:\s+\d{{4}})?\b"
+)
+
+
+def _item_text(item: Dict) -> str:
+    """The text that makes two items the "same": dates and times are left out"""
+    item_type = item.get('type')
+    if item_type == 'email':
+        sender = item.get('sender') or {}
+        return f"{item.get('subject', '')} {sender.get('email', '')} {item.get('bodyPreview') or item.get('body') or ''}"[:600]
+    if item_type == 'task':
+        return f"{item.get('title', '')} {item.get('description', '')}"[:600]
+    return f"{item.get('title', '')} {item.get('location', '')}"
+
+
+def _fold(text: str) -> str:
+    return DATE_TIME.sub(" datetime ", text.lower())
+
+
+def _identifiers(item: Dict) -> frozenset:
+    """Tokens with digits in the title, other than dates and times ("234", "q3")"""
+    title = item.get('subject') or item.get('title') or ''
+    return frozenset(word for word in WORD.findall(_fold(title)) if any(c.isdigit() for c in word))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word unigrams and bigrams, with dates and times folded together"""
+    words = WORD.findall(_fold(text))
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    
+    weights = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def collapse_near_duplicates(items: List[Dict], max_distance: int = MAX_DISTANCE) -> List[Dict]:
+    """
+    Keep the first (most relevant) item of each group of near-identical items
+    of the same type: recurring events, repeated reminder emails, templated
+    tasks. Representatives get `similarCount`, the number of others they stand in for.
+    Items whose titles carry different identifiers ("PR #234" vs "PR #981")
+    are never collapsed, however close the rest of their text is.
+    """
+    kept: List[Dict] = []
+    fingerprints: List[int] = []
+    identifiers: List[frozenset] = []
+    
+    for item in items:
+        fingerprint = simhash(_item_text(item))
+        item_identifiers = _identifiers(item)
+        for i, representative in enumerate(kept):
+            if (
+                representative.get('type') == item.get('type')
+                and identifiers[i] == item_identifiers
+                and bin(fingerprints[i] ^ fingerprint).count("1") <= max_distance
+            ):
+                representative['similarCount'] = representative.get('similarCount', 0) + 1
+                break
+        else:
+            kept.append(item)
+            fingerprints.append(fingerprint)
+            identifiers.append(item_identifiers)
+    
+    return kept
@@ -0,0 +1,100 @@
+import bisect
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from app.services.firebase_service import firebase_service
+from app.services.user_indexes import UserIndexCache
+from app.services.time_utils import to_epoch
+
+# Rebuild from Firestore after this long, to pick up writes made by other workers
+INDEX_TTL_SECONDS = 300
+
+
+class UserDueDates:
+    """Open tasks for one user, kept sorted by due date"""
+    
+    def __init__(self):
+        self.keys: List[Tuple[float, str]] = []
+        self.tasks: Dict[str, Dict] = {}
+    
+    def upsert(self, task: Dict):
+        task_id = task.get('taskId')
+        if not task_id:
+            return
+        
+        self.remove(task_id)
+        
+        due = to_epoch(task.get('dueDate'))
+        # Only open tasks with a due date can ever be overdue or due soon
+        if due is None or task.get('status') == 'completed':
+            return
+        
+        bisect.insort(self.keys, (due, task_id))
+        self.tasks[task_id] = task
+    
+    def remove(self, task_id: str):
+        task = self.tasks.pop(task_id, None)
+        if task is None:
+            return
+        
+        key = (to_epoch(task.get('dueDate')), task_id)
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            del self.keys[position]
+    
+    def between(self, start: Optional[float], end: Optional[float]) -> List[Dict]:
+        """Tasks with start <= due < end, soonest first"""
+        low = 0 if start is None else bisect.bisect_left(self.keys, (start, ""))
+        high = len(self.keys) if end is None else bisect.bisect_left(self.keys, (end, ""))
+        return [self.tasks[task_id] for _, task_id in self.keys[low:high]]
+
+
+class DueDateIndex:
+    """
+    Per-user index of open tasks sorted by due date.
+    
+    Built in the background from one Firestore fetch per user, then kept up
+    to date by the task write paths, so overdue / due-today / due-this-week
+    lookups are range scans instead of collection reads.
+    """
+    
+    def __init__(self):
+        self._users: UserIndexCache[UserDueDates] = UserIndexCache("due date", self._build, INDEX_TTL_SECONDS)
+    
+    async def _build(self, user_id: str) -> UserDueDates:
+        index = UserDueDates()
+        query = firebase_service.db.collection('tasks').where('userId', '==', user_id)
+        for task in await firebase_service.fetch(query):
+            index.upsert(task)
+        return index
+    
+    def apply_task(self, user_id: str, task: Dict):
+        """Apply a task write to an already-built index"""
+        index = self._users.peek(user_id)
+        if index is not None:
+            index.upsert(task)
+    
+    async def due_between(
+        self,
+        user_id: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict]:
+        index = await self._users.get(user_id)
+        return index.between(to_epoch(start), to_epoch(end))
+    
+    async def overdue(self, user_id: str, now: Optional[datetime] = None) -> List[Dict]:
+        """Open tasks whose due date has passed"""
+        return await self.due_between(user_id, end=now or datetime.now())
+    
+    async def due_today(self, user_id: str, now: Optional[datetime] = None) -> List[Dict]:
+        """Open tasks due between now and the end of today"""
+        now = now or datetime.now()
+        end_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return await self.due_between(user_id, start=now, end=end_of_day)
+    
+    async def due_this_week(self, user_id: str, now: Optional[datetime] = None) -> List[Dict]:
+        """Open tasks due in the next 7 days"""
+        now = now or datetime.now()
+        return await self.due_between(user_id, start=now, end=now + timedelta(days=7))
+
+due_date_index = DueDateIndex()
@@ -1,51 +1,76 @@
+import asyncio
 import google.generativeai as genai
 from app.config import settings
+from app.services.circuit_breaker import get_breaker
+from app.services.admission_control import embedding_admission
 from typing import List
 
+# Gemini accepts at most this many texts per batch embedding request
+EMBED_BATCH_LIMIT = 100
+
 class EmbeddingService:
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
         self.embedding_model = "models/embedding-001"
+        # Query embeddings sit on the retrieval path; a call cut off there counts as a failure
+        self.breaker = get_breaker("embedding", slow_call_seconds=settings.RETRIEVAL_CALL_TIMEOUT_MS * 0.8 / 1000)
+    
+    async def _embed(self, content, task_type: str):
+        # Bounded concurrency across query and ingestion embeddings. Queries are
+        # admitted (or rejected) like requests; ingestion batches wait for a
+        # low-priority slot so a large import neither fails nor starves queries.
+        if task_type == "retrieval_query":
+            admission = embedding_admission.slot()
+        else:
+            admission = embedding_admission.background_slot()
+        
+        async with admission:
+            return await self.breaker.call(lambda: asyncio.to_thread(
+                genai.embed_content,
+                model=self.embedding_model,
+                content=content,
+                task_type=task_type
+            ))
     
     async def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using Gemini"""
         # Truncate to reasonable length
         text = text[:10000]
         
-        result = genai.embed_content(
-            model=self.embedding_model,
-            content=text,
-            task_type="retrieval_document"
-        )
+        result = await self._embed(text, "retrieval_document")
         
         return result['embedding']
     
     async def generate_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for multiple texts"""
-        embeddings = []
+        """Generate embeddings for multiple texts in as few batched API calls as possible"""
+        if not texts:
+            return []
         
-        for text in texts:
-            # Truncate each text
-            text = text[:10000]
-            
-            result = genai.embed_content(
-                model=self.embedding_model,
-                content=text,
-                task_type="retrieval_document"
-            )
-            
-            embeddings.append(result['embedding'])
+        # Truncate each text (a safety net: ingestion chunks long documents first)
+        texts = [text[:10000] for text in texts]
+        
+        embeddings = []
+        for i in range(0, len(texts), EMBED_BATCH_LIMIT):
+            # Run the blocking client call off the event loop so pipeline stages can overlap
+            result = await self._embed(texts[i:i + EMBED_BATCH_LIMIT], "retrieval_document")
+            embeddings.extend(result['embedding'])
         
         return embeddings
     
     async def generate_query_embedding(self, query: str) -> List[float]:
         """Generate embedding for query text"""
-        result = genai.embed_content(
-            model=self.embedding_model,
-            content=query,
-            task_type="retrieval_query"
-        )
+        # Off the event loop so request deadlines can cut it short
+        result = await self._embed(query, "retrieval_query")
         
         return result['embedding']
+    
+    async def generate_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Generate embeddings for several queries in batched API calls"""
+        embeddings = []
+        for i in range(0, len(queries), EMBED_BATCH_LIMIT):
+            result = await self._embed(queries[i:i + EMBED_BATCH_LIMIT], "retrieval_query")
+            embeddings.extend(result['embedding'])
+        
+        return embeddings
 
 embedding_service = EmbeddingService()
@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+import google.generativeai as genai
+from app.config import settings
+from app.services.circuit_breaker import get_breaker
+from app.services.admission_control import generation_admission
+from app.services.firebase_service import firebase_service
+from app.services.working_set import working_sets
+from app.services.lexical_index import lexical_index
+from app.services.data_version import data_versions
+from app.services.llm_service import MODEL_NAME
+
+ENRICHMENT_PROMPT = """You pre-process an employee's emails and tasks for a work assistant.
+
+For each item, return:
+- "id": the item's id, unchanged
+- "summary": one sentence, at most 25 words
+- "actionItems": concrete actions the employee needs to take (at most 3, empty if none)
+- "urgency": a number from 0 (no time pressure) to 1 (needs attention today)
+
+Respond with a JSON array with one object per item. Do not make up information.
+"""
+
+COLLECTIONS = {"email": "emails", "task": "tasks"}
+ID_FIELDS = {"email": "emailId", "task": "taskId"}
+
+
+def _describe(item_type: str, item: Dict) -> str:
+    if item_type == "email":
+        sender = item.get('sender') or {}
+        return (
+            f"id: {item['emailId']}\ntype: email\nsubject: {item.get('subject', '')}\n"
+            f"from: {sender.get('name', '')} ({sender.get('email', '')})\n"
+            f"received: {item.get('receivedAt', '')}\nbody: {(item.get('body') or item.get('bodyPreview') or '')[:1500]}"
+        )
+    return (
+        f"id: {item['taskId']}\ntype: task\ntitle: {item.get('title', '')}\n"
+        f"due: {item.get('dueDate', '')}\ndescription: {(item.get('description') or '')[:1500]}"
+    )
+
+
+def _input_hash(item_type: str, item: Dict) -> str:
+    return hashlib.sha256(_describe(item_type, item).encode("utf-8")).hexdigest()[:16]
+
+
+def needs_enrichment(item_type: str, item: Dict) -> bool:
+    """True until an item has been enriched at its current content"""
+    return item.get('enrichedHash') != _input_hash(item_type, item)
+
+
+def _clean(entry: Dict) -> Dict:
+    """Keep only well-formed fields from one model output entry"""
+    try:
+        urgency = min(max(float(entry.get('urgency', 0)), 0.0), 1.0)
+    except (TypeError, ValueError):
+        urgency = 0.0
+    actions = entry.get('actionItems') or []
+    return {
+        "summary": str(entry.get('summary', ''))[:300],
+        "extractedActions": [str(action)[:200] for action in actions if action][:3] if isinstance(actions, list) else [],
+        "urgencyScore": round(urgency, 2)
+    }
+
+
+class EnrichmentService:
+    """
+    Summarizes new emails and tasks once, at ingestion, so chat prompts can
+    carry a one-line summary and the action items instead of raw previews.
+    
+    Writes are queued and enriched in batches (one Gemini call per batch) by
+    a background worker; results are stored on the documents as `summary`,
+    `extractedActions`, `urgencyScore` and `enrichedHash`.
+    """
+    
+    def __init__(self):
+        self.model = genai.GenerativeModel(
+            MODEL_NAME,
+            system_instruction=ENRICHMENT_PROMPT,
+            generation_config={"response_mime_type": "application/json", "temperature": 0}
+        )
+        # Its own breaker: failing background batches mustn't open the circuit for chat
+        self.breaker = get_breaker("gemini-enrichment")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def enrich(self, items: List[Tuple[str, Dict]]) -> Dict[str, Dict]:
+        """Enrich (item_type, item) pairs in one model call; returns fields by item ID"""
+        if not items:
+            return {}
+        
+        prompt = "\n\n---\n\n".join(_describe(item_type, item) for item_type, item in items)
+        # Low priority: waits while chat generation is busy instead of competing with it
+        async with generation_admission.background_slot():
+            response = await self.breaker.call(
+                lambda: asyncio.to_thread(self.model.generate_content, prompt)
+            )
+        
+        requested = {item[ID_FIELDS[item_type]] for item_type, item in items}
+        entries = json.loads(response.text)
+        return {
+            str(entry['id']): _clean(entry)
+            for entry in entries
+            if isinstance(entry, dict) and str(entry.get('id')) in requested
+        }
+    
+    async def enrich_and_store(self, items: List[Tuple[str, Dict]]) -> int:
+        """Enrich items and merge the results into their Firestore documents"""
+        enriched = await self.enrich(items)
+        
+        updates: Dict[str, Dict[str, Dict]] = {}
+        for item_type, item in items:
+            item_id = item[ID_FIELDS[item_type]]
+            if item_id in enriched:
+                updates.setdefault(COLLECTIONS[item_type], {})[item_id] = {
+                    **enriched[item_id],
+                    "enrichedHash": _input_hash(item_type, item)
+                }
+        
+        for collection, collection_updates in updates.items():
+            await firebase_service.update_documents(collection, collection_updates)
+        
+        await self._apply_to_views(items, enriched)
+        return sum(len(collection_updates) for collection_updates in updates.values())
+    
+    async def _apply_to_views(self, items: List[Tuple[str, Dict]], enriched: Dict[str, Dict]):
+        """Carry the new fields into the working sets and keyword indexes prompts are built from"""
+        by_user: Dict[Tuple[str, str], List[Dict]] = {}
+        for item_type, item in items:
+            fields = enriched.get(item[ID_FIELDS[item_type]])
+            if fields and item.get('userId'):
+                by_user.setdefault((item['userId'], item_type), []).append({**item, **fields})
+        
+        for (user_id, item_type), updated in by_user.items():
+            for item in updated:
+                lexical_index.apply(user_id, item_type, item)
+            try:
+                await working_sets.apply(user_id, item_type, updated)
+            except Exception as e:
+                # The working set repairs itself at its next rebuild
+                print(f"Error updating working set for {user_id}: {e}")
+            data_versions.bump(user_id)
+    
+    def submit(self, item_type: str, item: Dict):
+        """Queue a written email or task for background enrichment (no-op if already enriched)"""
+        if not settings.ENRICHMENT_ENABLED or not needs_enrichment(item_type, item):
+            return
+        
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+        self._queue.put_nowait((item_type, item))
+    
+    async def _run(self):
+        """Collect up to ENRICHMENT_BATCH_SIZE items (or wait ENRICHMENT_MAX_WAIT_SECONDS), then enrich them"""
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await queue.get()]
+            flush_at = loop.time() + settings.ENRICHMENT_MAX_WAIT_SECONDS
+            while len(batch) < settings.ENRICHMENT_BATCH_SIZE:
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout=max(flush_at - loop.time(), 0)))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.enrich_and_store(batch)
+            except Exception as e:
+                # Unenriched items still render from their raw fields; a backfill picks them up later
+                print(f"Error enriching {len(batch)} items: {e}")
+    
+    async def backfill(self, user_id: str) -> int:
+        """Enrich every email and task of a user that has no enrichment for its current content"""
+        pending: List[Tuple[str, Dict]] = []
+        for item_type, collection in COLLECTIONS.items():
+            query = firebase_service.db.collection(collection).where('userId', '==', user_id)
+            pending += [(item_type, item) for item in await firebase_service.fetch(query) if needs_enrichment(item_type, item)]
+        
+        stored = 0
+        for i in range(0, len(pending), settings.ENRICHMENT_BATCH_SIZE):
+            stored += await self.enrich_and_store(pending[i:i + settings.ENRICHMENT_BATCH_SIZE])
+        return stored
+
+enrichment_service = EnrichmentService()
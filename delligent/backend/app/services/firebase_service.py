@@ -1,8 +1,12 @@
 import firebase_admin
 from firebase_admin import credentials, firestore, auth as firebase_auth
 from app.config import settings
-from typing import Optional, Dict, List
+from app.services.circuit_breaker import get_breaker
+from app.services.singleflight import SingleFlight
+from app.services.data_version import data_versions
+from typing import Optional, Dict, List, Tuple
 from datetime import datetime
+import asyncio
 import os
 
 class FirebaseService:
@@ -17,8 +21,28 @@ class FirebaseService:
             firebase_admin.initialize_app(cred)
         
         self.db = firestore.client()
+        self.breaker = get_breaker("firestore", slow_call_seconds=settings.RETRIEVAL_CALL_TIMEOUT_MS * 0.8 / 1000)
+        self.reads = SingleFlight("firestore_reads")
 
     
+    async def fetch(self, query, key: Optional[Tuple] = None) -> List[Dict]:
+        """
+        Run a query off the event loop so callers can time it out.
+        Concurrent reads with the same key share one Firestore round trip.
+        """
+        def run():
+            return self.breaker.call(
+                lambda: asyncio.to_thread(lambda: [doc.to_dict() for doc in query.stream()])
+            )
+        
+        if key is None:
+            return await run()
+        
+        # Reads older than the hedge delay aren't joined, so a hedged retry gets a fresh call
+        docs = await self.reads.do(key, run, max_age=settings.RETRIEVAL_HEDGE_AFTER_MS / 1000)
+        # Callers annotate results in place; give each its own copies
+        return [dict(doc) for doc in docs]
+    
     async def get_user(self, user_id: str) -> Optional[Dict]:
         """Get user document"""
         doc = self.db.collection('users').document(user_id).get()
@@ -28,9 +52,10 @@ class FirebaseService:
         self,
         user_id: str,
         filters: Optional[Dict] = None,
-        limit: int = 10
+        limit: int = 10,
+        fields: Optional[List[str]] = None
     ) -> List[Dict]:
-        """Get user emails with optional filters"""
+        """Get user emails with optional filters, optionally projected to `fields`"""
         query = self.db.collection('emails').where('userId', '==', user_id)
 
         # For now, keep it simple to avoid composite index requirements
@@ -39,10 +64,14 @@ class FirebaseService:
             if filters.get('priority'):
                 query = query.where('priority', '==', filters['priority'])
 
+        if fields:
+            # receivedAt is needed for the sort below
+            query = query.select(list(dict.fromkeys(fields + ['receivedAt'])))
         query = query.limit(limit)
 
-        docs = query.stream()
-        emails = [doc.to_dict() for doc in docs]
+        emails = await self.fetch(query, key=(
+            'emails', user_id, (filters or {}).get('priority'), limit, tuple(fields or ())
+        ))
 
         # Sort by receivedAt in Python
         try:
@@ -50,15 +79,21 @@ class FirebaseService:
         except:
             pass
 
+        if fields and 'receivedAt' not in fields:
+            # Only selected for the sort; the caller didn't ask for it
+            for email in emails:
+                email.pop('receivedAt', None)
+
         return emails
     
     async def get_tasks(
         self,
         user_id: str,
         filters: Optional[Dict] = None,
-        limit: int = 10
+        limit: int = 10,
+        fields: Optional[List[str]] = None
     ) -> List[Dict]:
-        """Get user tasks with optional filters"""
+        """Get user tasks with optional filters, optionally projected to `fields`"""
         query = self.db.collection('tasks').where('userId', '==', user_id)
         
         if filters:
@@ -67,9 +102,49 @@ class FirebaseService:
             if filters.get('priority'):
                 query = query.where('priority', '==', filters['priority'])
         
+        if fields:
+            query = query.select(fields)
         query = query.limit(limit)
-        docs = query.stream()
-        return [doc.to_dict() for doc in docs]
+        return await self.fetch(query, key=(
+            'tasks', user_id, (filters or {}).get('status'), (filters or {}).get('priority'), limit,
+            tuple(fields or ())
+        ))
+    
+    async def create_task(self, user_id: str, task: Dict) -> Dict:
+        """Create a task document"""
+        timestamp = datetime.now()
+        task_ref = self.db.collection('tasks').document()
+        
+        task_data = {
+            "taskId": task_ref.id,
+            "userId": user_id,
+            "status": "pending",
+            "priority": "medium",
+            **task,
+            "createdAt": timestamp,
+            "updatedAt": timestamp,
+            "completedAt": timestamp if task.get('status') == 'completed' else None
+        }
+        
+        task_ref.set(task_data)
+        data_versions.bump(user_id)
+        return task_data
+    
+    async def update_task(self, user_id: str, task_id: str, updates: Dict) -> Optional[Dict]:
+        """Update a task document, returning the updated task (None if not found)"""
+        task_ref = self.db.collection('tasks').document(task_id)
+        doc = task_ref.get()
+        
+        if not doc.exists or doc.to_dict().get('userId') != user_id:
+            return None
+        
+        updates = {**updates, "updatedAt": datetime.now()}
+        if updates.get('status') == 'completed':
+            updates['completedAt'] = updates['updatedAt']
+        
+        task_ref.update(updates)
+        data_versions.bump(user_id)
+        return {**doc.to_dict(), **updates}
     
     async def get_calendar_events(
         self,
@@ -84,8 +159,7 @@ class FirebaseService:
         # Simplified query to avoid composite index
         query = query.limit(limit)
 
-        docs = query.stream()
-        events = [doc.to_dict() for doc in docs]
+        events = await self.fetch(query, key=('calendar_events', user_id, limit))
 
         # Filter and sort in Python
         if start_time:
@@ -101,39 +175,140 @@ class FirebaseService:
 
         return events
     
+    async def get_content_hashes(self, collection: str, doc_ids: List[str]) -> Dict[str, str]:
+        """Get stored content hashes for documents (projection read, no document bodies)"""
+        if not doc_ids:
+            return {}
+        
+        refs = [self.db.collection(collection).document(doc_id) for doc_id in doc_ids]
+        hashes = {}
+        docs = await asyncio.to_thread(lambda: list(self.db.get_all(refs, field_paths=['contentHash'])))
+        for doc in docs:
+            if doc.exists:
+                hashes[doc.id] = (doc.to_dict() or {}).get('contentHash')
+        return hashes
+    
+    async def get_user_doc_ids(self, collection: str, user_id: str) -> List[str]:
+        """List document IDs a user owns in a collection (projection read)"""
+        query = self.db.collection(collection).where('userId', '==', user_id).select([])
+        return await asyncio.to_thread(lambda: [doc.id for doc in query.stream()])
+    
+    async def delete_documents(self, collection: str, doc_ids: List[str]):
+        """Delete documents in batched writes"""
+        for i in range(0, len(doc_ids), 500):
+            batch = self.db.batch()
+            for doc_id in doc_ids[i:i + 500]:
+                batch.delete(self.db.collection(collection).document(doc_id))
+            await asyncio.to_thread(batch.commit)
+    
+    async def update_documents(self, collection: str, updates: Dict[str, Dict]):
+        """Merge field updates into documents in batched writes"""
+        doc_ids = list(updates)
+        for i in range(0, len(doc_ids), 500):
+            batch = self.db.batch()
+            for doc_id in doc_ids[i:i + 500]:
+                batch.set(self.db.collection(collection).document(doc_id), updates[doc_id], merge=True)
+            await asyncio.to_thread(batch.commit)
+    
+    async def get_sync_state(self, user_id: str, source: str) -> Dict:
+        """Get a user's sync watermark for a data source"""
+        doc = await asyncio.to_thread(self.db.collection('sync_state').document(f"{user_id}_{source}").get)
+        return doc.to_dict() if doc.exists else {}
+    
+    async def update_sync_state(self, user_id: str, source: str, state: Dict):
+        """Persist a user's sync watermark for a data source"""
+        await asyncio.to_thread(
+            self.db.collection('sync_state').document(f"{user_id}_{source}").set,
+            {"userId": user_id, "source": source, **state},
+            merge=True
+        )
+    
+    async def get_briefing(self, user_id: str) -> Optional[Dict]:
+        """Get a user's latest stored briefing"""
+        doc = await asyncio.to_thread(self.db.collection('briefings').document(user_id).get)
+        return doc.to_dict() if doc.exists else None
+    
+    async def save_briefing(self, user_id: str, briefing: Dict):
+        """Replace a user's stored briefing"""
+        await asyncio.to_thread(self.db.collection('briefings').document(user_id).set, briefing)
+    
+    async def get_working_set(self, user_id: str) -> Optional[Dict]:
+        """Get a user's materialized working set"""
+        doc = await asyncio.to_thread(self.db.collection('working_sets').document(user_id).get)
+        return doc.to_dict() if doc.exists else None
+    
+    async def save_working_set(self, user_id: str, working_set: Dict):
+        """Replace a user's materialized working set"""
+        await asyncio.to_thread(self.db.collection('working_sets').document(user_id).set, working_set)
+    
+    def _turn_messages(
+        self,
+        message_count: int,
+        user_message: str,
+        assistant_message: str,
+        context_sources: List[Dict],
+        timestamp: datetime
+    ) -> List[Dict]:
+        """The user/assistant message pair for one chat turn"""
+        return [
+            {
+                "messageId": f"msg_{message_count + 1:03d}",
+                "role": "user",
+                "content": user_message,
+                "timestamp": timestamp
+            },
+            {
+                "messageId": f"msg_{message_count + 2:03d}",
+                "role": "assistant",
+                "content": assistant_message,
+                "timestamp": timestamp,
+                "contextUsed": context_sources
+            }
+        ]
+    
     async def save_conversation(
         self,
         user_id: str,
         conversation_id: Optional[str],
         user_message: str,
         assistant_message: str,
-        context_sources: List[Dict]
+        context_sources: List[Dict],
+        message_count: Optional[int] = None
     ) -> Dict:
-        """Save conversation to Firestore"""
+        """
+        Save conversation to Firestore.
+        
+        Callers that already know the conversation's message_count (chat
+        sessions) append the turn without reading the conversation first.
+        """
         timestamp = datetime.now()
         
         if conversation_id:
             # Update existing conversation
             conv_ref = self.db.collection('conversations').document(conversation_id)
+            
+            if message_count is not None:
+                conv_ref.update({
+                    "messages": firestore.ArrayUnion(self._turn_messages(
+                        message_count, user_message, assistant_message, context_sources, timestamp
+                    )),
+                    "lastMessageAt": timestamp,
+                    "messageCount": message_count + 2
+                })
+                
+                return {
+                    "id": conversation_id,
+                    "timestamp": timestamp,
+                    "messageCount": message_count + 2
+                }
+            
             conv_doc = conv_ref.get()
             
             if conv_doc.exists:
                 messages = conv_doc.to_dict().get('messages', [])
-                messages.extend([
-                    {
-                        "messageId": f"msg_{len(messages) + 1:03d}",
-                        "role": "user",
-                        "content": user_message,
-                        "timestamp": timestamp
-                    },
-                    {
-                        "messageId": f"msg_{len(messages) + 2:03d}",
-                        "role": "assistant",
-                        "content": assistant_message,
-                        "timestamp": timestamp,
-                        "contextUsed": context_sources
-                    }
-                ])
+                messages.extend(self._turn_messages(
+                    len(messages), user_message, assistant_message, context_sources, timestamp
+                ))
                 
                 conv_ref.update({
                     "messages": messages,
@@ -143,7 +318,8 @@ class FirebaseService:
                 
                 return {
                     "id": conversation_id,
-                    "timestamp": timestamp
+                    "timestamp": timestamp,
+                    "messageCount": len(messages)
                 }
         
         # Create new conversation
@@ -152,21 +328,7 @@ class FirebaseService:
             "conversationId": conv_ref.id,
             "userId": user_id,
             "title": user_message[:50] + "..." if len(user_message) > 50 else user_message,
-            "messages": [
-                {
-                    "messageId": "msg_001",
-                    "role": "user",
-                    "content": user_message,
-                    "timestamp": timestamp
-                },
-                {
-                    "messageId": "msg_002",
-                    "role": "assistant",
-                    "content": assistant_message,
-                    "timestamp": timestamp,
-                    "contextUsed": context_sources
-                }
-            ],
+            "messages": self._turn_messages(0, user_message, assistant_message, context_sources, timestamp),
             "createdAt": timestamp,
             "lastMessageAt": timestamp,
             "messageCount": 2
@@ -176,7 +338,51 @@ class FirebaseService:
         
         return {
             "id": conv_ref.id,
-            "timestamp": timestamp
+            "timestamp": timestamp,
+            "messageCount": 2
         }
+    
+    def new_conversation_id(self) -> str:
+        """A conversation ID generated client-side, usable before the document is written"""
+        return self.db.collection('conversations').document().id
+    
+    async def get_message_counts(self, conversation_ids: List[str]) -> Dict[str, int]:
+        """messageCount of the conversations that exist, read in one round trip"""
+        refs = [self.db.collection('conversations').document(conversation_id) for conversation_id in conversation_ids]
+        docs = await asyncio.to_thread(lambda: list(self.db.get_all(refs, field_paths=['messageCount'])))
+        return {doc.id: doc.to_dict().get('messageCount', 0) for doc in docs if doc.exists}
+    
+    async def write_conversations(self, conversations: List[Dict]):
+        """
+        Append queued chat turns in batched writes. Each entry holds a
+        conversation's new messages and the messageCount stored before them
+        (None creates the conversation). Writes are idempotent, so a failed
+        batch can be retried as is.
+        """
+        for i in range(0, len(conversations), 500):
+            batch = self.db.batch()
+            for conversation in conversations[i:i + 500]:
+                conv_ref = self.db.collection('conversations').document(conversation['conversationId'])
+                messages = conversation['messages']
+                last_message_at = messages[-1]['timestamp']
+                
+                if conversation['messageCount'] is None:
+                    first_message = messages[0]['content']
+                    batch.set(conv_ref, {
+                        "conversationId": conversation['conversationId'],
+                        "userId": conversation['userId'],
+                        "title": first_message[:50] + "..." if len(first_message) > 50 else first_message,
+                        "messages": messages,
+                        "createdAt": messages[0]['timestamp'],
+                        "lastMessageAt": last_message_at,
+                        "messageCount": len(messages)
+                    })
+                else:
+                    batch.update(conv_ref, {
+                        "messages": firestore.ArrayUnion(messages),
+                        "lastMessageAt": last_message_at,
+                        "messageCount": conversation['messageCount'] + len(messages)
+                    })
+            await asyncio.to_thread(batch.commit)
 
 firebase_service = FirebaseService()
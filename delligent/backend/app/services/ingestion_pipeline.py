@@ -0,0 +1,317 @@
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime
+from typing import AsyncIterable, Callable, Dict, Iterable, List, Optional, Union
+from app.services.embedding_service import embedding_service
+from app.services.vector_service import vector_service
+from app.services.time_utils import to_epoch
+from app.services.chunking import chunk_document
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_BATCH_LIMIT = 500
+
+COLLECTION_TYPES = {
+    "emails": "email",
+    "tasks": "task",
+    "calendar_events": "event"
+}
+
+# End-of-stream marker passed between pipeline stages
+_DONE = object()
+
+
+def _hash_default(value):
+    if isinstance(value, datetime):
+        # Firestore returns naive datetimes back as UTC-aware ones; hash the instant
+        return to_epoch(value)
+    return str(value)
+
+
+def content_hash(text: str, metadata: Dict) -> str:
+    """Stable hash of everything that ends up in an item's vector"""
+    payload = json.dumps({"text": text, "metadata": metadata}, sort_keys=True, default=_hash_default)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def build_record(
+    collection: str,
+    doc_id: str,
+    user_id: str,
+    data: Dict,
+    text: str,
+    metadata: Dict
+) -> Dict:
+    """Build an ingestion record: the Firestore document plus what to embed for it"""
+    # Stored on both the document and the vector so syncs can skip unchanged items
+    item_hash = content_hash(text, metadata)
+    data = {**data, "contentHash": item_hash}
+    metadata = {**metadata, "contentHash": item_hash}
+    
+    return {
+        "collection": collection,
+        "type": COLLECTION_TYPES[collection],
+        "doc_id": doc_id,
+        "user_id": user_id,
+        "data": data,
+        "text": text,
+        "metadata": metadata
+    }
+
+
+def email_record(email: Dict) -> Dict:
+    """Build the canonical ingestion record for an email document"""
+    sender = email.get('sender') or {}
+    text = f"Subject: {email.get('subject', '')}\nFrom: {sender.get('name', '')} ({sender.get('email', '')})\nBody: {email.get('body', '')}"
+    
+    return build_record(
+        collection='emails',
+        doc_id=email['emailId'],
+        user_id=email['userId'],
+        data=email,
+        text=text,
+        metadata={
+            "priority": email.get('priority', 'medium'),
+            "sender": sender.get('email', ''),
+            "receivedAt": email.get('receivedAt', ''),
+            "labels": email.get('labels', [])
+        }
+    )
+
+
+def task_record(task: Dict) -> Dict:
+    """Build the canonical ingestion record for a task document"""
+    text = f"Title: {task.get('title')}\nDescription: {task.get('description', '')}\nCategory: {task.get('category')}"
+    
+    return build_record(
+        collection='tasks',
+        doc_id=task['taskId'],
+        user_id=task['userId'],
+        data=task,
+        text=text,
+        metadata={
+            "priority": task.get('priority'),
+            "status": task.get('status'),
+            "dueDate": task.get('dueDate')
+        }
+    )
+
+
+def event_record(event: Dict) -> Dict:
+    """Build the canonical ingestion record for a calendar event document"""
+    text = f"Title: {event.get('title')}\nDescription: {event.get('description', '')}\nLocation: {event.get('location')}"
+    
+    return build_record(
+        collection='calendar_events',
+        doc_id=event['eventId'],
+        user_id=event['userId'],
+        data=event,
+        text=text,
+        metadata={"startTime": event.get('startTime')}
+    )
+
+
+async def embed_records(records: List[Dict]):
+    """Split each record's text into chunks and embed all chunks together"""
+    for record in records:
+        record['chunks'] = chunk_document(record['text'])
+    
+    embeddings = await embedding_service.generate_batch_embeddings(
+        [chunk for record in records for chunk in record['chunks']]
+    )
+    
+    position = 0
+    for record in records:
+        record['embeddings'] = embeddings[position:position + len(record['chunks'])]
+        position += len(record['chunks'])
+
+
+async def upsert_records(records: List[Dict]):
+    """Upsert embedded records' chunk vectors, clearing chunks a replaced version had beyond them"""
+    vectors = [
+        vector
+        for record in records
+        for vector in vector_service.build_vectors(
+            item_type=record['type'],
+            item_id=record['doc_id'],
+            user_id=record['user_id'],
+            chunks=record['chunks'],
+            embeddings=record['embeddings'],
+            metadata=record['metadata']
+        )
+    ]
+    
+    await vector_service.upsert_vectors(vectors)
+    
+    for record in records:
+        if record.get('replaces'):
+            await vector_service.delete_stale_chunks(
+                record['user_id'], record['type'], record['doc_id'], keep=len(record['chunks'])
+            )
+
+
+async def index_record(record: Dict):
+    """Embed and upsert a single record whose Firestore document is already written"""
+    await embed_records([record])
+    await upsert_records([record])
+
+
+class IngestionStats:
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.written = 0
+        self.embedded = 0
+        self.upserted = 0
+    
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+    
+    @property
+    def throughput(self) -> float:
+        """Fully ingested records per second"""
+        return self.upserted / self.elapsed if self.elapsed > 0 else 0.0
+    
+    def as_dict(self) -> Dict:
+        return {
+            "written": self.written,
+            "embedded": self.embedded,
+            "upserted": self.upserted,
+            "elapsed_seconds": round(self.elapsed, 2),
+            "items_per_second": round(self.throughput, 1)
+        }
+
+
+def print_progress(stats: IngestionStats):
+    print(f"  ✓ {stats.upserted} items ingested ({stats.throughput:.1f} items/s)")
+
+
+class IngestionPipeline:
+    """
+    Streams records through three overlapped stages:
+    Firestore batched writes -> batched embeddings -> batched vector upserts.
+    
+    Stages are connected by bounded queues, so a slow stage applies
+    backpressure upstream instead of buffering the whole input in memory.
+    Vectors are only upserted once their Firestore documents are committed.
+    """
+    
+    def __init__(
+        self,
+        db,
+        batch_size: int = 50,
+        max_pending_batches: int = 4,
+        embed_workers: int = 2,
+        on_progress: Optional[Callable[[IngestionStats], None]] = print_progress
+    ):
+        self.db = db
+        self.batch_size = max(1, min(batch_size, FIRESTORE_BATCH_LIMIT))
+        self.max_pending_batches = max_pending_batches
+        self.embed_workers = embed_workers
+        self.on_progress = on_progress
+        self.stats = IngestionStats()
+    
+    async def run(self, records: Union[Iterable[Dict], AsyncIterable[Dict]]) -> Dict:
+        """Ingest all records and return throughput stats"""
+        self.stats = IngestionStats()
+        
+        write_queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        embed_queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        upsert_queue = asyncio.Queue(maxsize=self.max_pending_batches)
+        
+        stages = [
+            asyncio.create_task(self._produce(records, write_queue)),
+            asyncio.create_task(self._run_stage(write_queue, embed_queue, self._write_batch)),
+            asyncio.create_task(
+                self._run_stage(embed_queue, upsert_queue, self._embed_batch, workers=self.embed_workers)
+            ),
+            asyncio.create_task(self._run_stage(upsert_queue, None, self._upsert_batch))
+        ]
+        
+        try:
+            await asyncio.gather(*stages)
+        except Exception:
+            # One failed stage would leave the others blocked on their queues
+            for stage in stages:
+                stage.cancel()
+            raise
+        
+        return self.stats.as_dict()
+    
+    async def _produce(self, records, outbox: asyncio.Queue):
+        """Group the record stream into batches"""
+        batch = []
+        
+        if hasattr(records, "__aiter__"):
+            async for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    await outbox.put(batch)
+                    batch = []
+        else:
+            for record in records:
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    await outbox.put(batch)
+                    batch = []
+        
+        if batch:
+            await outbox.put(batch)
+        
+        await outbox.put(_DONE)
+    
+    async def _run_stage(
+        self,
+        inbox: asyncio.Queue,
+        outbox: Optional[asyncio.Queue],
+        handler: Callable,
+        workers: int = 1
+    ):
+        """Run a stage with N workers, forwarding end-of-stream once all finish"""
+        async def worker():
+            while True:
+                batch = await inbox.get()
+                if batch is _DONE:
+                    # Let sibling workers see the marker too
+                    await inbox.put(_DONE)
+                    return
+                
+                result = await handler(batch)
+                
+                if outbox is not None:
+                    await outbox.put(result)
+        
+        await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+        
+        if outbox is not None:
+            await outbox.put(_DONE)
+    
+    async def _write_batch(self, batch: List[Dict]) -> List[Dict]:
+        """Commit one Firestore write batch for the records"""
+        def commit():
+            write_batch = self.db.batch()
+            for record in batch:
+                doc_ref = self.db.collection(record['collection']).document(record['doc_id'])
+                write_batch.set(doc_ref, record['data'])
+            write_batch.commit()
+        
+        await asyncio.to_thread(commit)
+        self.stats.written += len(batch)
+        return batch
+    
+    async def _embed_batch(self, batch: List[Dict]) -> List[Dict]:
+        """Chunk the record texts and embed every chunk in one batched call"""
+        await embed_records(batch)
+        self.stats.embedded += len(batch)
+        return batch
+    
+    async def _upsert_batch(self, batch: List[Dict]) -> List[Dict]:
+        """Upsert the batch's vectors"""
+        await upsert_records(batch)
+        
+        self.stats.upserted += len(batch)
+        if self.on_progress:
+            self.on_progress(self.stats)
+        
+        return batch
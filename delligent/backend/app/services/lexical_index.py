@@ -0,0 +1,203 @@
+import asyncio
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from app.services.firebase_service import firebase_service
+from app.services.user_indexes import UserIndexCache
+
+# Rebuild from Firestore after this long, to pick up writes made by other workers
+INDEX_TTL_SECONDS = 300
+
+# BM25 parameters (the usual defaults)
+K1 = 1.2
+B = 0.75
+
+# Subject / title terms count this many times over body terms
+TITLE_BOOST = 2
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are about any at be by do did does for from have i in is it me my "
+    "of on or show the this to was what when where which who with you your".split()
+)
+
+ID_FIELDS = {"email": "emailId", "task": "taskId"}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens: "PR #234" -> ["pr", "234"]"""
+    return [token for token in TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _item_terms(item_type: str, item: Dict) -> List[str]:
+    """Searchable terms of an email (subject, sender, body) or task (title, description, category, tags)"""
+    if item_type == "email":
+        sender = item.get('sender') or {}
+        title = item.get('subject') or ""
+        rest = [sender.get('name') or "", sender.get('email') or "", item.get('body') or ""]
+    else:
+        title = item.get('title') or ""
+        rest = [item.get('description') or "", item.get('category') or "", " ".join(item.get('tags') or [])]
+    return tokenize(title) * TITLE_BOOST + tokenize(" ".join(rest))
+
+
+class UserLexicalIndex:
+    """
+    BM25 inverted index over one user's emails and tasks.
+    
+    Postings are parallel arrays of document numbers and term frequencies.
+    Removing a document only tombstones it (length 0) and decrements its
+    terms' live document frequencies; postings are compacted once tombstones
+    pile up.
+    """
+    
+    def __init__(self):
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # term -> number of live documents containing it (postings also hold tombstones)
+        self.document_frequencies: Dict[str, int] = {}
+        self.lengths = array("I")
+        self.keys: List[Optional[Tuple[str, str]]] = []
+        self.items: List[Optional[Dict]] = []
+        self.numbers: Dict[Tuple[str, str], int] = {}
+        self.total_length = 0
+    
+    def __len__(self) -> int:
+        return len(self.numbers)
+    
+    def upsert(self, item_type: str, item: Dict):
+        item_id = item.get(ID_FIELDS[item_type])
+        if not item_id:
+            return
+        
+        self.remove(item_type, item_id)
+        
+        terms = Counter(_item_terms(item_type, item))
+        number = len(self.keys)
+        for term, count in terms.items():
+            documents, frequencies = self.postings.setdefault(term, (array("I"), array("H")))
+            documents.append(number)
+            frequencies.append(min(count, 65535))
+            self.document_frequencies[term] = self.document_frequencies.get(term, 0) + 1
+        
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.keys.append((item_type, item_id))
+        self.items.append(item)
+        self.numbers[(item_type, item_id)] = number
+        self.total_length += length
+    
+    def remove(self, item_type: str, item_id: str):
+        number = self.numbers.pop((item_type, item_id), None)
+        if number is None:
+            return
+        
+        for term in set(_item_terms(item_type, self.items[number])):
+            self.document_frequencies[term] -= 1
+        
+        self.total_length -= self.lengths[number]
+        self.lengths[number] = 0
+        self.keys[number] = None
+        self.items[number] = None
+        
+        if len(self.keys) - len(self.numbers) > max(64, len(self.numbers) // 4):
+            self._compact()
+    
+    def _compact(self):
+        """Drop tombstoned documents by re-indexing the live ones"""
+        live = [(key[0], item) for key, item in zip(self.keys, self.items) if key is not None]
+        self.postings = {}
+        self.document_frequencies = {}
+        self.lengths = array("I")
+        self.keys = []
+        self.items = []
+        self.numbers = {}
+        self.total_length = 0
+        for item_type, item in live:
+            self.upsert(item_type, item)
+    
+    def search(self, query: str, item_types: List[str], top_k: int) -> List[Dict]:
+        """Top BM25 matches among the given item types, best first"""
+        if not self.numbers:
+            return []
+        
+        count = len(self.numbers)
+        average_length = max(self.total_length / count, 1.0)
+        scores: Dict[int, float] = {}
+        
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            
+            documents, frequencies = postings
+            document_frequency = self.document_frequencies.get(term, 0)
+            if not document_frequency:
+                continue
+            idf = math.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5))
+            for number, frequency in zip(documents, frequencies):
+                length = self.lengths[number]
+                # Tombstoned, or a type the caller didn't ask for
+                if not length or self.keys[number][0] not in item_types:
+                    continue
+                
+                weight = frequency * (K1 + 1) / (frequency + K1 * (1 - B + B * length / average_length))
+                scores[number] = scores.get(number, 0.0) + idf * weight
+        
+        best = heapq.nlargest(
+            top_k,
+            ((number, score) for number, score in scores.items() if score > 0),
+            key=lambda entry: entry[1]
+        )
+        return [
+            {"type": self.keys[number][0], "item": self.items[number], "score": score}
+            for number, score in best
+        ]
+
+
+class LexicalIndex:
+    """
+    Per-user keyword index for exact-token lookups ("PR #234", a sender's
+    name, "Sprint 23") that embeddings handle poorly.
+    
+    Built in the background from one Firestore fetch per user, then kept up
+    to date by the email sync and task write paths, so searches never leave
+    the process.
+    """
+    
+    def __init__(self):
+        self._users: UserIndexCache[UserLexicalIndex] = UserIndexCache("keyword", self._build, INDEX_TTL_SECONDS)
+    
+    async def _build(self, user_id: str) -> UserLexicalIndex:
+        index = UserLexicalIndex()
+        emails, tasks = await asyncio.gather(
+            firebase_service.fetch(firebase_service.db.collection('emails').where('userId', '==', user_id)),
+            firebase_service.fetch(firebase_service.db.collection('tasks').where('userId', '==', user_id))
+        )
+        for email in emails:
+            index.upsert("email", email)
+        for task in tasks:
+            index.upsert("task", task)
+        return index
+    
+    def apply(self, user_id: str, item_type: str, item: Dict):
+        """Apply an email or task write to an already-built index"""
+        index = self._users.peek(user_id)
+        if index is not None:
+            index.upsert(item_type, item)
+    
+    def remove(self, user_id: str, item_type: str, item_ids: List[str]):
+        index = self._users.peek(user_id)
+        if index is not None:
+            for item_id in item_ids:
+                index.remove(item_type, item_id)
+    
+    async def search(self, user_id: str, query: str, item_types: List[str], top_k: int = 10) -> List[Dict]:
+        """BM25 matches as {"type", "item", "score"}, best first"""
+        index = await self._users.get(user_id)
+        return index.search(query, item_types, top_k)
+
+lexical_index = LexicalIndex()
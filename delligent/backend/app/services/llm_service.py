@@ -1,12 +1,241 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
 import google.generativeai as genai
 from app.config import settings
-from typing import Dict, List
+from app.services.circuit_breaker import CircuitOpenError, get_breaker
+from app.services.resilience import remaining
+from typing import AsyncIterator, Dict, List, Optional
+
+MODEL_NAME = "gemini-2.0-flash"
+
+# Provider-side context caching needs an explicit model version
+CACHED_MODEL_NAME = "gemini-2.0-flash-001"
+
+# Wait before trying to create the context cache again after a failure
+CACHE_RETRY_SECONDS = 300
+
+SYSTEM_PROMPT = """You are a helpful personal work assistant for an employee.
+
+Your responsibilities:
+- Summarize emails, tasks, and calendar events
+- Identify urgent items and action points
+- Provide clear, concise, and actionable information
+- Prioritize based on importance and deadlines
+
+Guidelines:
+- Be professional but friendly
+- Use bullet points for clarity
+- Highlight urgent items with appropriate emphasis
+- Always surface clear action items (use the listed ones where given)
+- Keep responses under 300 words
+- Do not make up information not in the context
+"""
+
+# Item templates, compiled once (bound str.format)
+EMAIL_TEMPLATE = """
+📧 Email:
+- Subject: {subject}
+- From: {sender_name} ({sender_email})
+- Received: {receivedAt}
+- Priority: {priority}
+- Preview: {preview}
+
+""".format
+
+# Emails enriched at ingestion carry a summary and action items instead of the raw preview
+ENRICHED_EMAIL_TEMPLATE = """
+📧 Email:
+- Subject: {subject}
+- From: {sender_name} ({sender_email})
+- Received: {receivedAt}
+- Priority: {priority} (urgency {urgency})
+- Summary: {summary}
+- Actions: {actions}
+
+""".format
+
+TASK_TEMPLATE = """
+📋 Task:
+- Title: {title}
+- Due: {dueDate}
+- Priority: {priority}
+- Status: {status}
+
+""".format
+
+# Tasks enriched at ingestion carry a summary and action items instead of the bare fields
+ENRICHED_TASK_TEMPLATE = """
+📋 Task:
+- Title: {title}
+- Due: {dueDate}
+- Priority: {priority} (urgency {urgency})
+- Status: {status}
+- Summary: {summary}
+- Actions: {actions}
+
+""".format
+
+EVENT_TEMPLATE = """
+📅 Event:
+- Title: {title}
+- Start: {startTime}
+- Location: {location}
+
+""".format
+
+AVAILABILITY_TEMPLATE = """
+🕒 Availability {day}, {start}-{end}:
+- Free: {free}
+- Busy: {busy}
+
+""".format
+
+USER_PROMPT_TEMPLATE = """User's question: "{query}"
+
+Here is relevant information from the employee's data:
+
+{context_text}
+
+Please provide a helpful response based on the above context.""".format
+
+# Several questions answered in one call, over their combined context
+BATCH_PROMPT_TEMPLATE = """The user asked several questions at once:
+
+{questions}
+
+Here is relevant information from the employee's data:
+
+{context_text}
+
+Answer each question on its own, based on the above context. Respond with a JSON array of strings: one answer per question, in the same order.""".format
+
+def _render_email(item: Dict) -> str:
+    sender = item.get('sender', {})
+    if item.get('summary'):
+        return ENRICHED_EMAIL_TEMPLATE(
+            subject=item.get('subject'),
+            sender_name=sender.get('name'),
+            sender_email=sender.get('email'),
+            receivedAt=item.get('receivedAt'),
+            priority=item.get('priority'),
+            urgency=item.get('urgencyScore', 0),
+            summary=item['summary'],
+            actions="; ".join(item.get('extractedActions') or []) or "none"
+        )
+    return EMAIL_TEMPLATE(
+        subject=item.get('subject'),
+        sender_name=sender.get('name'),
+        sender_email=sender.get('email'),
+        receivedAt=item.get('receivedAt'),
+        priority=item.get('priority'),
+        preview=item.get('bodyPreview', '')[:200]
+    )
+
+def _render_task(item: Dict) -> str:
+    if item.get('summary'):
+        return ENRICHED_TASK_TEMPLATE(
+            title=item.get('title'),
+            dueDate=item.get('dueDate'),
+            priority=item.get('priority'),
+            urgency=item.get('urgencyScore', 0),
+            status=item.get('status'),
+            summary=item['summary'],
+            actions="; ".join(item.get('extractedActions') or []) or "none"
+        )
+    return TASK_TEMPLATE(
+        title=item.get('title'),
+        dueDate=item.get('dueDate'),
+        priority=item.get('priority'),
+        status=item.get('status')
+    )
+
+def _render_event(item: Dict) -> str:
+    return EVENT_TEMPLATE(
+        title=item.get('title'),
+        startTime=item.get('startTime'),
+        location=item.get('location', 'N/A')
+    )
+
+def _slot(block: Dict) -> str:
+    return f"{block['start']:%H:%M}-{block['end']:%H:%M}"
+
+def _render_availability(item: Dict) -> str:
+    return "".join(
+        AVAILABILITY_TEMPLATE(
+            day=f"{day['start']:%a %b %d}",
+            start=f"{day['start']:%H:%M}",
+            end=f"{day['end']:%H:%M}",
+            free=", ".join(_slot(slot) for slot in day['free']) or "no free slots",
+            busy=", ".join(
+                f"{_slot(block)} ({', '.join(event.get('title') or 'event' for event in block['events'])})"
+                for block in day['busy']
+            ) or "nothing scheduled"
+        )
+        for day in item['days']
+    )
+
+RENDERERS = {
+    "email": _render_email,
+    "task": _render_task,
+    "event": _render_event,
+    "availability": _render_availability
+}
+
+PLURALS = {"email": "emails", "task": "tasks", "event": "events"}
+
+def _similar_note(item: Dict) -> str:
+    count = item.get('similarCount')
+    return f"({count} more similar {PLURALS[item['type']]} not shown)\n\n" if count else ""
+
+# Marks the end of a streamed response
+_STREAM_DONE = object()
 
 class LLMService:
     def __init__(self):
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        # Using gemini-2.0-flash - latest Gemini model
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.breaker = get_breaker("gemini")
+        # The static instructions are set once as the model's system instruction
+        self.plain_model = genai.GenerativeModel(MODEL_NAME, system_instruction=SYSTEM_PROMPT)
+        self.model = self.plain_model
+        
+        # When enabled and supported by the installed SDK, the instructions are
+        # also cached provider-side so they aren't re-processed per request.
+        # The cache is created (and refreshed) in the background; 0 means never.
+        caching = settings.LLM_CONTEXT_CACHE and hasattr(genai, "caching")
+        self._cache_refresh_at = time.monotonic() if caching else 0.0
+        self._cache_refresh: Optional[asyncio.Task] = None
+    
+    def _build_cached_model(self):
+        """Create the context cache and a model that uses it (blocking; run in a thread)"""
+        cache = genai.caching.CachedContent.create(
+            model=f"models/{CACHED_MODEL_NAME}",
+            system_instruction=SYSTEM_PROMPT,
+            ttl=timedelta(seconds=settings.LLM_CONTEXT_CACHE_TTL_SECONDS)
+        )
+        return genai.GenerativeModel.from_cached_content(cached_content=cache)
+    
+    async def _refresh_cache(self):
+        try:
+            self.model = await asyncio.to_thread(self._build_cached_model)
+            # Refresh a minute before the provider drops it
+            self._cache_refresh_at = time.monotonic() + settings.LLM_CONTEXT_CACHE_TTL_SECONDS - 60
+        except Exception as e:
+            # The provider rejects caches below its minimum size; plain system instruction still works
+            print(f"Error creating context cache, using system instruction: {e}")
+            self.model = self.plain_model
+            self._cache_refresh_at = time.monotonic() + CACHE_RETRY_SECONDS
+    
+    def _current_model(self):
+        """The model to call; starts a background cache refresh when one is due"""
+        if (
+            self._cache_refresh_at
+            and time.monotonic() >= self._cache_refresh_at
+            and (self._cache_refresh is None or self._cache_refresh.done())
+        ):
+            self._cache_refresh = asyncio.ensure_future(self._refresh_cache())
+        return self.model
     
     async def generate_response(
         self,
@@ -16,85 +245,215 @@ class LLMService:
     ) -> Dict:
         """Generate LLM response using RAG context with Gemini"""
         
-        # Build system prompt
-        system_prompt = self._build_system_prompt()
-        
-        # Build user prompt with context
+        # Only the per-request part is sent; the instructions live on the model
         user_prompt = self._build_user_prompt(query, context)
+        model = self._current_model()
         
-        # Combine prompts
-        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        try:
+            # Call Gemini API (off the event loop so the caller's deadline applies)
+            response = await self.breaker.call(
+                lambda: asyncio.to_thread(model.generate_content, user_prompt)
+            )
+        except Exception as e:
+            # Gemini is down or its circuit is open: answer from the retrieved context alone
+            print(f"Error generating response, using template summary: {e}")
+            return {
+                "response": self._template_response(context),
+                "tokens_used": 0,
+                "degraded": True
+            }
         
-        # Call Gemini API
-        response = self.model.generate_content(full_prompt)
+        return {
+            "response": response.text,
+            "tokens_used": self._tokens_used(user_prompt, response)
+        }
+    
+    async def generate_batch_response(
+        self,
+        queries: List[str],
+        contexts: List[Dict],
+        user_id: str
+    ) -> Dict:
+        """Answer several questions (each with its own context) in one Gemini call"""
+        user_prompt = self._build_batch_prompt(queries, contexts)
+        model = self._current_model()
         
-        # Estimate tokens (Gemini doesn't provide exact count in response)
-        estimated_tokens = len(full_prompt.split()) + len(response.text.split())
+        try:
+            response = await self.breaker.call(
+                lambda: asyncio.to_thread(
+                    model.generate_content,
+                    user_prompt,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+            )
+            answers = json.loads(response.text)
+            if not isinstance(answers, list) or len(answers) != len(queries):
+                raise ValueError(f"expected {len(queries)} answers, got {answers!r:.200}")
+        except Exception as e:
+            print(f"Error generating batch response, using template summaries: {e}")
+            return {
+                "responses": [self._template_response(context) for context in contexts],
+                "tokens_used": 0,
+                "degraded": True
+            }
         
         return {
-            "response": response.text,
-            "tokens_used": estimated_tokens
+            "responses": [str(answer) for answer in answers],
+            "tokens_used": self._tokens_used(user_prompt, response)
         }
     
-    def _build_system_prompt(self) -> str:
-        return """You are a helpful personal work assistant for an employee.
-
-Your responsibilities:
-- Summarize emails, tasks, and calendar events
-- Identify urgent items and action points
-- Provide clear, concise, and actionable information
-- Prioritize based on importance and deadlines
-
-Guidelines:
-- Be professional but friendly
-- Use bullet points for clarity
-- Highlight urgent items with appropriate emphasis
-- Always extract clear action items
-- Keep responses under 300 words
-- Do not make up information not in the context
-"""
+    def _tokens_used(self, user_prompt: str, response) -> int:
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and getattr(usage, "total_token_count", None):
+            return usage.total_token_count
+        # Estimate tokens when the response carries no usage metadata
+        return len(SYSTEM_PROMPT.split()) + len(user_prompt.split()) + len(response.text.split())
+    
+    async def stream_response(
+        self,
+        query: str,
+        context: Dict,
+        user_id: str,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the response text as Gemini produces it. Falls back to the
+        template summary if Gemini is unavailable before anything was sent.
+        Raises asyncio.TimeoutError if Gemini stalls for longer than
+        LLM_TIMEOUT_MS, or the stream runs past the (loop-time) deadline.
+        """
+        try:
+            # Admitted like any breaker call: when half-open, only one stream probes Gemini
+            probe = self.breaker.acquire()
+        except CircuitOpenError:
+            yield self._template_response(context)
+            return
+        
+        try:
+            user_prompt = self._build_user_prompt(query, context)
+            model = self._current_model()
+            loop = asyncio.get_running_loop()
+            chunks: asyncio.Queue = asyncio.Queue()
+            
+            def produce():
+                # Runs in a worker thread; the SDK's stream is a blocking iterator
+                try:
+                    for chunk in model.generate_content(user_prompt, stream=True):
+                        loop.call_soon_threadsafe(chunks.put_nowait, chunk.text)
+                    loop.call_soon_threadsafe(chunks.put_nowait, _STREAM_DONE)
+                except Exception as e:
+                    loop.call_soon_threadsafe(chunks.put_nowait, e)
+            
+            producer = asyncio.ensure_future(asyncio.to_thread(produce))
+            streamed = False
+            stall_timeout = settings.LLM_TIMEOUT_MS / 1000
+            while True:
+                left = remaining(deadline)
+                timeout = stall_timeout if left is None else min(stall_timeout, left)
+                try:
+                    item = await asyncio.wait_for(chunks.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    # A stall is Gemini's fault; running out of request time isn't
+                    if timeout == stall_timeout:
+                        self.breaker.record_failure()
+                    raise
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, Exception):
+                    self.breaker.record_failure()
+                    print(f"Error streaming response: {item}")
+                    if not streamed:
+                        yield self._template_response(context)
+                    return
+                
+                if not streamed:
+                    # The stream opened and produced output: Gemini is healthy
+                    self.breaker.record_success()
+                    streamed = True
+                yield item
+            
+            if not streamed:
+                self.breaker.record_success()
+            await producer
+        finally:
+            if probe:
+                self.breaker.release()
+    
+    def _template_response(self, context: Dict) -> str:
+        """Plain summary of the retrieved items, used when the LLM is unavailable"""
+        lines = ["The assistant is temporarily unavailable. Here is what I found in your data:", ""]
+        
+        labels = {"email": "📧 Emails", "task": "📋 Tasks", "event": "📅 Events", "availability": "🕒 Free time"}
+        for item_type, label in labels.items():
+            items = [item for item in context['items'] if item.get('type') == item_type]
+            if not items:
+                continue
+            
+            lines.append(f"{label}:")
+            for item in items:
+                if item_type == 'email':
+                    sender = item.get('sender', {}).get('name') or item.get('sender', {}).get('email')
+                    lines.append(f"- {item.get('subject')} (from {sender}, {item.get('priority')} priority)")
+                elif item_type == 'task':
+                    lines.append(f"- {item.get('title')} (due {item.get('dueDate')}, {item.get('status')})")
+                elif item_type == 'availability':
+                    for day in item['days']:
+                        free = ", ".join(_slot(slot) for slot in day['free']) or "no free slots"
+                        lines.append(f"- {day['start']:%a %b %d}: {free}")
+                else:
+                    lines.append(f"- {item.get('title')} ({item.get('startTime')})")
+                if item.get('similarCount'):
+                    lines[-1] += f" and {item['similarCount']} similar"
+            lines.append("")
+        
+        if not context['items']:
+            lines.append("No relevant items found.")
+        
+        return "\n".join(lines).strip()
     
     def _build_user_prompt(self, query: str, context: Dict) -> str:
         """Build user prompt with retrieved context"""
+        parts = [
+            RENDERERS[item['type']](item) + _similar_note(item)
+            for item in context['items']
+            if item.get('type') in RENDERERS
+        ]
         
-        context_text = "Here is relevant information from the employee's data:\n\n"
+        if not context['items']:
+            parts.append("No relevant items found in the database.\n\n")
         
-        for item in context['items']:
-            if item.get('type') == 'email':
-                context_text += f"""
-📧 Email:
-- Subject: {item.get('subject')}
-- From: {item.get('sender', {}).get('name')} ({item.get('sender', {}).get('email')})
-- Received: {item.get('receivedAt')}
-- Priority: {item.get('priority')}
-- Preview: {item.get('bodyPreview', '')[:200]}
-
-"""
-            elif item.get('type') == 'task':
-                context_text += f"""
-📋 Task:
-- Title: {item.get('title')}
-- Due: {item.get('dueDate')}
-- Priority: {item.get('priority')}
-- Status: {item.get('status')}
-
-"""
-            elif item.get('type') == 'event':
-                context_text += f"""
-📅 Event:
-- Title: {item.get('title')}
-- Start: {item.get('startTime')}
-- Location: {item.get('location', 'N/A')}
-
-"""
+        if context.get('partial'):
+            missing = ", ".join(s['id'] for s in context['sources'] if s.get('type') == 'degraded')
+            parts.append(f"Note: some sources were unavailable ({missing}). Mention that the answer may be incomplete.\n\n")
         
-        if not context['items']:
-            context_text += "No relevant items found in the database.\n\n"
+        return USER_PROMPT_TEMPLATE(query=query, context_text="".join(parts))
+    
+    def _build_batch_prompt(self, queries: List[str], contexts: List[Dict]) -> str:
+        """Numbered questions over the union of their contexts, each item rendered once"""
+        items = {}
+        for context in contexts:
+            for item in context['items']:
+                key = (item.get('type'), item.get('emailId') or item.get('taskId') or item.get('eventId') or item.get('title'))
+                items.setdefault(key, item)
         
-        return f"""User's question: "{query}"
-
-{context_text}
-
-Please provide a helpful response based on the above context."""
+        parts = [
+            RENDERERS[item['type']](item) + _similar_note(item)
+            for item in items.values()
+            if item.get('type') in RENDERERS
+        ]
+        
+        if not items:
+            parts.append("No relevant items found in the database.\n\n")
+        
+        missing = ", ".join(dict.fromkeys(
+            source['id'] for context in contexts for source in context['sources'] if source.get('type') == 'degraded'
+        ))
+        if missing:
+            parts.append(f"Note: some sources were unavailable ({missing}). Mention that the answers may be incomplete.\n\n")
+        
+        return BATCH_PROMPT_TEMPLATE(
+            questions="\n".join(f"{i}. {query}" for i, query in enumerate(queries, 1)),
+            context_text="".join(parts)
+        )
 
 llm_service = LLMService()
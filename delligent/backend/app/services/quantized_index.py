@@ -0,0 +1,178 @@
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional
+import numpy as np
+
+MODES = ("int8", "binary")
+
+# Set bits per byte value, for Hamming distance over packed sign codes
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint16)
+
+# Same shape as a Pinecone match, so search results can be handled alike
+Match = namedtuple("Match", ["id", "score", "metadata"])
+
+
+def matches_filter(metadata: Dict, filter_dict: Optional[Dict]) -> bool:
+    """Evaluate a Pinecone-style metadata filter ($eq/$ne/$in/$nin/$gt/$gte/$lt/$lte, $and/$or)"""
+    if not filter_dict:
+        return True
+    
+    for key, condition in filter_dict.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        
+        for op, operand in condition.items():
+            if op == "$eq" and value != operand:
+                return False
+            if op == "$ne" and value == operand:
+                return False
+            if op == "$in" and value not in operand:
+                return False
+            if op == "$nin" and value in operand:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if not isinstance(value, (int, float)):
+                    return False
+                if op == "$gt" and not value > operand:
+                    return False
+                if op == "$gte" and not value >= operand:
+                    return False
+                if op == "$lt" and not value < operand:
+                    return False
+                if op == "$lte" and not value <= operand:
+                    return False
+    return True
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class QuantizedIndex:
+    """
+    In-memory index of compressed vectors for cosine search.
+    
+    - int8: each unit vector scaled into [-127, 127] with its own scale (~4x smaller)
+    - binary: one sign bit per dimension, compared by Hamming distance (~32x smaller)
+    
+    Codes only pick candidates; the top rescore_multiplier * top_k are rescored
+    at full precision when a fetch function for the original vectors is given.
+    """
+    
+    def __init__(self, mode: str = "int8", dim: int = 768, rescore_multiplier: int = 4):
+        if mode not in MODES:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+        
+        self.mode = mode
+        self.dim = dim
+        self.rescore_multiplier = rescore_multiplier
+        self.ids: List[str] = []
+        self.metadata: List[Dict] = []
+        self._positions: Dict[str, int] = {}
+        
+        if mode == "int8":
+            self._codes = np.zeros((0, dim), dtype=np.int8)
+        else:
+            self._codes = np.zeros((0, (dim + 7) // 8), dtype=np.uint8)
+        self._scales = np.zeros(0, dtype=np.float32)
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the codes (and int8 scales)"""
+        return self._codes.nbytes + (self._scales.nbytes if self.mode == "int8" else 0)
+    
+    def _encode(self, vectors: np.ndarray):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        if self.mode == "binary":
+            return np.packbits(vectors > 0, axis=1), np.zeros(len(vectors), dtype=np.float32)
+        
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+    
+    def add(self, vectors: List[Dict]):
+        """Add or replace Pinecone-style records ({"id", "values", "metadata"})"""
+        if not vectors:
+            return
+        
+        self.remove([vector["id"] for vector in vectors])
+        codes, scales = self._encode([vector["values"] for vector in vectors])
+        
+        for vector in vectors:
+            self._positions[vector["id"]] = len(self.ids)
+            self.ids.append(vector["id"])
+            self.metadata.append(vector.get("metadata") or {})
+        self._codes = np.concatenate([self._codes, codes])
+        self._scales = np.concatenate([self._scales, scales])
+    
+    def remove(self, ids: List[str]):
+        positions = [self._positions[vector_id] for vector_id in ids if vector_id in self._positions]
+        if not positions:
+            return
+        
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[positions] = False
+        self.ids = [vector_id for vector_id, kept in zip(self.ids, keep) if kept]
+        self.metadata = [metadata for metadata, kept in zip(self.metadata, keep) if kept]
+        self._codes = self._codes[keep]
+        self._scales = self._scales[keep]
+        self._positions = {vector_id: position for position, vector_id in enumerate(self.ids)}
+    
+    def approximate_scores(self, query: List[float], positions: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of the query to the vectors at positions"""
+        codes, query_scales = self._encode([query])
+        if self.mode == "binary":
+            distances = POPCOUNT[np.bitwise_xor(self._codes[positions], codes[0])].sum(axis=1)
+            return 1 - 2 * distances / self.dim
+        
+        dots = self._codes[positions].astype(np.int32) @ codes[0].astype(np.int32)
+        return dots * self._scales[positions] * query_scales[0]
+    
+    def search(
+        self,
+        query: List[float],
+        top_k: int,
+        filter_dict: Optional[Dict] = None,
+        fetch_full: Optional[Callable[[List[str]], Dict[str, List[float]]]] = None
+    ) -> List[Match]:
+        """Top matches by approximate score, rescored at full precision when fetch_full is given"""
+        positions = np.array([
+            position for position, metadata in enumerate(self.metadata)
+            if matches_filter(metadata, filter_dict)
+        ], dtype=np.int64)
+        if len(positions) == 0:
+            return []
+        
+        scores = self.approximate_scores(query, positions)
+        n_candidates = min(len(positions), top_k * self.rescore_multiplier if fetch_full else top_k)
+        best = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates = positions[best]
+        candidate_scores = scores[best]
+        
+        if fetch_full:
+            full = fetch_full([self.ids[position] for position in candidates])
+            kept = [i for i, position in enumerate(candidates) if self.ids[position] in full]
+            if kept:
+                candidates = candidates[kept]
+                originals = _normalize(np.array([full[self.ids[p]] for p in candidates], dtype=np.float32))
+                query_unit = _normalize(np.array([query], dtype=np.float32))[0]
+                candidate_scores = originals @ query_unit
+        
+        order = np.argsort(-candidate_scores)[:top_k]
+        return [
+            Match(self.ids[candidates[i]], float(candidate_scores[i]), self.metadata[candidates[i]])
+            for i in order
+        ]
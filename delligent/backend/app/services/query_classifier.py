@@ -2,6 +2,10 @@ import re
 from typing import Dict, List
 from datetime import datetime, timedelta
 
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer"""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
 class QueryClassifier:
     def __init__(self):
         self.intent_patterns = {
@@ -15,7 +19,12 @@ class QueryClassifier:
                 r"meeting",
                 r"calendar",
                 r"schedule",
-                r"appointment"
+                r"appointment",
+                r"\bfree\b",
+                r"\bbusy\b",
+                r"availab",
+                r"overlap",
+                r"conflict"
             ],
             "task_query": [
                 r"task",
@@ -31,6 +40,9 @@ class QueryClassifier:
         }
         
         self.urgency_keywords = ["urgent", "asap", "important", "critical", "high priority"]
+        # Questions about open time, answered with free slots rather than events
+        self.availability_patterns = [r"\bfree\b", r"availab", r"\bopen (slot|time)", r"\bfit (in|it)\b"]
+        self.day_parts = ["morning", "afternoon", "evening"]
         self.time_keywords = {
             "today": 0,
             "tomorrow": 1,
@@ -71,6 +83,8 @@ class QueryClassifier:
             "intents": detected_intents,
             "is_urgent": is_urgent,
             "time_range": time_range,
+            "availability": any(re.search(pattern, query_lower) for pattern in self.availability_patterns),
+            "day_part": next((part for part in self.day_parts if part in query_lower), None),
             "original_query": query
         }
 
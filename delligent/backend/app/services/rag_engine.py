@@ -1,20 +1,247 @@
-from typing import Dict, Optional
-from app.services.query_classifier import query_classifier
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+from app.services.query_classifier import query_classifier, normalize_query
 from app.services.context_builder import ContextBuilder
+from app.services.retrieval_planner import retrieval_planner
 from app.services.llm_service import llm_service
-from app.services.firebase_service import firebase_service
+from app.services.conversation_writer import conversation_writer
+from app.services.resilience import deadline_in, remaining
+from app.services.admission_control import generation_admission
+from app.services.singleflight import SingleFlight
+from app.services.data_version import data_versions
+from app.services.cache import TTLCache
+from app.services.briefing_service import briefing_service, is_briefing_query
+from app.config import settings
+
+# Shared across engines: identical chat requests in flight run the pipeline once
+chat_flights = SingleFlight("chat")
 
 class RAGEngine:
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, session: bool = False):
+        """
+        session=True keeps warm per-user caches for a long-lived chat session:
+        query embeddings and recent contexts.
+        """
         self.user_id = user_id
-        self.context_builder = ContextBuilder(user_id)
+        self.session = session
+        self.context_cache = TTLCache(maxsize=16, ttl=settings.SESSION_CONTEXT_TTL_SECONDS) if session else None
+        self.context_builder = ContextBuilder(
+            user_id,
+            embedding_cache=TTLCache(maxsize=64, ttl=3600) if session else None
+        )
     
     async def process_query(
         self,
         query: str,
         conversation_id: Optional[str] = None
     ) -> Dict:
-        """Main RAG pipeline"""
+        """
+        Run the RAG pipeline, sharing the result with identical requests already
+        in flight (same user, normalized query, conversation and data version).
+        """
+        key = (self.user_id, normalize_query(query), conversation_id, data_versions.get(self.user_id))
+        return await chat_flights.do(key, lambda: self._run_pipeline(query, conversation_id))
+    
+    async def _run_pipeline(self, query: str, conversation_id: Optional[str]) -> Dict:
+        """
+        Main RAG pipeline.
+        
+        The whole request shares one deadline: retrieval answers with whatever
+        arrives in time, and generation gets the rest (raises asyncio.TimeoutError).
+        Raises AdmissionRejected when the user or the worker is over its generation limit.
+        """
+        # "What do I need to do today?" is answered from the precomputed briefing
+        briefing = await self._briefing(query)
+        if briefing is not None:
+            conversation = await self._save(query, conversation_id, briefing['summary'], briefing)
+            return {
+                "conversation_id": conversation['id'],
+                "response": briefing['summary'],
+                "context_sources": briefing['sources'],
+                "timestamp": conversation['timestamp'],
+                "tokens_used": 0,
+                "partial": False
+            }
+        
+        deadline = deadline_in(settings.REQUEST_DEADLINE_MS / 1000)
+        
+        # Reject over-rate users before doing any retrieval work
+        generation_admission.reserve(self.user_id)
+        
+        # Steps 1-2: Classify query intent and retrieve relevant context
+        context = await self._retrieve(query, deadline)
+        
+        # Step 3: Generate LLM response
+        async with generation_admission.slot(deadline):
+            llm_response = await asyncio.wait_for(
+                llm_service.generate_response(
+                    query=query,
+                    context=context,
+                    user_id=self.user_id
+                ),
+                timeout=min(settings.LLM_TIMEOUT_MS / 1000, remaining(deadline))
+            )
+        
+        # Step 4: Save conversation
+        conversation = await self._save(query, conversation_id, llm_response['response'], context)
+        
+        return {
+            "conversation_id": conversation['id'],
+            "response": llm_response['response'],
+            "context_sources": context['sources'],
+            "timestamp": conversation['timestamp'],
+            "tokens_used": llm_response['tokens_used'],
+            "partial": context.get('partial', False) or llm_response.get('degraded', False)
+        }
+    
+    async def stream_query(
+        self,
+        query: str,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        RAG pipeline that yields events as it goes: "context" once retrieval is
+        done, "delta" for each chunk of response text, then "done" with the
+        saved conversation.
+        """
+        briefing = await self._briefing(query)
+        if briefing is not None:
+            conversation = await self._save(query, conversation_id, briefing['summary'], briefing)
+            yield {"type": "context", "context_sources": briefing['sources'], "partial": False}
+            yield {"type": "delta", "text": briefing['summary']}
+            yield {
+                "type": "done",
+                "conversation_id": conversation['id'],
+                "response": briefing['summary'],
+                "timestamp": conversation['timestamp'].isoformat(),
+                "tokens_used": 0,
+                "partial": False
+            }
+            return
+        
+        deadline = deadline_in(settings.REQUEST_DEADLINE_MS / 1000)
+        generation_admission.reserve(self.user_id)
+        
+        context = await self._retrieve(query, deadline)
+        yield {
+            "type": "context",
+            "context_sources": context['sources'],
+            "partial": context.get('partial', False)
+        }
+        
+        chunks = []
+        async with generation_admission.slot(deadline):
+            # The whole stream shares the request deadline, not just each chunk
+            async for text in llm_service.stream_response(query, context, self.user_id, deadline):
+                chunks.append(text)
+                yield {"type": "delta", "text": text}
+        
+        response = "".join(chunks)
+        conversation = await self._save(query, conversation_id, response, context)
+        
+        yield {
+            "type": "done",
+            "conversation_id": conversation['id'],
+            "response": response,
+            "timestamp": conversation['timestamp'].isoformat(),
+            # Estimate: streamed chunks carry no usage metadata
+            "tokens_used": len(query.split()) + len(response.split()),
+            "partial": context.get('partial', False)
+        }
+    
+    async def process_batch(self, queries: List[str]) -> Dict:
+        """
+        Answer several questions at once (dashboard widgets). Repeated
+        questions are answered once, the query embeddings come from one
+        batched call, and the answers from one LLM call over the combined
+        context. Answers are not saved as conversations.
+        """
+        deadline = deadline_in(settings.REQUEST_DEADLINE_MS / 1000)
+        
+        unique: Dict[str, str] = {}
+        for query in queries:
+            unique.setdefault(normalize_query(query), query)
+        
+        answers: Dict[str, Dict] = {}
+        tokens_used = 0
+        for key, query in unique.items():
+            briefing = await self._briefing(query)
+            if briefing is not None:
+                answers[key] = {
+                    "response": briefing['summary'],
+                    "context_sources": briefing['sources'],
+                    "partial": False
+                }
+        
+        pending = [key for key in unique if key not in answers]
+        if pending:
+            generation_admission.reserve(self.user_id)
+            
+            contexts = await self._retrieve_batch([unique[key] for key in pending], deadline)
+            
+            async with generation_admission.slot(deadline):
+                generated = await asyncio.wait_for(
+                    llm_service.generate_batch_response(
+                        queries=[unique[key] for key in pending],
+                        contexts=contexts,
+                        user_id=self.user_id
+                    ),
+                    timeout=min(settings.LLM_TIMEOUT_MS / 1000, remaining(deadline))
+                )
+            
+            tokens_used = generated['tokens_used']
+            for key, context, response in zip(pending, contexts, generated['responses']):
+                answers[key] = {
+                    "response": response,
+                    "context_sources": context['sources'],
+                    "partial": context.get('partial', False) or generated.get('degraded', False)
+                }
+        
+        return {
+            "answers": [{"question": query, **answers[normalize_query(query)]} for query in queries],
+            "timestamp": datetime.now(),
+            "tokens_used": tokens_used
+        }
+    
+    async def _retrieve_batch(self, queries: List[str], deadline: float) -> List[Dict]:
+        """Contexts for several questions, with their query embeddings computed in one call"""
+        intents = await asyncio.gather(*(query_classifier.classify(query) for query in queries))
+        plans = [retrieval_planner.plan(query, intent) for query, intent in zip(queries, intents)]
+        
+        # A builder of its own whose embedding cache holds the batch's embeddings
+        context_builder = ContextBuilder(self.user_id, embedding_cache=TTLCache(maxsize=len(queries), ttl=60))
+        await context_builder.prefetch_embeddings(
+            [query for query, plan in zip(queries, plans) if plan['embed']],
+            deadline
+        )
+        
+        # Identical structured reads across the questions share one round trip (Firestore
+        # reads are coalesced) or are served from the in-memory working set and indexes
+        return await asyncio.gather(*(
+            context_builder.build_context(query=query, intent=intent, deadline=deadline, plan=plan)
+            for query, intent, plan in zip(queries, intents, plans)
+        ))
+    
+    async def _briefing(self, query: str) -> Optional[Dict]:
+        """The user's fresh precomputed briefing, if the query asks for one"""
+        if not is_briefing_query(query):
+            return None
+        
+        try:
+            return await briefing_service.cached(self.user_id)
+        except Exception as e:
+            # Fall through to the live pipeline
+            print(f"Error reading briefing: {e}")
+            return None
+    
+    async def _retrieve(self, query: str, deadline: float) -> Dict:
+        """Classify the query and build its context, reusing a recent one in sessions"""
+        cache_key = (normalize_query(query), data_versions.get(self.user_id))
+        if self.context_cache is not None:
+            context = self.context_cache.get(cache_key)
+            if context is not None:
+                return context
         
         # Step 1: Classify query intent
         intent = await query_classifier.classify(query)
@@ -22,29 +249,21 @@ class RAGEngine:
         # Step 2: Retrieve relevant context (parallel)
         context = await self.context_builder.build_context(
             query=query,
-            intent=intent
+            intent=intent,
+            deadline=deadline
         )
         
-        # Step 3: Generate LLM response
-        llm_response = await llm_service.generate_response(
-            query=query,
-            context=context,
-            user_id=self.user_id
-        )
-        
-        # Step 4: Save conversation
-        conversation = await firebase_service.save_conversation(
+        # Partial contexts aren't reused; the next turn gets another try
+        if self.context_cache is not None and not context.get('partial'):
+            self.context_cache.set(cache_key, context)
+        return context
+    
+    async def _save(self, query: str, conversation_id: Optional[str], response: str, context: Dict) -> Dict:
+        """Queue the turn for saving; the conversation ID and timestamp are known at once"""
+        return await conversation_writer.save(
             user_id=self.user_id,
             conversation_id=conversation_id,
             user_message=query,
-            assistant_message=llm_response['response'],
+            assistant_message=response,
             context_sources=context['sources']
         )
-        
-        return {
-            "conversation_id": conversation['id'],
-            "response": llm_response['response'],
-            "context_sources": context['sources'],
-            "timestamp": conversation['timestamp'],
-            "tokens_used": llm_response['tokens_used']
-        }
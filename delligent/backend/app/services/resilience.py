@@ -0,0 +1,73 @@
+import asyncio
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Cancel message for attempts that lost to another attempt of the same hedged call
+HEDGE_LOST = "hedge lost"
+
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left until a loop-time deadline (None means no deadline)"""
+    if deadline is None:
+        return None
+    return max(0.0, deadline - asyncio.get_running_loop().time())
+
+
+def deadline_in(seconds: float, cap: Optional[float] = None) -> float:
+    """Loop-time deadline `seconds` from now, never later than `cap`"""
+    deadline = asyncio.get_running_loop().time() + seconds
+    return min(deadline, cap) if cap is not None else deadline
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    hedge_after: float,
+    attempts: int = 2,
+    timeout: Optional[float] = None
+) -> T:
+    """
+    Run call() with hedging: if it hasn't finished after `hedge_after` seconds,
+    or it fails, start another attempt (at most `attempts` in total). The first
+    successful result wins and the other attempts are cancelled (with
+    HEDGE_LOST as the message, so breakers don't count them as slow calls).
+    
+    Raises asyncio.TimeoutError if nothing succeeds within `timeout`.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout is not None else None
+    running = set()
+    launched = 0
+    last_error: Optional[BaseException] = None
+    lost = None
+    
+    try:
+        while True:
+            if launched < attempts:
+                running.add(asyncio.ensure_future(call()))
+                launched += 1
+            
+            wait_for = hedge_after if launched < attempts else None
+            if deadline is not None:
+                left = deadline - loop.time()
+                if left <= 0:
+                    raise asyncio.TimeoutError()
+                wait_for = left if wait_for is None else min(wait_for, left)
+            
+            done, running = await asyncio.wait(
+                running,
+                timeout=wait_for,
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            
+            for task in done:
+                if task.exception() is None:
+                    lost = HEDGE_LOST
+                    return task.result()
+                last_error = task.exception()
+            
+            if not running and launched >= attempts:
+                raise last_error
+    finally:
+        for task in running:
+            task.cancel(msg=lost)
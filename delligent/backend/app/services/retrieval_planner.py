@@ -0,0 +1,161 @@
+import math
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+from app.config import settings
+from app.services.circuit_breaker import get_breaker
+
+# Starting latency estimates (seconds) until live measurements come in
+DEFAULT_LATENCIES = {
+    "embedding": 0.25,
+    "vector": 0.15,
+    "email": 0.12,
+    "task": 0.12,
+    "event": 0.12,
+    "deadline": 0.01,
+    "lexical": 0.001,
+    "availability": 0.01
+}
+
+INTENT_SOURCES = {
+    "email_query": "email",
+    "task_query": "task",
+    "calendar_query": "event",
+    "deadline_query": "deadline"
+}
+
+# When vectors are being skipped for cost, still run them on every Nth query
+# so the latency estimate can recover once the backend speeds up
+PROBE_EVERY = 20
+
+# Sources whose content semantic search can improve
+VECTOR_SOURCES = ("email", "task")
+
+# Sources covered by the in-memory keyword index
+LEXICAL_SOURCES = ("email", "task")
+
+# Exact-token patterns: PR/ticket numbers, quoted phrases, "Sprint 23", emails.
+# Only identifier shapes: "top 5 emails" or "in 3 days" must keep semantic search.
+LEXICAL_PATTERNS = [
+    r"#\d+",
+    r"\"[^\"]+\"",
+    r"\b[A-Z]{2,}-\d+\b",
+    r"(?i:\b(?:pr|ticket|issue|bug|sprint|release|invoice)[- ]?#?\d+\b)",
+    r"\b[\w.+-]+@[\w-]+\.[\w.]+\b"
+]
+
+
+class LatencyTracker:
+    """Exponentially weighted moving average of each source's observed latency"""
+    
+    def __init__(self, alpha: float = 0.2):
+        self.alpha = alpha
+        self._estimates: Dict[str, float] = dict(DEFAULT_LATENCIES)
+    
+    def observe(self, source: str, seconds: float):
+        previous = self._estimates.get(source)
+        if previous is None:
+            self._estimates[source] = seconds
+        else:
+            self._estimates[source] = (1 - self.alpha) * previous + self.alpha * seconds
+    
+    def estimate(self, source: str) -> float:
+        return self._estimates.get(source, 0.1)
+    
+    @contextmanager
+    def measure(self, source: str):
+        """Time a block (including awaits inside it) and record it for the source"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(source, time.perf_counter() - started)
+    
+    def snapshot(self) -> Dict[str, float]:
+        return {source: round(seconds * 1000, 1) for source, seconds in self._estimates.items()}
+
+
+class RetrievalPlanner:
+    """
+    Turns QueryClassifier output into a retrieval plan: which sources to hit,
+    whether the query needs an embedding or a keyword lookup, and top-k per source.
+    """
+    
+    def __init__(self, max_context_items: int = 10):
+        self.max_context_items = max_context_items
+        self.tracker = LatencyTracker()
+        self.budget_seconds = settings.RETRIEVAL_BUDGET_MS / 1000
+        self._skips_since_probe = 0
+    
+    def is_lexical(self, query: str) -> bool:
+        return any(re.search(pattern, query) for pattern in LEXICAL_PATTERNS)
+    
+    def plan(self, query: str, intent: Dict) -> Dict:
+        sources: List[str] = []
+        for intent_type in intent['intents']:
+            source = INTENT_SOURCES.get(intent_type)
+            if source and source not in sources:
+                sources.append(source)
+        
+        is_general = not sources or intent['intents'] == ["general_query"]
+        if is_general:
+            sources = ["email", "task", "event"]
+        
+        # "When am I free?" needs free slots from the calendar index, not just events
+        if intent.get('availability') and "event" in sources and not is_general:
+            sources.append("availability")
+        
+        # Semantic search only pays off for free-text content (emails, tasks).
+        # Pure calendar or deadline questions are answered by structured queries.
+        vector_types = [source for source in sources if source in VECTOR_SOURCES]
+        
+        # Events ride along on a vector query that is happening anyway
+        if vector_types and "event" in sources:
+            vector_types.append("event")
+        
+        vector_cost = self.tracker.estimate("embedding") + self.tracker.estimate("vector")
+        structured_cost = max((self.tracker.estimate(source) for source in sources), default=0.0)
+        
+        lexical = self.is_lexical(query)
+        lexical_types = [source for source in sources if source in LEXICAL_SOURCES]
+        
+        skipped_vectors = False
+        vectors_down = bool(vector_types) and not (
+            get_breaker("embedding").available and get_breaker("pinecone").available
+        )
+        if vectors_down:
+            # Degrade to Firestore-only retrieval instead of waiting on a failing backend
+            vector_types = []
+        elif lexical and lexical_types:
+            # Exact tokens ("PR #234", "Sprint 23") are found by the keyword
+            # index; an embedding would cost a round trip and match them poorly
+            vector_types = []
+        elif is_general and vector_types and vector_cost > self.budget_seconds:
+            # A vague query doesn't justify a slow embedding round trip when
+            # structured sources can still answer within budget
+            self._skips_since_probe += 1
+            if self._skips_since_probe < PROBE_EVERY:
+                vector_types = []
+                skipped_vectors = True
+            else:
+                self._skips_since_probe = 0
+        
+        # Split the context budget across sources, with a little slack for merging
+        per_source_k = min(self.max_context_items, max(3, math.ceil(self.max_context_items / len(sources)) + 1))
+        
+        return {
+            "sources": {source: per_source_k for source in sources},
+            "vector_types": vector_types,
+            "embed": bool(vector_types),
+            "lexical": lexical,
+            # The keyword index also stands in for semantic search when vectors are skipped or down
+            "lexical_types": lexical_types if (lexical or skipped_vectors or vectors_down) else [],
+            "skipped_vectors": skipped_vectors,
+            "vectors_down": vectors_down,
+            "estimated_seconds": round(
+                max(structured_cost, vector_cost if vector_types else 0.0), 3
+            )
+        }
+
+retrieval_planner = RetrievalPlanner()
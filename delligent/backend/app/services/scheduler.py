@@ -0,0 +1,102 @@
+import asyncio
+import time
+from datetime import date, datetime
+from typing import Dict, Optional
+from app.config import settings
+from app.services.firebase_service import firebase_service
+from app.services.briefing_service import briefing_service
+from app.services.data_version import data_versions
+
+# How often the scheduler wakes up to check for work
+TICK_SECONDS = 30
+
+
+class BriefingScheduler:
+    """
+    Background job that keeps daily briefings precomputed.
+    
+    - Once a day at BRIEFING_HOUR it builds every user's briefing, spreading
+      the LLM calls (BRIEFING_CONCURRENCY at a time) over the off-peak hour.
+    - After a user's data changes it rebuilds their briefing once writes have
+      been quiet for BRIEFING_REFRESH_DELAY_SECONDS, if they already have one today.
+    
+    With several workers each runs its own scheduler; the daily run skips
+    users whose stored briefing is already from today.
+    """
+    
+    def __init__(self):
+        self._changed: Dict[str, float] = {}
+        self._last_daily_run: Optional[date] = None
+        self._task: Optional[asyncio.Task] = None
+        data_versions.subscribe(self.mark_changed)
+    
+    def mark_changed(self, user_id: str):
+        self._changed[user_id] = time.monotonic()
+    
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+    
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TICK_SECONDS)
+            try:
+                now = datetime.now()
+                if now.hour == settings.BRIEFING_HOUR and self._last_daily_run != now.date():
+                    self._last_daily_run = now.date()
+                    built = await self.precompute_all()
+                    print(f"✓ Precomputed {built} daily briefings")
+                
+                await self._refresh_changed()
+            except Exception as e:
+                print(f"Error in briefing scheduler: {e}")
+    
+    async def _refresh_changed(self):
+        """Rebuild briefings of users whose writes have settled"""
+        settled = [
+            user_id for user_id, changed_at in self._changed.items()
+            if time.monotonic() - changed_at >= settings.BRIEFING_REFRESH_DELAY_SECONDS
+        ]
+        today = datetime.now().date().isoformat()
+        for user_id in settled:
+            del self._changed[user_id]
+            # Only users who have a briefing today (on any worker); the rest get one at the next daily run
+            if not briefing_service.has_today(user_id):
+                stored = await firebase_service.get_briefing(user_id)
+                if not stored or stored.get('date') != today:
+                    continue
+            await briefing_service.refresh(user_id, background=True)
+    
+    async def precompute_all(self) -> int:
+        """Build today's briefing for every user that doesn't have one yet"""
+        user_ids = await asyncio.to_thread(
+            lambda: [doc.id for doc in firebase_service.db.collection('users').select([]).stream()]
+        )
+        today = datetime.now().date().isoformat()
+        semaphore = asyncio.Semaphore(settings.BRIEFING_CONCURRENCY)
+        
+        async def build(user_id: str) -> bool:
+            async with semaphore:
+                try:
+                    stored = await firebase_service.get_briefing(user_id)
+                    if stored and stored.get('date') == today and not stored.get('degraded'):
+                        return False
+                    await briefing_service.refresh(user_id, background=True)
+                    return True
+                except Exception as e:
+                    print(f"Error precomputing briefing for {user_id}: {e}")
+                    return False
+        
+        results = await asyncio.gather(*(build(user_id) for user_id in user_ids))
+        return sum(results)
+
+briefing_scheduler = BriefingScheduler()
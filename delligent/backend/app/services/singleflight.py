@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight,
+    later callers with the same key await its result instead of starting
+    their own. Nothing is cached once the call finishes.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, float]] = {}
+        self._calls = 0
+        self._shared = 0
+        _flights[name] = self
+    
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[T]],
+        max_age: Optional[float] = None
+    ) -> T:
+        """
+        Run fn() for the key, or join the call already in flight.
+        
+        With max_age, a call that has been running longer than that is not
+        joined; a fresh one replaces it (so hedged retries stay independent).
+        """
+        entry = self._inflight.get(key)
+        if entry is not None:
+            future, started = entry
+            if max_age is None or time.monotonic() - started < max_age:
+                self._shared += 1
+                # Shielded: one waiter giving up must not cancel the others
+                return await asyncio.shield(future)
+        
+        self._calls += 1
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = (future, time.monotonic())
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+    
+    def _forget(self, key: Hashable, future: asyncio.Future):
+        entry = self._inflight.get(key)
+        if entry is not None and entry[0] is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Mark the exception retrieved when every waiter has gone away
+            future.exception()
+    
+    def metrics(self) -> Dict:
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self._calls,
+            "shared": self._shared
+        }
+
+
+_flights: Dict[str, SingleFlight] = {}
+
+def flight_metrics() -> Dict[str, Dict]:
+    return {name: flight.metrics() for name, flight in _flights.items()}
@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from app.services.firebase_service import firebase_service
+from app.services.vector_service import vector_service
+from app.services.ingestion_pipeline import IngestionPipeline, email_record
+from app.services.data_version import data_versions
+from app.services.lexical_index import lexical_index
+from app.services.enrichment_service import enrichment_service
+from app.services.working_set import working_sets
+
+
+def _changed_at(email: Dict) -> Optional[datetime]:
+    """When an email last changed, as an aware UTC datetime"""
+    value = email.get('updatedAt') or email.get('receivedAt')
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class FirestoreMailboxSource:
+    """
+    Mailbox source backed by the Firestore `emails` collection, which is
+    where the importers write. Syncing from it brings content hashes and
+    the vector index up to date with the documents. Emails flagged
+    `isDeleted` are reported as deletions.
+    
+    A real provider (Gmail, Graph, IMAP) plugs in by implementing the
+    same `name` + `fetch_changes` interface.
+    """
+    name = "firestore"
+    
+    async def fetch_changes(self, user_id: str, since: Optional[datetime]) -> List[Dict]:
+        """
+        Get emails changed since the watermark (all emails when since is None).
+        
+        The watermark is pushed into Firestore so an incremental sync reads
+        only changed emails. An email's change time is updatedAt, falling back
+        to receivedAt, so both fields are queried (composite indexes on
+        userId + updatedAt and userId + receivedAt). The watermark is
+        inclusive: emails sharing its timestamp come back again and are
+        skipped by the content-hash check.
+        """
+        query = firebase_service.db.collection('emails').where('userId', '==', user_id)
+        if not since:
+            return await firebase_service.fetch(query)
+        
+        updated, received = await asyncio.gather(
+            firebase_service.fetch(query.where('updatedAt', '>=', since)),
+            firebase_service.fetch(query.where('receivedAt', '>=', since))
+        )
+        emails = {e.get('emailId'): e for e in received + updated}
+        
+        # An email updated before the watermark but received after it isn't a change
+        return [e for e in emails.values() if _changed_at(e) and _changed_at(e) >= since]
+
+
+class SyncService:
+    def __init__(self, source=None):
+        self.source = source or FirestoreMailboxSource()
+    
+    async def sync_emails(self, user_id: str, full: bool = False, source=None) -> Dict:
+        """
+        Incrementally sync a user's mailbox.
+        
+        Only emails whose content hash differs from the stored one are
+        re-embedded and upserted; deletions reported by the source (or, on a
+        full sync, emails the source no longer returns) are removed from
+        Firestore and the vector index.
+        """
+        source = source or self.source
+        state_key = f"emails_{source.name}"
+        
+        state = await firebase_service.get_sync_state(user_id, state_key)
+        since = None if full else state.get('watermark')
+        
+        changes = await source.fetch_changes(user_id, since)
+        
+        deleted_ids = [e['emailId'] for e in changes if e.get('isDeleted')]
+        records = [
+            email_record({**e, 'userId': user_id})
+            for e in changes
+            if not e.get('isDeleted')
+        ]
+        
+        # Compare against stored hashes; unchanged emails cost no embedding work
+        stored_hashes = await firebase_service.get_content_hashes(
+            'emails', [r['doc_id'] for r in records] + deleted_ids
+        )
+        if since is not None:
+            # Deletions re-reported at the watermark were already applied
+            deleted_ids = [doc_id for doc_id in deleted_ids if doc_id in stored_hashes]
+        changed = [
+            r for r in records
+            if stored_hashes.get(r['doc_id']) != r['data']['contentHash']
+        ]
+        for record in changed:
+            # Updated emails may have had more chunks than their new version
+            record['replaces'] = record['doc_id'] in stored_hashes
+        
+        if since is None:
+            # Full sync: anything stored that the source no longer returns was deleted upstream
+            live_ids = {r['doc_id'] for r in records}
+            known_ids = await firebase_service.get_user_doc_ids('emails', user_id)
+            deleted_ids += [
+                doc_id for doc_id in known_ids
+                if doc_id not in live_ids and doc_id not in deleted_ids
+            ]
+        
+        if changed:
+            await IngestionPipeline(firebase_service.db, on_progress=None).run(changed)
+            for record in changed:
+                lexical_index.apply(user_id, 'email', record['data'])
+                enrichment_service.submit('email', record['data'])
+        
+        if deleted_ids:
+            lexical_index.remove(user_id, 'email', deleted_ids)
+            await vector_service.delete_documents(user_id, 'email', deleted_ids)
+            await firebase_service.delete_documents('emails', deleted_ids)
+        
+        if since is None:
+            # Also sweep vectors whose document is gone (e.g. deleted outside a sync)
+            prefix = vector_service.vector_id(user_id, 'email', '')
+            live_vector_ids = {vector_service.vector_id(user_id, 'email', doc_id) for doc_id in live_ids}
+            orphaned = [
+                vector_id
+                for vector_id in await vector_service.collect_vector_ids(user_id, prefix=prefix)
+                if vector_service.parent_id(vector_id) not in live_vector_ids
+            ]
+            if orphaned:
+                await vector_service.delete_vectors(user_id, orphaned)
+        
+        if changed or deleted_ids:
+            try:
+                if changed:
+                    await working_sets.apply(user_id, 'email', [record['data'] for record in changed])
+                if deleted_ids:
+                    await working_sets.remove(user_id, 'email', deleted_ids)
+            except Exception as e:
+                # The working set repairs itself at its next rebuild
+                print(f"Error updating working set for {user_id}: {e}")
+            data_versions.bump(user_id)
+        
+        change_times = [t for t in (_changed_at(e) for e in changes) if t]
+        watermark = max(change_times + ([since] if since else []), default=None)
+        
+        result = {
+            "fetched": len(changes),
+            "unchanged": len(records) - len(changed),
+            "upserted": len(changed),
+            "deleted": len(deleted_ids),
+            "full_sync": since is None
+        }
+        
+        await firebase_service.update_sync_state(user_id, state_key, {
+            "watermark": watermark,
+            "lastSyncAt": datetime.now(timezone.utc),
+            "lastResult": result
+        })
+        
+        return {**result, "watermark": watermark}
+
+sync_service = SyncService()
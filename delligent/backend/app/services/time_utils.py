@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+# Day offset and length of each classified time range keyword
+DAY_SPANS = {
+    "today": (0, 1),
+    "tomorrow": (1, 1),
+    "this week": (0, 7),
+    "next week": (7, 7)
+}
+
+
+def to_epoch(value) -> Optional[float]:
+    """
+    Convert a datetime to epoch seconds.
+    Naive datetimes are treated as UTC, which is how Firestore stores them.
+    """
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def day_bounds(time_range: Optional[Dict], now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """
+    Whole-day [start, end) for a classified time range: "today" runs to
+    midnight rather than to now, "next week" is the 7 days after this one.
+    Without a range, today.
+    """
+    offset, days = DAY_SPANS.get((time_range or {}).get('keyword'), (0, 1))
+    start = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=offset)
+    return start, start + timedelta(days=days)
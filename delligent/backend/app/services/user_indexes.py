@@ -0,0 +1,68 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, Optional, Tuple, TypeVar
+from app.config import settings
+
+T = TypeVar("T")
+
+
+class UserIndexCache(Generic[T]):
+    """
+    Per-user in-memory indexes built from Firestore, least recently used
+    evicted past INDEX_MAX_USERS.
+    
+    Builds run as their own tasks, off the request path: a caller cut short
+    by its deadline stops waiting but the build carries on, and later callers
+    join it instead of starting another full read. An index older than `ttl`
+    keeps serving while its replacement is built in the background.
+    """
+    
+    def __init__(self, name: str, build: Callable[[str], Awaitable[T]], ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self._build = build
+        self._entries: "OrderedDict[str, Tuple[T, float]]" = OrderedDict()
+        self._builds: Dict[str, asyncio.Task] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def peek(self, user_id: str) -> Optional[T]:
+        """The user's loaded index, if any (never builds one)"""
+        entry = self._entries.get(user_id)
+        return entry[0] if entry is not None else None
+    
+    async def get(self, user_id: str) -> T:
+        """The user's index, waiting for its first build if it isn't loaded yet"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries.move_to_end(user_id)
+            if time.monotonic() - entry[1] >= self.ttl:
+                self._start_build(user_id)
+            return entry[0]
+        
+        # Shielded: one waiter giving up must not cancel the build
+        return await asyncio.shield(self._start_build(user_id))
+    
+    def _start_build(self, user_id: str) -> asyncio.Task:
+        build = self._builds.get(user_id)
+        if build is None:
+            build = self._builds[user_id] = asyncio.ensure_future(self._run_build(user_id))
+            build.add_done_callback(lambda done: self._finished(user_id, done))
+        return build
+    
+    async def _run_build(self, user_id: str) -> T:
+        index = await self._build(user_id)
+        self._entries[user_id] = (index, time.monotonic())
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > settings.INDEX_MAX_USERS:
+            self._entries.popitem(last=False)
+        return index
+    
+    def _finished(self, user_id: str, build: asyncio.Task):
+        if self._builds.get(user_id) is build:
+            del self._builds[user_id]
+        # Background rebuilds have no waiter to report to
+        if not build.cancelled() and build.exception() is not None:
+            print(f"Error building {self.name} index for user {user_id}: {build.exception()}")
@@ -1,10 +1,34 @@
 from pinecone import Pinecone, ServerlessSpec
 from app.config import settings
 from typing import List, Dict, Optional
+import asyncio
 import time
+from collections import OrderedDict
+from datetime import datetime
+from app.services.time_utils import to_epoch
+from app.services.circuit_breaker import get_breaker
+
+# Field holding each item type's timestamp; vectors also store it as "<field>Ts" epoch seconds
+TIME_FIELDS = {
+    "email": "receivedAt",
+    "task": "dueDate",
+    "event": "startTime"
+}
+
+# Rebuild a user's quantized local index after this long, to pick up writes made by other workers
+LOCAL_INDEX_TTL_SECONDS = 300
 
 class VectorService:
     def __init__(self):
+        self.breaker = get_breaker("pinecone", slow_call_seconds=settings.RETRIEVAL_CALL_TIMEOUT_MS * 0.8 / 1000)
+        
+        # none: query Pinecone directly; int8 / binary: search compressed per-user copies in memory.
+        # Set for this service's index; the app uses one index (PINECONE_INDEX_NAME).
+        self.quantization = settings.VECTOR_QUANTIZATION
+        # user_id -> (QuantizedIndex, loaded_at), least recently searched first
+        self._local_indexes: "OrderedDict[str, tuple]" = OrderedDict()
+        self._local_builds: Dict[str, asyncio.Task] = {}
+        
         # Initialize Pinecone
         self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
         
@@ -34,128 +58,425 @@ class VectorService:
         # Connect to index
         self.index = self.pc.Index(index_name)
     
-    async def add_email_embedding(
+    def namespace(self, user_id: str) -> str:
+        """Each user's vectors live in their own namespace, so queries only scan that tenant"""
+        return f"user_{user_id}"
+    
+    def vector_id(self, user_id: str, item_type: str, item_id: str) -> str:
+        return f"{user_id}_{item_type}_{item_id}"
+    
+    def chunk_id(self, parent_id: str, chunk: int) -> str:
+        """Chunk 0 keeps the document's vector ID; later chunks get a #c<n> suffix"""
+        return parent_id if chunk == 0 else f"{parent_id}#c{chunk}"
+    
+    def parent_id(self, vector_id: str) -> str:
+        return vector_id.split("#c", 1)[0]
+    
+    def build_vector(
         self,
-        email_id: str,
+        item_type: str,
+        item_id: str,
         user_id: str,
         text: str,
         embedding: List[float],
         metadata: Dict
-    ):
-        """Add email embedding to Pinecone"""
-        vector_id = f"{user_id}_email_{email_id}"
-        
-        self.index.upsert(
-            vectors=[
-                {
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "userId": user_id,
-                        "emailId": email_id,
-                        "type": "email",
-                        "priority": metadata.get("priority", "medium"),
-                        "sender": metadata.get("sender", ""),
-                        "receivedAt": str(metadata.get("receivedAt", "")),
-                        "labels": ",".join(metadata.get("labels", [])),
-                        "text": text[:1000]  # Store snippet for reference
-                    }
-                }
-            ]
-        )
+    ) -> Dict:
+        """Build a Pinecone vector record for an email, task or event"""
+        vector_metadata = {
+            "userId": user_id,
+            "type": item_type,
+            "text": text[:settings.CHUNK_MAX_CHARS]  # Store the (chunk) text for reference
+        }
+        
+        if item_type == "email":
+            vector_metadata.update({
+                "emailId": item_id,
+                "priority": metadata.get("priority", "medium"),
+                "sender": metadata.get("sender", ""),
+                "receivedAt": str(metadata.get("receivedAt", "")),
+                "labels": ",".join(metadata.get("labels", []))
+            })
+        elif item_type == "task":
+            vector_metadata.update({
+                "taskId": item_id,
+                "priority": metadata.get("priority", "medium"),
+                "status": metadata.get("status", "pending"),
+                "dueDate": str(metadata.get("dueDate", ""))
+            })
+        elif item_type == "event":
+            vector_metadata.update({
+                "eventId": item_id,
+                "startTime": str(metadata.get("startTime", ""))
+            })
+        else:
+            raise ValueError(f"Unknown vector type: {item_type}")
+        
+        # Numeric copy of the timestamp so searches can filter on time ranges
+        time_field = TIME_FIELDS[item_type]
+        timestamp = to_epoch(metadata.get(time_field))
+        if timestamp is not None:
+            vector_metadata[f"{time_field}Ts"] = timestamp
+        
+        if metadata.get("contentHash"):
+            vector_metadata["contentHash"] = metadata["contentHash"]
+        
+        return {
+            "id": self.vector_id(user_id, item_type, item_id),
+            "values": embedding,
+            "metadata": vector_metadata
+        }
     
-    async def add_task_embedding(
+    def build_vectors(
         self,
-        task_id: str,
+        item_type: str,
+        item_id: str,
         user_id: str,
-        text: str,
-        embedding: List[float],
+        chunks: List[str],
+        embeddings: List[List[float]],
         metadata: Dict
-    ):
-        """Add task embedding to Pinecone"""
-        vector_id = f"{user_id}_task_{task_id}"
-        
-        self.index.upsert(
-            vectors=[
-                {
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "userId": user_id,
-                        "taskId": task_id,
-                        "type": "task",
-                        "priority": metadata.get("priority", "medium"),
-                        "status": metadata.get("status", "pending"),
-                        "dueDate": str(metadata.get("dueDate", "")),
-                        "text": text[:1000]
-                    }
-                }
-            ]
-        )
+    ) -> List[Dict]:
+        """Build one vector per chunk of a document, tagged with the shared parent ID"""
+        vectors = []
+        for chunk, (text, embedding) in enumerate(zip(chunks, embeddings)):
+            vector = self.build_vector(item_type, item_id, user_id, text, embedding, metadata)
+            if len(chunks) > 1:
+                parent_id = vector["id"]
+                vector["id"] = self.chunk_id(parent_id, chunk)
+                vector["metadata"].update({
+                    "parentId": parent_id,
+                    "chunk": chunk,
+                    "chunkCount": len(chunks)
+                })
+            vectors.append(vector)
+        return vectors
+    
+    async def delete_stale_chunks(self, user_id: str, item_type: str, item_id: str, keep: int):
+        """Delete chunks numbered keep and above, left over from a longer earlier version"""
+        parent_id = self.vector_id(user_id, item_type, item_id)
+        stale = [
+            vector_id
+            for vector_id in await self.collect_vector_ids(user_id, prefix=f"{parent_id}#c")
+            if int(vector_id.rsplit("#c", 1)[1]) >= keep
+        ]
+        if stale:
+            await self.delete_vectors(user_id, stale)
+    
+    async def delete_documents(self, user_id: str, item_type: str, item_ids: List[str]):
+        """Delete every vector (all chunks) of the given documents"""
+        parent_ids = {self.vector_id(user_id, item_type, item_id) for item_id in item_ids}
+        # One listing of the type's IDs finds every document's chunks
+        chunk_ids = [
+            vector_id
+            for vector_id in await self.collect_vector_ids(user_id, prefix=self.vector_id(user_id, item_type, ''))
+            if vector_id not in parent_ids and self.parent_id(vector_id) in parent_ids
+        ]
+        await self.delete_vectors(user_id, list(parent_ids) + chunk_ids)
+    
+    async def upsert_vectors(self, vectors: List[Dict], batch_size: int = 100):
+        """Upsert prebuilt vectors in batches without blocking the event loop"""
+        # Batches may mix users; each user's vectors go to their own namespace
+        by_user: Dict[str, List[Dict]] = {}
+        for vector in vectors:
+            by_user.setdefault(vector["metadata"]["userId"], []).append(vector)
+        
+        for user_id, user_vectors in by_user.items():
+            for i in range(0, len(user_vectors), batch_size):
+                await self.breaker.call(lambda: asyncio.to_thread(
+                    self.index.upsert,
+                    vectors=user_vectors[i:i + batch_size],
+                    namespace=self.namespace(user_id)
+                ))
+            
+            local = self._local_indexes.get(user_id)
+            if local:
+                local[0].add([self._local_record(vector) for vector in user_vectors])
+    
+    async def delete_vectors(self, user_id: str, ids: List[str], batch_size: int = 1000):
+        """Delete a user's vectors by ID in batches"""
+        local = self._local_indexes.get(user_id)
+        if local:
+            local[0].remove(ids)
+        
+        for i in range(0, len(ids), batch_size):
+            await asyncio.to_thread(
+                self.index.delete,
+                ids=ids[i:i + batch_size],
+                namespace=self.namespace(user_id)
+            )
     
-    async def add_event_embedding(
+    def list_vector_ids(
         self,
-        event_id: str,
         user_id: str,
-        text: str,
-        embedding: List[float],
-        metadata: Dict
+        prefix: str = "",
+        namespace: Optional[str] = None,
+        page_size: int = 100
     ):
-        """Add event embedding to Pinecone"""
-        vector_id = f"{user_id}_event_{event_id}"
-        
-        self.index.upsert(
-            vectors=[
-                {
-                    "id": vector_id,
-                    "values": embedding,
-                    "metadata": {
-                        "userId": user_id,
-                        "eventId": event_id,
-                        "type": "event",
-                        "startTime": str(metadata.get("startTime", "")),
-                        "text": text[:1000]
-                    }
-                }
+        """Yield pages of a user's vector IDs matching an ID prefix"""
+        namespace = self.namespace(user_id) if namespace is None else namespace
+        pagination_token = None
+        
+        while True:
+            page = self.index.list_paginated(
+                prefix=prefix or f"{user_id}_",
+                limit=page_size,
+                namespace=namespace,
+                pagination_token=pagination_token
+            )
+            ids = [vector.id for vector in page.vectors]
+            if ids:
+                yield ids
+            
+            pagination_token = page.pagination.next if page.pagination else None
+            if not pagination_token:
+                break
+    
+    async def collect_vector_ids(self, user_id: str, prefix: str = "", namespace: Optional[str] = None) -> List[str]:
+        """All of a user's vector IDs matching an ID prefix, listed off the event loop"""
+        vector_ids = []
+        pages = self.list_vector_ids(user_id, prefix=prefix, namespace=namespace)
+        while True:
+            ids = await asyncio.to_thread(next, pages, None)
+            if ids is None:
+                break
+            vector_ids.extend(ids)
+        return vector_ids
+    
+    async def delete_by_prefix(self, user_id: str, prefix: str = "", namespace: Optional[str] = None) -> int:
+        """Delete every vector whose ID starts with prefix, one listed page at a time"""
+        namespace = self.namespace(user_id) if namespace is None else namespace
+        deleted = 0
+        
+        pages = self.list_vector_ids(user_id, prefix=prefix, namespace=namespace, page_size=1000)
+        while True:
+            ids = await asyncio.to_thread(next, pages, None)
+            if ids is None:
+                break
+            await asyncio.to_thread(self.index.delete, ids=ids, namespace=namespace)
+            deleted += len(ids)
+        
+        return deleted
+    
+    async def migrate_user_to_namespace(self, user_id: str, batch_size: int = 100) -> int:
+        """Move a user's legacy vectors from the shared default namespace into theirs"""
+        moved = 0
+        
+        # List pages are keyed on the last ID seen, so deleting listed IDs is safe mid-scan
+        pages = self.list_vector_ids(user_id, namespace="", page_size=batch_size)
+        while True:
+            ids = await asyncio.to_thread(next, pages, None)
+            if ids is None:
+                break
+            
+            fetched = await asyncio.to_thread(self.index.fetch, ids=ids, namespace="")
+            # The "<uid>_" prefix also lists users whose ID extends this one; only move our own
+            vectors = [
+                {"id": vector_id, "values": vector.values, "metadata": vector.metadata}
+                for vector_id, vector in fetched.vectors.items()
+                if (vector.metadata or {}).get("userId") == user_id
             ]
-        )
+            if vectors:
+                await asyncio.to_thread(
+                    self.index.upsert,
+                    vectors=vectors,
+                    namespace=self.namespace(user_id)
+                )
+                await asyncio.to_thread(self.index.delete, ids=[vector["id"] for vector in vectors], namespace="")
+            moved += len(vectors)
+        
+        return moved
     
-    async def search_emails(
-        self,
-        user_id: str,
-        query_embedding: List[float],
-        filters: Optional[Dict] = None,
-        top_k: int = 5
-    ) -> Dict:
-        """Semantic search for emails in Pinecone"""
-        # Build filter
+    def _type_filter(self, item_type: str, filters: Optional[Dict]) -> Dict:
+        """Metadata filter for one item type"""
         filter_dict = {
-            "userId": {"$eq": user_id},
-            "type": {"$eq": "email"}
+            "type": {"$eq": item_type}
         }
         
-        if filters:
+        if filters and item_type in ("email", "task"):
             if "priority" in filters and filters["priority"]:
                 filter_dict["priority"] = {"$eq": filters["priority"]}
         
+        if filters:
+            # Per-type windows ("time_ranges") override a shared "time_range"
+            time_range = (filters.get("time_ranges") or {}).get(item_type) or filters.get("time_range")
+            if time_range:
+                bounds = {}
+                if time_range.get("start"):
+                    bounds["$gte"] = to_epoch(time_range["start"])
+                if time_range.get("end"):
+                    bounds["$lte"] = to_epoch(time_range["end"])
+                if bounds:
+                    filter_dict[f"{TIME_FIELDS[item_type]}Ts"] = bounds
+        
+        return filter_dict
+    
+    async def search(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        types: List[str],
+        filters: Optional[Dict] = None,
+        per_type_k: int = 5
+    ) -> Dict[str, Dict]:
+        """
+        Semantic search across several item types with a single Pinecone query.
+        Results are split client-side into one ChromaDB-style result per type.
+        """
+        split = {item_type: {"ids": [[]], "distances": [[]], "metadatas": [[]], "documents": [[]]} for item_type in types}
+        
+        if not types:
+            return split
+        
+        type_filters = [self._type_filter(item_type, filters) for item_type in types]
+        if len(type_filters) == 1:
+            filter_dict = type_filters[0]
+        elif all(len(f) == 1 for f in type_filters):
+            filter_dict = {"type": {"$in": list(types)}}
+        else:
+            filter_dict = {"$or": type_filters}
+        
+        # Over-fetch so one dominant type (or one long document's chunks) doesn't crowd out the rest
+        top_k = min(per_type_k * len(types) * 3, 100)
+        
+        try:
+            # Until the user's local copy has been built in the background, Pinecone answers
+            local = self._cached_local_index(user_id) if self.quantization != "none" else None
+            if local is not None:
+                matches = await self._search_local(local, user_id, query_embedding, filter_dict, top_k)
+            else:
+                results = await self.breaker.call(lambda: asyncio.to_thread(
+                    self.index.query,
+                    vector=query_embedding,
+                    filter=filter_dict,
+                    top_k=top_k,
+                    include_metadata=True,
+                    namespace=self.namespace(user_id)
+                ))
+                matches = results.matches
+        except Exception as e:
+            print(f"Error searching {', '.join(types)} in Pinecone: {e}")
+            return split
+        
+        # Collapse chunks into one hit per document
+        documents = self._aggregate_chunks(matches)
+        
+        # Convert to format similar to ChromaDB
+        for parent_id, score, match in documents:
+            bucket = split.get(match.metadata.get("type"))
+            if bucket is None or len(bucket["ids"][0]) >= per_type_k:
+                continue
+            bucket["ids"][0].append(parent_id)
+            bucket["distances"][0].append(1 - min(score, 1.0))  # Convert similarity to distance
+            bucket["metadatas"][0].append(match.metadata)
+            bucket["documents"][0].append(match.metadata.get("text", ""))
+        
+        return split
+    
+    def _local_record(self, vector: Dict) -> Dict:
+        # The chunk text is the bulk of the metadata and retrieval never reads it
+        metadata = {key: value for key, value in (vector.get("metadata") or {}).items() if key != "text"}
+        return {"id": vector["id"], "values": vector["values"], "metadata": metadata}
+    
+    def _cached_local_index(self, user_id: str):
+        """
+        The user's quantized index, or None if it isn't loaded yet. A missing
+        or expired copy is (re)built in the background, off the request path;
+        an expired one keeps serving until the new one is ready.
+        """
+        entry = self._local_indexes.get(user_id)
+        if entry is None or time.monotonic() - entry[1] >= LOCAL_INDEX_TTL_SECONDS:
+            build = self._local_builds.get(user_id)
+            if build is None or build.done():
+                self._local_builds[user_id] = asyncio.ensure_future(self._build_local_index(user_id))
+        
+        if entry is None:
+            return None
+        self._local_indexes.move_to_end(user_id)
+        return entry[0]
+    
+    async def _build_local_index(self, user_id: str):
+        """Load the user's namespace into a quantized index, evicting the least recently searched users"""
         try:
-            results = self.index.query(
-                vector=query_embedding,
-                filter=filter_dict,
-                top_k=top_k,
-                include_metadata=True
+            # Imported here so numpy is only needed when quantization is enabled
+            from app.services.quantized_index import QuantizedIndex
+            
+            local = QuantizedIndex(
+                self.quantization,
+                dim=768,
+                rescore_multiplier=max(1, settings.VECTOR_RESCORE_MULTIPLIER)
             )
+            namespace = self.namespace(user_id)
             
-            # Convert to format similar to ChromaDB
-            return {
-                "ids": [[match.id for match in results.matches]],
-                "distances": [[1 - match.score for match in results.matches]],  # Convert similarity to distance
-                "metadatas": [[match.metadata for match in results.matches]],
-                "documents": [[match.metadata.get("text", "") for match in results.matches]]
-            }
+            pages = self.list_vector_ids(user_id, page_size=100)
+            while True:
+                ids = await asyncio.to_thread(next, pages, None)
+                if ids is None:
+                    break
+                fetched = await asyncio.to_thread(self.index.fetch, ids=ids, namespace=namespace)
+                local.add([
+                    self._local_record({"id": vector_id, "values": vector.values, "metadata": vector.metadata})
+                    for vector_id, vector in fetched.vectors.items()
+                ])
+            
+            self._local_indexes[user_id] = (local, time.monotonic())
+            self._local_indexes.move_to_end(user_id)
+            while len(self._local_indexes) > settings.VECTOR_LOCAL_INDEX_MAX_USERS:
+                self._local_indexes.popitem(last=False)
         except Exception as e:
-            print(f"Error searching emails in Pinecone: {e}")
-            return {"ids": [[]], "distances": [[]], "metadatas": [[]], "documents": [[]]}
+            print(f"Error building local vector index for user {user_id}: {e}")
+        finally:
+            self._local_builds.pop(user_id, None)
+    
+    async def _search_local(self, local, user_id: str, query_embedding: List[float], filter_dict: Dict, top_k: int) -> List:
+        """
+        Pick candidates from the user's quantized index, then rescore them
+        against their full-precision vectors fetched from Pinecone.
+        """
+        namespace = self.namespace(user_id)
+        
+        def fetch_full(ids: List[str]) -> Dict[str, List[float]]:
+            fetched = self.index.fetch(ids=ids, namespace=namespace)
+            return {vector_id: vector.values for vector_id, vector in fetched.vectors.items()}
+        
+        return await self.breaker.call(lambda: asyncio.to_thread(
+            local.search,
+            query_embedding,
+            top_k,
+            filter_dict,
+            fetch_full if settings.VECTOR_RESCORE_MULTIPLIER > 0 else None
+        ))
+    
+    def _aggregate_chunks(self, matches) -> List:
+        """
+        Group chunk matches by parent document and score each document by its
+        best chunk ("max") or the sum of its top CHUNK_SUM_TOP chunks ("sum").
+        Returns (parent_id, score, best_match) sorted by score.
+        """
+        by_parent: Dict[str, List] = {}
+        for match in matches:
+            by_parent.setdefault(self.parent_id(match.id), []).append(match)
+        
+        documents = []
+        for parent_id, chunk_matches in by_parent.items():
+            chunk_matches.sort(key=lambda m: m.score, reverse=True)
+            if settings.CHUNK_AGGREGATION == "sum":
+                score = sum(m.score for m in chunk_matches[:settings.CHUNK_SUM_TOP])
+            else:
+                score = chunk_matches[0].score
+            documents.append((parent_id, score, chunk_matches[0]))
+        
+        documents.sort(key=lambda document: document[1], reverse=True)
+        return documents
+    
+    async def search_emails(
+        self,
+        user_id: str,
+        query_embedding: List[float],
+        filters: Optional[Dict] = None,
+        top_k: int = 5
+    ) -> Dict:
+        """Semantic search for emails in Pinecone"""
+        results = await self.search(user_id, query_embedding, ["email"], filters, per_type_k=top_k)
+        return results["email"]
     
     async def search_tasks(
         self,
@@ -165,52 +486,65 @@ class VectorService:
         top_k: int = 5
     ) -> Dict:
         """Semantic search for tasks in Pinecone"""
-        filter_dict = {
-            "userId": {"$eq": user_id},
-            "type": {"$eq": "task"}
-        }
-        
-        if filters:
-            if "priority" in filters and filters["priority"]:
-                filter_dict["priority"] = {"$eq": filters["priority"]}
+        results = await self.search(user_id, query_embedding, ["task"], filters, per_type_k=top_k)
+        return results["task"]
+    
+    async def backfill_time_metadata(self, user_id: str, batch_size: int = 100) -> int:
+        """Add numeric time fields to a user's vectors written before they existed"""
+        namespace = self.namespace(user_id)
+        updated = 0
         
-        try:
-            results = self.index.query(
-                vector=query_embedding,
-                filter=filter_dict,
-                top_k=top_k,
-                include_metadata=True
-            )
+        pages = self.list_vector_ids(user_id, page_size=batch_size)
+        while True:
+            ids = await asyncio.to_thread(next, pages, None)
+            if ids is None:
+                break
             
-            return {
-                "ids": [[match.id for match in results.matches]],
-                "distances": [[1 - match.score for match in results.matches]],
-                "metadatas": [[match.metadata for match in results.matches]],
-                "documents": [[match.metadata.get("text", "") for match in results.matches]]
-            }
-        except Exception as e:
-            print(f"Error searching tasks in Pinecone: {e}")
-            return {"ids": [[]], "distances": [[]], "metadatas": [[]], "documents": [[]]}
+            fetched = await asyncio.to_thread(self.index.fetch, ids=ids, namespace=namespace)
+            for vector_id, vector in fetched.vectors.items():
+                metadata = vector.metadata or {}
+                time_field = TIME_FIELDS.get(metadata.get("type"))
+                if not time_field or f"{time_field}Ts" in metadata or not metadata.get(time_field):
+                    continue
+                
+                try:
+                    timestamp = to_epoch(datetime.fromisoformat(metadata[time_field]))
+                except ValueError:
+                    continue
+                
+                await asyncio.to_thread(
+                    self.index.update,
+                    id=vector_id,
+                    set_metadata={f"{time_field}Ts": timestamp},
+                    namespace=namespace
+                )
+                updated += 1
+        
+        return updated
     
     async def delete_user_data(self, user_id: str):
         """Delete all data for a user (GDPR compliance)"""
+        build = self._local_builds.pop(user_id, None)
+        if build is not None:
+            build.cancel()
+        self._local_indexes.pop(user_id, None)
+        
         try:
-            # Pinecone doesn't support wildcard deletion, so we need to query first
-            # This is a simplified version - in production, you'd need pagination
-            for data_type in ["email", "task", "event"]:
-                results = self.index.query(
-                    vector=[0] * 768,  # Dummy vector
-                    filter={
-                        "userId": {"$eq": user_id},
-                        "type": {"$eq": data_type}
-                    },
-                    top_k=10000,
-                    include_metadata=False
-                )
-                
-                if results.matches:
-                    ids_to_delete = [match.id for match in results.matches]
-                    self.index.delete(ids=ids_to_delete)
+            # The user's namespace holds all of their vectors; drop it in one call
+            await asyncio.to_thread(
+                self.index.delete,
+                delete_all=True,
+                namespace=self.namespace(user_id)
+            )
+        except Exception as e:
+            # Serverless indexes 404 on namespaces that were never written
+            print(f"Error deleting namespace for user {user_id} from Pinecone: {e}")
+        
+        try:
+            # Sweep vectors written before per-user namespaces, page by page. Exact
+            # type prefixes: "<uid>_" alone would also match user "<uid>_x"'s vectors
+            for item_type in TIME_FIELDS:
+                await self.delete_by_prefix(user_id, prefix=self.vector_id(user_id, item_type, ''), namespace="")
         except Exception as e:
             print(f"Error deleting user data from Pinecone: {e}")
 
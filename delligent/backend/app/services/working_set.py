@@ -0,0 +1,159 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.firebase_service import firebase_service
+from app.services.user_indexes import UserIndexCache
+from app.services.time_utils import to_epoch
+
+# Re-read the stored document after this long, to pick up writes made by other workers
+INDEX_TTL_SECONDS = 60
+
+# Fields kept per item: what retrieval, prompts and dedup read
+EMAIL_FIELDS = [
+    "emailId", "userId", "subject", "sender", "receivedAt", "priority", "labels", "isRead",
+    "bodyPreview", "summary", "extractedActions", "urgencyScore"
+]
+TASK_FIELDS = [
+    "taskId", "userId", "title", "description", "dueDate", "priority", "status", "category", "tags",
+    "summary", "extractedActions", "urgencyScore"
+]
+ID_FIELDS = {"email": "emailId", "task": "taskId"}
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+def _project(item: Dict, fields: List[str]) -> Dict:
+    return {field: item[field] for field in fields if field in item}
+
+
+class UserWorkingSet:
+    """One user's working set: most recent emails and open tasks (soonest due first)"""
+    
+    def __init__(self, emails: List[Dict], tasks: List[Dict], built_at: float):
+        self.emails = emails
+        self.tasks = tasks
+        self.built_at = built_at
+    
+    @classmethod
+    def build(cls, emails: List[Dict], tasks: List[Dict]) -> "UserWorkingSet":
+        working_set = cls([], [], built_at=time.time())
+        for item_type, items in (("email", emails), ("task", tasks)):
+            for item in items:
+                working_set._insert(item_type, item)
+        working_set._trim()
+        return working_set
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "UserWorkingSet":
+        return cls(
+            data.get('emails', []),
+            data.get('tasks', []),
+            built_at=data['builtAt']
+        )
+    
+    def to_dict(self) -> Dict:
+        return {
+            "emails": self.emails,
+            "tasks": self.tasks,
+            "builtAt": self.built_at
+        }
+    
+    def _insert(self, item_type: str, item: Dict):
+        if item_type == "email":
+            self.emails.append(_project(item, EMAIL_FIELDS))
+        elif item.get('status') != 'completed':
+            self.tasks.append(_project(item, TASK_FIELDS))
+    
+    def _trim(self):
+        """Restore sort order and size caps"""
+        self.emails.sort(key=lambda email: to_epoch(email.get('receivedAt')) or 0, reverse=True)
+        del self.emails[settings.WORKING_SET_EMAILS:]
+        
+        # No due date sorts last; ties go to the higher priority
+        self.tasks.sort(key=lambda task: (
+            to_epoch(task.get('dueDate')) or float("inf"),
+            PRIORITY_ORDER.get(task.get('priority'), 1)
+        ))
+        del self.tasks[settings.WORKING_SET_TASKS:]
+    
+    def remove(self, item_type: str, item_ids: List[str]):
+        id_field = ID_FIELDS[item_type]
+        removed = set(item_ids)
+        items = self.emails if item_type == "email" else self.tasks
+        items[:] = [item for item in items if item.get(id_field) not in removed]
+    
+    def upsert(self, item_type: str, items: List[Dict]):
+        self.remove(item_type, [item.get(ID_FIELDS[item_type]) for item in items])
+        for item in items:
+            self._insert(item_type, item)
+        self._trim()
+
+
+class WorkingSets:
+    """
+    Materialized per-user working set: the recent emails and open tasks chat
+    retrieval reads, denormalized into one Firestore document
+    (`working_sets/{userId}`) and cached in memory. Events are served by the
+    calendar index.
+    
+    Write paths apply changes incrementally, so structured retrieval is one
+    document read (or none) instead of filtered collection queries.
+    The document is rebuilt from the source collections once it is older
+    than WORKING_SET_MAX_AGE_SECONDS, which also repairs any update lost to
+    two workers writing it at once. Loads and rebuilds run in the background.
+    """
+    
+    def __init__(self):
+        self._users: UserIndexCache[UserWorkingSet] = UserIndexCache("working set", self._load, INDEX_TTL_SECONDS)
+    
+    def _usable(self, working_set: Optional[UserWorkingSet]) -> bool:
+        return working_set is not None and time.time() - working_set.built_at < settings.WORKING_SET_MAX_AGE_SECONDS
+    
+    async def _load(self, user_id: str) -> UserWorkingSet:
+        """The stored document, or a fresh build when it is missing or too old"""
+        stored = await firebase_service.get_working_set(user_id)
+        working_set = UserWorkingSet.from_dict(stored) if stored else None
+        if not self._usable(working_set):
+            working_set = await self._build(user_id)
+        return working_set
+    
+    async def _build(self, user_id: str) -> UserWorkingSet:
+        """Build from the source collections (projection reads) and store it"""
+        collection = firebase_service.db.collection
+        emails, tasks = await asyncio.gather(
+            firebase_service.fetch(collection('emails').where('userId', '==', user_id).select(EMAIL_FIELDS)),
+            firebase_service.fetch(collection('tasks').where('userId', '==', user_id).select(TASK_FIELDS))
+        )
+        working_set = UserWorkingSet.build(emails, tasks)
+        await firebase_service.save_working_set(user_id, working_set.to_dict())
+        return working_set
+    
+    async def apply(self, user_id: str, item_type: str, items: List[Dict]):
+        """Apply written emails or tasks and store the updated working set"""
+        working_set = await self._users.get(user_id)
+        working_set.upsert(item_type, items)
+        await firebase_service.save_working_set(user_id, working_set.to_dict())
+    
+    async def remove(self, user_id: str, item_type: str, item_ids: List[str]):
+        working_set = await self._users.get(user_id)
+        working_set.remove(item_type, item_ids)
+        await firebase_service.save_working_set(user_id, working_set.to_dict())
+    
+    async def emails(self, user_id: str, priority: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """Most recent emails, optionally of one priority"""
+        working_set = await self._users.get(user_id)
+        return [
+            dict(email) for email in working_set.emails
+            if not priority or email.get('priority') == priority
+        ][:limit]
+    
+    async def tasks(self, user_id: str, priority: Optional[str] = None, limit: int = 10) -> List[Dict]:
+        """Open tasks, soonest due first, optionally of one priority"""
+        working_set = await self._users.get(user_id)
+        return [
+            dict(task) for task in working_set.tasks
+            if not priority or task.get('priority') == priority
+        ][:limit]
+
+working_sets = WorkingSets()
@@ -0,0 +1,125 @@
+"""
+Quantized Vector Search Benchmark
+Compares exact float32 search with int8 and binary codes, with and without
+full-precision rescoring, on seeded synthetic embeddings
+
+Reports recall@k against exact search, query latency and memory per vector,
+to pick VECTOR_QUANTIZATION and VECTOR_RESCORE_MULTIPLIER for a deployment.
+
+Examples:
+    python scripts/benchmark_quantization.py
+    python scripts/benchmark_quantization.py --n 50000 --k 10 --multiplier 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.quantized_index import QuantizedIndex
+
+
+def clustered_vectors(rng: np.random.Generator, n: int, dim: int, clusters: int = 50) -> np.ndarray:
+    """Embedding-like data: points scattered around topic centroids"""
+    centroids = rng.normal(size=(clusters, dim))
+    assignments = rng.integers(0, clusters, size=n)
+    vectors = centroids[assignments] + rng.normal(scale=0.8, size=(n, dim))
+    return vectors.astype(np.float32)
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_mode(name, search, queries, truth, k):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        found = search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[:k]) & expected)
+    
+    latencies = np.array(latencies)
+    return {
+        "name": name,
+        "recall": hits / (len(queries) * k),
+        "mean_ms": latencies.mean(),
+        "p95_ms": np.percentile(latencies, 95)
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark quantized vector search")
+    parser.add_argument("--n", type=int, default=20000, help="Vectors in the index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--multiplier", type=int, default=4, help="Candidates rescored per result")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    
+    print("=" * 60)
+    print("Employee Work Assistant - Quantized Vector Search Benchmark")
+    print("=" * 60)
+    print(f"Seed: {args.seed}  Vectors: {args.n}  Dim: {args.dim}  k: {args.k}  Multiplier: {args.multiplier}")
+    
+    rng = np.random.default_rng(args.seed)
+    vectors = clustered_vectors(rng, args.n + args.queries, args.dim)
+    corpus, queries = vectors[:args.n], vectors[args.n:]
+    ids = [f"doc_{i}" for i in range(args.n)]
+    
+    corpus_unit = unit(corpus)
+    full = {vector_id: values for vector_id, values in zip(ids, corpus)}
+    
+    def exact(query):
+        scores = corpus_unit @ unit(query[None, :])[0]
+        best = np.argpartition(-scores, args.k - 1)[:args.k]
+        return [ids[i] for i in best[np.argsort(-scores[best])]]
+    
+    def fetch_full(candidate_ids):
+        return {vector_id: full[vector_id] for vector_id in candidate_ids}
+    
+    truth = [set(exact(query)) for query in queries]
+    
+    results = [run_mode("float32 (exact)", exact, queries, truth, args.k)]
+    sizes = {"float32 (exact)": corpus.nbytes / args.n}
+    
+    for mode in ("int8", "binary"):
+        index = QuantizedIndex(mode, dim=args.dim, rescore_multiplier=args.multiplier)
+        index.add([{"id": vector_id, "values": values} for vector_id, values in zip(ids, corpus)])
+        
+        for rescore in (False, True):
+            name = f"{mode} + rescore" if rescore else mode
+            fetch = fetch_full if rescore else None
+            results.append(run_mode(
+                name,
+                lambda query: [match.id for match in index.search(query, args.k, fetch_full=fetch)],
+                queries,
+                truth,
+                args.k
+            ))
+            sizes[name] = index.nbytes / args.n
+    
+    print(f"\n{'mode':<20}{'recall@k':>10}{'mean ms':>10}{'p95 ms':>10}{'bytes/vec':>12}{'ratio':>8}")
+    baseline = sizes["float32 (exact)"]
+    for result in results:
+        size = sizes[result['name']]
+        print(
+            f"{result['name']:<20}{result['recall']:>10.3f}{result['mean_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{size:>12.0f}{baseline / size:>7.1f}x"
+        )
+    
+    print("\n✓ Rescored modes fetch candidates' float32 vectors (from Pinecone in production)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Backfill ingestion-time enrichment (summary, extractedActions, urgencyScore)
+on existing emails and tasks; items already enriched at their current content are skipped
+
+Usage:
+    python scripts/enrich_items.py               # every user in Firestore
+    python scripts/enrich_items.py uid1 uid2     # specific users
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase_service import firebase_service
+from app.services.enrichment_service import enrichment_service
+
+async def main():
+    print("=" * 60)
+    print("Employee Work Assistant - Enrichment Backfill")
+    print("=" * 60)
+    
+    user_ids = sys.argv[1:]
+    if not user_ids:
+        user_ids = [doc.id for doc in firebase_service.db.collection('users').select([]).stream()]
+    
+    total = 0
+    for user_id in user_ids:
+        enriched = await enrichment_service.backfill(user_id)
+        total += enriched
+        print(f"  ✓ {user_id}: enriched {enriched} items")
+    
+    print(f"\n✓ Enriched {total} items for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    asyncio.run(main())
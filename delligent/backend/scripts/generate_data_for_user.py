@@ -14,8 +14,7 @@ import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.embedding_service import embedding_service
-from app.services.vector_service import vector_service
+from app.services.ingestion_pipeline import IngestionPipeline, build_record
 from app.config import settings
 
 # Initialize Firebase
@@ -28,22 +27,10 @@ def init_firebase():
         firebase_admin.initialize_app(cred)
     return firestore.client()
 
-async def generate_data_for_email(db, email: str):
-    """Generate mock data for a user by email"""
-    
-    # Get user by email
-    try:
-        user = auth.get_user_by_email(email)
-        user_id = user.uid
-        print(f"\n✓ Found user: {email}")
-        print(f"  User ID: {user_id}")
-    except Exception as e:
-        print(f"\n✗ Error: Could not find user with email {email}")
-        print(f"  {str(e)}")
-        return
+def mock_records_for_user(user_id: str):
+    """Generate mock email, task and event ingestion records for a user"""
     
     # Generate emails
-    print(f"\nGenerating 20 mock emails for {email}...")
     subjects = [
         "Q1 Budget Review Meeting - Action Required",
         "Project Update - Sprint 23 Completed",
@@ -78,22 +65,17 @@ async def generate_data_for_email(db, email: str):
             "createdAt": datetime.now()
         }
         
-        db.collection('emails').document(email_id).set(email_data)
-        
-        # Add to vector DB
         text = f"Subject: {subject}\nBody: {body}"
-        embedding = await embedding_service.generate_embedding(text)
-        await vector_service.add_email_embedding(
-            email_id=email_id,
+        yield build_record(
+            collection='emails',
+            doc_id=email_id,
             user_id=user_id,
+            data=email_data,
             text=text,
-            embedding=embedding,
             metadata={"priority": email_data["priority"], "sender": "jane@company.com", "receivedAt": email_data["receivedAt"], "labels": email_data["labels"]}
         )
-        print(f"  ✓ Email {i+1}/20")
     
     # Generate tasks
-    print(f"\nGenerating 15 mock tasks for {email}...")
     task_titles = [
         "Complete API documentation",
         "Review pull requests",
@@ -128,22 +110,17 @@ async def generate_data_for_email(db, email: str):
             "completedAt": None
         }
         
-        db.collection('tasks').document(task_id).set(task_data)
-        
-        # Add to vector DB
         text = f"Title: {title}\nDescription: {task_data['description']}"
-        embedding = await embedding_service.generate_embedding(text)
-        await vector_service.add_task_embedding(
-            task_id=task_id,
+        yield build_record(
+            collection='tasks',
+            doc_id=task_id,
             user_id=user_id,
+            data=task_data,
             text=text,
-            embedding=embedding,
             metadata={"priority": task_data["priority"], "status": task_data["status"], "dueDate": task_data["dueDate"]}
         )
-        print(f"  ✓ Task {i+1}/15")
     
     # Generate calendar events
-    print(f"\nGenerating 10 mock calendar events for {email}...")
     event_titles = [
         "Sprint Planning",
         "Daily Standup",
@@ -170,19 +147,34 @@ async def generate_data_for_email(db, email: str):
             "updatedAt": datetime.now()
         }
         
-        db.collection('calendar_events').document(event_id).set(event_data)
-        
-        # Add to vector DB
         text = f"Title: {title}\nDescription: {event_data['description']}"
-        embedding = await embedding_service.generate_embedding(text)
-        await vector_service.add_event_embedding(
-            event_id=event_id,
+        yield build_record(
+            collection='calendar_events',
+            doc_id=event_id,
             user_id=user_id,
+            data=event_data,
             text=text,
-            embedding=embedding,
             metadata={"startTime": event_data["startTime"]}
         )
-        print(f"  ✓ Event {i+1}/10")
+
+async def generate_data_for_email(db, email: str):
+    """Generate mock data for a user by email"""
+    
+    # Get user by email
+    try:
+        user = auth.get_user_by_email(email)
+        user_id = user.uid
+        print(f"\n✓ Found user: {email}")
+        print(f"  User ID: {user_id}")
+    except Exception as e:
+        print(f"\n✗ Error: Could not find user with email {email}")
+        print(f"  {str(e)}")
+        return
+    
+    # Stream all records through the batched ingestion pipeline
+    print(f"\nGenerating 20 emails, 15 tasks and 10 calendar events for {email}...")
+    stats = await IngestionPipeline(db).run(mock_records_for_user(user_id))
+    print(f"✓ Ingested {stats['upserted']} items in {stats['elapsed_seconds']}s")
     
     print("\n" + "=" * 60)
     print("✓ Mock data generation complete!")
@@ -8,14 +8,14 @@ from firebase_admin import credentials, firestore
 from datetime import datetime, timedelta
 import random
 import asyncio
+import itertools
 import sys
 import os
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.embedding_service import embedding_service
-from app.services.vector_service import vector_service
+from app.services.ingestion_pipeline import IngestionPipeline, build_record, email_record
 from app.config import settings
 
 # Initialize Firebase
@@ -30,9 +30,8 @@ def init_firebase():
     return firestore.client()
 
 
-async def generate_mock_emails(db, user_id: str, count: int = 20):
-    """Generate mock emails"""
-    print(f"\nGenerating {count} mock emails...")
+def mock_email_records(user_id: str, count: int = 20):
+    """Generate mock email ingestion records"""
     
     senders = [
         {"name": "Jane Smith", "email": "jane.smith@company.com"},
@@ -93,33 +92,11 @@ async def generate_mock_emails(db, user_id: str, count: int = 20):
             "createdAt": received_at
         }
         
-        # Save to Firestore
-        db.collection('emails').document(email_id).set(email_data)
-        
-        # Generate embedding and save to ChromaDB
-        text_to_embed = f"Subject: {subject}\nFrom: {sender['name']} ({sender['email']})\nBody: {body}"
-        embedding = await embedding_service.generate_embedding(text_to_embed)
-        
-        await vector_service.add_email_embedding(
-            email_id=email_id,
-            user_id=user_id,
-            text=text_to_embed,
-            embedding=embedding,
-            metadata={
-                "priority": priority,
-                "sender": sender['email'],
-                "receivedAt": received_at,
-                "labels": email_data['labels']
-            }
-        )
-        
-        print(f"  Created email: {email_id} - {subject[:50]}...")
-    
-    print(f"✓ Generated {count} emails")
+        # Same text/metadata the email sync uses, so its content hashes match
+        yield email_record(email_data)
 
-async def generate_mock_tasks(db, user_id: str, count: int = 15):
-    """Generate mock tasks"""
-    print(f"\nGenerating {count} mock tasks...")
+def mock_task_records(user_id: str, count: int = 15):
+    """Generate mock task ingestion records"""
     
     task_titles = [
         "Complete API documentation for v2 endpoints",
@@ -164,32 +141,23 @@ async def generate_mock_tasks(db, user_id: str, count: int = 15):
             "completedAt": datetime.now() - timedelta(days=random.randint(1, 5)) if status == "completed" else None
         }
         
-        # Save to Firestore
-        db.collection('tasks').document(task_id).set(task_data)
-        
-        # Generate embedding and save to ChromaDB
         text_to_embed = f"Title: {title}\nDescription: {task_data['description']}\nCategory: {task_data['category']}"
-        embedding = await embedding_service.generate_embedding(text_to_embed)
         
-        await vector_service.add_task_embedding(
-            task_id=task_id,
+        yield build_record(
+            collection='tasks',
+            doc_id=task_id,
             user_id=user_id,
+            data=task_data,
             text=text_to_embed,
-            embedding=embedding,
             metadata={
                 "priority": priority,
                 "status": status,
                 "dueDate": due_date
             }
         )
-        
-        print(f"  Created task: {task_id} - {title[:50]}...")
-    
-    print(f"✓ Generated {count} tasks")
 
-async def generate_mock_events(db, user_id: str, count: int = 10):
-    """Generate mock calendar events"""
-    print(f"\nGenerating {count} mock calendar events...")
+def mock_event_records(user_id: str, count: int = 10):
+    """Generate mock calendar event ingestion records"""
     
     event_titles = [
         "Sprint Planning - Sprint 24",
@@ -225,26 +193,18 @@ async def generate_mock_events(db, user_id: str, count: int = 10):
             "updatedAt": datetime.now() - timedelta(hours=random.randint(1, 24))
         }
         
-        # Save to Firestore
-        db.collection('calendar_events').document(event_id).set(event_data)
-        
-        # Generate embedding and save to ChromaDB
         text_to_embed = f"Title: {title}\nDescription: {event_data['description']}\nLocation: {event_data['location']}"
-        embedding = await embedding_service.generate_embedding(text_to_embed)
         
-        await vector_service.add_event_embedding(
-            event_id=event_id,
+        yield build_record(
+            collection='calendar_events',
+            doc_id=event_id,
             user_id=user_id,
+            data=event_data,
             text=text_to_embed,
-            embedding=embedding,
             metadata={
                 "startTime": start_time
             }
         )
-        
-        print(f"  Created event: {event_id} - {title[:50]}...")
-    
-    print(f"✓ Generated {count} events")
 
 async def create_test_user(db, user_id: str):
     """Create test user document"""
@@ -277,10 +237,15 @@ async def main():
     # Create test user
     await create_test_user(db, user_id)
     
-    # Generate mock data
-    await generate_mock_emails(db, user_id, count=20)
-    await generate_mock_tasks(db, user_id, count=15)
-    await generate_mock_events(db, user_id, count=10)
+    # Generate mock data through the batched ingestion pipeline
+    print("\nGenerating 20 emails, 15 tasks and 10 calendar events...")
+    records = itertools.chain(
+        mock_email_records(user_id, count=20),
+        mock_task_records(user_id, count=15),
+        mock_event_records(user_id, count=10)
+    )
+    stats = await IngestionPipeline(db).run(records)
+    print(f"✓ Ingested {stats['upserted']} items in {stats['elapsed_seconds']}s")
     
     print("\n" + "=" * 60)
     print("✓ Mock data generation complete!")
@@ -0,0 +1,506 @@
+"""
+Synthetic Dataset Generator for load and scale testing
+Streams seeded, reproducible emails, tasks and calendar events for many users
+
+Every user gets an independent random stream derived from (seed, user index),
+so the same seed and anchor date always produce the same dataset, and users can
+be generated in shards on separate machines. Each user's fields are drawn as
+numpy columns in a handful of calls, and records are streamed one user at a
+time, so memory stays flat no matter how many users are generated.
+
+Examples:
+    # 2,000 users (~1M emails) written to JSONL files
+    python scripts/generate_synthetic_dataset.py --users 2000 --output ./synthetic
+
+    # Second half of the same dataset on another machine
+    python scripts/generate_synthetic_dataset.py --users 2000 --shard 1/2 --output ./synthetic
+
+    # Small dataset loaded into Firestore + Pinecone through the ingestion pipeline
+    python scripts/generate_synthetic_dataset.py --users 5 --emails-per-user 200 --target firestore
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIRST_NAMES = [
+    "Jane", "Bob", "Sarah", "Mike", "Priya", "Carlos", "Aisha", "Tom", "Yuki", "Elena",
+    "David", "Fatima", "Liam", "Mei", "Omar", "Grace", "Noah", "Ana", "Ravi", "Zoe",
+]
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Chen", "Patel", "Garcia", "Khan", "Brown", "Tanaka", "Rossi",
+    "Miller", "Ali", "Nguyen", "Lopez", "Kim", "Novak", "Singh", "Murphy", "Cohen", "Silva",
+]
+TEAM_SENDERS = [
+    {"name": "HR Department", "email": "hr@company.com"},
+    {"name": "IT Support", "email": "it-support@company.com"},
+    {"name": "Finance Team", "email": "finance@company.com"},
+    {"name": "Security Office", "email": "security@company.com"},
+]
+
+SUBJECT_TEMPLATES = [
+    "{project} Budget Review - Action Required",
+    "Project Update - Sprint {sprint} Completed",
+    "Benefits Enrollment Reminder - Deadline {weekday}",
+    "Team Lunch {weekday} - RSVP",
+    "Code Review Request - PR #{pr}",
+    "Client Meeting Notes - {client} Follow Up Needed",
+    "Performance Review Schedule",
+    "New Security Policy - Please Review",
+    "Weekly {project} Sync - Agenda",
+    "Urgent: Server Maintenance Tonight",
+    "{client} Proposal Draft v{version}",
+    "Incident Report: {service} Outage",
+    "Design Doc Review - {service}",
+    "Reminder: Timesheet Due {weekday}",
+    "Release {version} Go/No-Go",
+]
+
+# Work vocabulary for bodies, sampled with a Zipf distribution so a few terms
+# dominate like in real mail
+VOCABULARY = (
+    "please review update meeting project team deadline budget report client feedback "
+    "release sprint task action required schedule follow proposal document approval "
+    "status issue bug fix deploy production staging test customer contract invoice "
+    "quarter roadmap priority design api backend frontend database migration security "
+    "policy training onboarding hiring interview offsite agenda notes summary metrics "
+    "dashboard incident outage postmortem latency performance capacity cost forecast "
+    "vendor renewal legal compliance audit access request laptop password vpn ticket "
+    "escalation support launch marketing campaign analytics experiment results slides "
+    "presentation demo workshop retro planning estimate scope risk dependency blocker "
+    "handoff review comments changes merge branch pipeline build failure alert oncall"
+).split()
+
+PROJECTS = ["Atlas", "Phoenix", "Q1", "Q2", "Mercury", "Orion", "Nova", "Helix"]
+CLIENTS = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Hooli", "Vandelay"]
+SERVICES = ["Payments", "Auth", "Search", "Billing", "Notifications", "Gateway"]
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+LABELS = ["work", "urgent", "review", "info", "action-required", "finance", "hr", "client"]
+
+TASK_VERBS = ["Complete", "Review", "Update", "Prepare", "Fix", "Write", "Optimize", "Migrate", "Document", "Plan"]
+TASK_OBJECTS = [
+    "API documentation", "pull requests", "project timeline", "client presentation",
+    "payment processing bug", "unit tests", "dependencies", "user guide", "database queries",
+    "CI/CD pipeline", "quarterly report", "onboarding checklist", "incident postmortem",
+]
+TASK_CATEGORIES = ["development", "documentation", "meeting", "review"]
+TASK_TAGS = ["api", "documentation", "backend", "frontend", "testing", "ops", "security"]
+
+EVENT_TITLES = [
+    "Sprint Planning", "Team Retrospective", "1-on-1 with Manager", "Architecture Review Meeting",
+    "Product Roadmap Discussion", "Client Demo Presentation", "Security Training Session",
+    "Department All-Hands", "Code Review Session", "Interview Panel",
+]
+LOCATIONS = ["Conference Room A", "Conference Room B", "Zoom", "Teams", "Office"]
+
+PRIORITIES = ["high", "medium", "low"]
+TASK_STATUSES = ["completed", "in_progress", "pending"]
+EMAIL_PRIORITY_WEIGHTS = [0.15, 0.55, 0.30]
+TASK_PRIORITY_WEIGHTS = [0.25, 0.50, 0.25]
+
+# Hour-of-day weights for mail arrival (business hours dominate)
+HOUR_WEIGHTS = [
+    0.2, 0.1, 0.1, 0.1, 0.1, 0.2, 0.5, 1.5, 4.0, 6.0, 6.5, 6.0,
+    4.5, 5.5, 6.0, 5.5, 4.5, 3.0, 1.5, 1.0, 0.8, 0.6, 0.4, 0.3,
+]
+
+
+def zipf_probabilities(n: int, exponent: float = 1.1) -> np.ndarray:
+    """Zipf weights over ranks 1..n, normalized for rng.choice(p=...)"""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+VOCAB = np.array(VOCABULARY)
+VOCAB_P = zipf_probabilities(len(VOCABULARY))
+HOUR_P = np.array(HOUR_WEIGHTS) / sum(HOUR_WEIGHTS)
+
+# Thread lengths are geometric (each reply follows with probability 0.45), capped
+THREAD_CONTINUE = 0.45
+MAX_THREAD_LENGTH = 12
+
+
+def user_rng(seed: int, user_index: int) -> np.random.Generator:
+    """Independent, reproducible random stream per user"""
+    return np.random.default_rng([seed, user_index])
+
+
+def pick(rng: np.random.Generator, options: List):
+    return options[int(rng.integers(len(options)))]
+
+
+def make_contacts(rng: np.random.Generator, count: int) -> List[Dict]:
+    """Per-user contact pool; earlier contacts are the frequent correspondents"""
+    firsts = rng.integers(len(FIRST_NAMES), size=count).tolist()
+    lasts = rng.integers(len(LAST_NAMES), size=count).tolist()
+    contacts = [
+        {
+            "name": f"{FIRST_NAMES[first]} {LAST_NAMES[last]}",
+            "email": f"{FIRST_NAMES[first].lower()}.{LAST_NAMES[last].lower()}@company.com"
+        }
+        for first, last in zip(firsts, lasts)
+    ]
+    return contacts + TEAM_SENDERS
+
+
+def sized(rng: np.random.Generator, mean: int) -> int:
+    """Heavy-tailed per-user volume (lognormal around the mean)"""
+    if mean <= 0:
+        return 0
+    sigma = 0.6
+    return max(1, int(rng.lognormal(math.log(mean) - sigma ** 2 / 2, sigma)))
+
+
+def fill_subject(rng: np.random.Generator, template: str) -> str:
+    return template.format(
+        project=pick(rng, PROJECTS),
+        sprint=int(rng.integers(10, 61)),
+        weekday=pick(rng, WEEKDAYS),
+        pr=int(rng.integers(100, 10000)),
+        client=pick(rng, CLIENTS),
+        version=f"{int(rng.integers(1, 6))}.{int(rng.integers(0, 10))}",
+        service=pick(rng, SERVICES)
+    )
+
+
+def word_runs(rng: np.random.Generator, count: int, low: int, high: int) -> List[List[str]]:
+    """`count` runs of low..high Zipf-distributed vocabulary words, drawn in one call"""
+    lengths = rng.integers(low, high + 1, size=count)
+    words = VOCAB[rng.choice(len(VOCAB), size=int(lengths.sum()), p=VOCAB_P)].tolist()
+    runs = []
+    position = 0
+    for length in lengths.tolist():
+        runs.append(words[position:position + length])
+        position += length
+    return runs
+
+
+def make_body(words: List[str], subject: str) -> str:
+    sentences = [" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12)]
+    return f"Hi, regarding {subject.lower()}: " + " ".join(sentences)
+
+
+def sample_without_replacement(rng: np.random.Generator, options: List[str], count: int, low: int, high: int) -> List[List[str]]:
+    """Per row, low..high distinct options in random order"""
+    sizes = rng.integers(low, high + 1, size=count).tolist()
+    order = np.argsort(rng.random((count, len(options))), axis=1).tolist()
+    return [[options[j] for j in row[:size]] for row, size in zip(order, sizes)]
+
+
+def arrival_offsets(rng: np.random.Generator, count: int, anchor: datetime, days: int) -> np.ndarray:
+    """Seconds relative to anchor over the last `days` days, biased to weekdays and business hours, sorted"""
+    day_offsets = np.empty(0, dtype=np.int64)
+    while len(day_offsets) < count:
+        candidates = rng.integers(days, size=2 * count + 16)
+        weekdays = (anchor.weekday() - candidates) % 7
+        # Weekend mail is ~5x rarer
+        keep = (weekdays < 5) | (rng.random(len(candidates)) < 0.2)
+        day_offsets = np.concatenate([day_offsets, candidates[keep]])
+    day_offsets = day_offsets[:count]
+
+    hours = rng.choice(24, size=count, p=HOUR_P)
+    minutes = rng.integers(60, size=count)
+    seconds = rng.integers(60, size=count)
+    return np.sort(-day_offsets * 86400 + hours * 3600 + minutes * 60 + seconds)
+
+
+def generate_user_emails(rng: np.random.Generator, user_id: str, count: int, anchor: datetime, days: int) -> Iterator[Dict]:
+    contacts = make_contacts(rng, int(rng.integers(15, 61)))
+
+    # Columns for all of the user's emails at once
+    offsets = arrival_offsets(rng, count, anchor, days)
+    senders = rng.choice(len(contacts), size=count, p=zipf_probabilities(len(contacts), exponent=1.3)).tolist()
+    priorities = rng.choice(len(PRIORITIES), size=count, p=EMAIL_PRIORITY_WEIGHTS).tolist()
+    age_days = -offsets // 86400
+    # Older mail is much more likely to have been read
+    read = (rng.random(count) < np.minimum(0.98, 0.3 + age_days * 0.15)).tolist()
+    starred = (rng.random(count) < 0.03).tolist()
+    labels = sample_without_replacement(rng, LABELS, count, 1, 3)
+    bodies = word_runs(rng, count, 25, 120)
+
+    # Consecutive emails form threads: thread number and position within it
+    lengths = np.minimum(rng.geometric(1 - THREAD_CONTINUE, size=count), MAX_THREAD_LENGTH)
+    threads = np.repeat(np.arange(count), lengths)[:count]
+    starts = np.concatenate([[0], np.cumsum(lengths)])[threads]
+    positions = (np.arange(count) - starts).tolist()
+    threads = threads.tolist()
+    thread_subjects = [fill_subject(rng, pick(rng, SUBJECT_TEMPLATES)) for _ in range(threads[-1] + 1)] if count else []
+
+    for i, offset in enumerate(offsets.tolist()):
+        thread_subject = thread_subjects[threads[i]]
+        subject = thread_subject if positions[i] == 0 else f"Re: {thread_subject}"
+        body = make_body(bodies[i], thread_subject)
+        received_at = anchor + timedelta(seconds=offset)
+        
+        yield {
+            "emailId": f"email_{user_id}_{i + 1:07d}",
+            "userId": user_id,
+            "threadId": f"thread_{user_id}_{threads[i] + 1:06d}",
+            "subject": subject,
+            "sender": contacts[senders[i]],
+            "body": body,
+            "bodyPreview": body[:150] + "...",
+            "receivedAt": received_at,
+            "priority": PRIORITIES[priorities[i]],
+            "isRead": read[i],
+            "isStarred": starred[i],
+            "labels": labels[i],
+            "extractedActions": [],
+            "createdAt": received_at
+        }
+
+
+def generate_user_tasks(rng: np.random.Generator, user_id: str, count: int, anchor: datetime) -> Iterator[Dict]:
+    # Columns for all of the user's tasks at once (offsets in hours from anchor)
+    verbs = rng.integers(len(TASK_VERBS), size=count).tolist()
+    objects = rng.integers(len(TASK_OBJECTS), size=count).tolist()
+    priorities = rng.choice(len(PRIORITIES), size=count, p=TASK_PRIORITY_WEIGHTS).tolist()
+    created = -(rng.exponential(20, size=count) * 24 + rng.integers(24, size=count))
+    # Due dates cluster in the next two weeks with a tail of overdue work
+    due = rng.normal(5, 7, size=count) * 24 + rng.integers(8, 18, size=count)
+    overdue = due < 0
+    # completed / in_progress / pending, weighted by whether the task is overdue
+    draws = rng.random(count)
+    statuses = np.where(
+        overdue,
+        np.select([draws < 0.6, draws < 0.85], [0, 1], 2),
+        np.select([draws < 0.15, draws < 0.55], [0, 1], 2)
+    ).tolist()
+    completed = np.minimum(0, created + rng.uniform(0.5, 10, size=count) * 24)
+    updated = np.maximum(created, -rng.integers(1, 96, size=count).astype(float))
+    categories = rng.integers(len(TASK_CATEGORIES), size=count).tolist()
+    tags = sample_without_replacement(rng, TASK_TAGS, count, 1, 3)
+    estimated = rng.integers(1, 17, size=count).tolist()
+    actual = rng.integers(1, 17, size=count).tolist()
+    words = word_runs(rng, count, 8, 30)
+
+    created, due, completed, updated = (column.tolist() for column in (created, due, completed, updated))
+    for i in range(count):
+        title = f"{TASK_VERBS[verbs[i]]} {TASK_OBJECTS[objects[i]]}"
+        status = TASK_STATUSES[statuses[i]]
+        
+        yield {
+            "taskId": f"task_{user_id}_{i + 1:07d}",
+            "userId": user_id,
+            "title": title,
+            "description": f"{title}. " + " ".join(words[i]),
+            "dueDate": anchor + timedelta(hours=due[i]),
+            "priority": PRIORITIES[priorities[i]],
+            "status": status,
+            "category": TASK_CATEGORIES[categories[i]],
+            "tags": tags[i],
+            "estimatedHours": estimated[i],
+            "actualHours": actual[i] if status == "completed" else 0,
+            "createdAt": anchor + timedelta(hours=created[i]),
+            "updatedAt": anchor + timedelta(hours=updated[i]),
+            "completedAt": anchor + timedelta(hours=completed[i]) if status == "completed" else None
+        }
+
+
+def generate_user_events(rng: np.random.Generator, user_id: str, count: int, anchor: datetime, days: int) -> Iterator[Dict]:
+    index = 0
+    start_day = anchor - timedelta(days=days // 2)
+
+    # Recurring weekday standup makes up a large share of real calendars
+    skips = rng.random(days).tolist()
+    for offset in range(days):
+        if index >= count:
+            return
+        day = start_day + timedelta(days=offset)
+        if day.weekday() >= 5 or skips[offset] < 0.5:
+            continue
+        index += 1
+        start_time = day.replace(hour=9, minute=30)
+        yield make_event(rng, user_id, index, "Daily Standup", start_time, start_time + timedelta(minutes=15), anchor)
+
+    remaining = count - index
+    day_offsets = rng.integers(days, size=remaining).tolist()
+    hours = rng.integers(9, 17, size=remaining).tolist()
+    half_hours = rng.integers(2, size=remaining).tolist()
+    durations = rng.choice([30, 60, 90, 120], size=remaining, p=[0.4, 0.4, 0.1, 0.1]).tolist()
+    titles = rng.integers(len(EVENT_TITLES), size=remaining).tolist()
+    for i in range(remaining):
+        index += 1
+        start_time = start_day + timedelta(days=day_offsets[i], hours=hours[i], minutes=30 * half_hours[i])
+        end_time = start_time + timedelta(minutes=durations[i])
+        yield make_event(rng, user_id, index, EVENT_TITLES[titles[i]], start_time, end_time, anchor)
+
+
+def make_event(
+    rng: np.random.Generator,
+    user_id: str,
+    index: int,
+    title: str,
+    start_time: datetime,
+    end_time: datetime,
+    anchor: datetime
+) -> Dict:
+    location = pick(rng, LOCATIONS)
+    return {
+        "eventId": f"cal_{user_id}_{index:07d}",
+        "userId": user_id,
+        "title": title,
+        "description": f"Description for {title}",
+        "startTime": start_time,
+        "endTime": end_time,
+        "location": location,
+        "meetingLink": "https://zoom.us/j/123456789" if location in ("Zoom", "Teams") else None,
+        "status": "confirmed",
+        "createdAt": start_time - timedelta(days=int(rng.integers(1, 22))),
+        "updatedAt": min(anchor, start_time) - timedelta(hours=int(rng.integers(1, 25)))
+    }
+
+
+def user_ids_for_shard(users: int, shard: Tuple[int, int]) -> Iterator[Tuple[int, str]]:
+    shard_index, shard_count = shard
+    for user_index in range(shard_index, users, shard_count):
+        yield user_index, f"synthetic_user_{user_index:06d}"
+
+
+def generate_dataset(args) -> Iterator[Tuple[str, Dict]]:
+    """Yield (collection, document) pairs, one user at a time"""
+    for user_index, user_id in user_ids_for_shard(args.users, args.shard):
+        rng = user_rng(args.seed, user_index)
+
+        email_count = sized(rng, args.emails_per_user)
+        task_count = sized(rng, args.tasks_per_user)
+        event_count = sized(rng, args.events_per_user)
+
+        for email in generate_user_emails(rng, user_id, email_count, args.anchor, args.days):
+            yield "emails", email
+        for task in generate_user_tasks(rng, user_id, task_count, args.anchor):
+            yield "tasks", task
+        for event in generate_user_events(rng, user_id, event_count, args.anchor, args.days):
+            yield "calendar_events", event
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def write_jsonl(args):
+    """Stream the dataset into one JSONL file per collection"""
+    os.makedirs(args.output, exist_ok=True)
+    suffix = f".shard{args.shard[0]}of{args.shard[1]}" if args.shard[1] > 1 else ""
+    extension = ".jsonl.gz" if args.gzip else ".jsonl"
+    opener = gzip.open if args.gzip else open
+
+    files = {
+        collection: opener(os.path.join(args.output, f"{collection}{suffix}{extension}"), "wt", encoding="utf-8")
+        for collection in ("emails", "tasks", "calendar_events")
+    }
+    counts = {collection: 0 for collection in files}
+
+    try:
+        for collection, document in generate_dataset(args):
+            files[collection].write(json.dumps(document, default=json_default) + "\n")
+            counts[collection] += 1
+            total = sum(counts.values())
+            if total % 100000 == 0:
+                print(f"  ✓ {total} records written")
+    finally:
+        for handle in files.values():
+            handle.close()
+
+    manifest = {
+        "seed": args.seed,
+        "anchor": args.anchor.isoformat(),
+        "users": args.users,
+        "shard": list(args.shard),
+        "days": args.days,
+        "counts": counts
+    }
+    with open(os.path.join(args.output, f"manifest{suffix}.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+
+    return counts
+
+
+def init_firebase():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    from app.config import settings
+
+    if not firebase_admin._apps:
+        if os.path.exists(settings.FIREBASE_SERVICE_ACCOUNT_PATH):
+            cred = credentials.Certificate(settings.FIREBASE_SERVICE_ACCOUNT_PATH)
+        else:
+            raise FileNotFoundError(f"Firebase service account file not found: {settings.FIREBASE_SERVICE_ACCOUNT_PATH}")
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+async def write_firestore(args):
+    """Load the dataset into Firestore + Pinecone through the ingestion pipeline"""
+    # Imported lazily so the jsonl target works without cloud credentials
+    from app.services.ingestion_pipeline import IngestionPipeline, email_record, task_record, event_record
+
+    record_builders = {"emails": email_record, "tasks": task_record, "calendar_events": event_record}
+
+    def records():
+        for collection, document in generate_dataset(args):
+            yield record_builders[collection](document)
+
+    db = init_firebase()
+    return await IngestionPipeline(db, batch_size=100).run(records())
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    index, count = value.split("/")
+    index, count = int(index), int(count)
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard must look like i/n with 0 <= i < n")
+    return index, count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic dataset")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--emails-per-user", type=int, default=500, help="Mean emails per user")
+    parser.add_argument("--tasks-per-user", type=int, default=60, help="Mean tasks per user")
+    parser.add_argument("--events-per-user", type=int, default=80, help="Mean calendar events per user")
+    parser.add_argument("--days", type=int, default=90, help="History window in days")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--anchor",
+        type=datetime.fromisoformat,
+        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+        help="Date the dataset is relative to (ISO format, default: today)"
+    )
+    parser.add_argument("--shard", type=parse_shard, default=(0, 1), help="Generate only shard i/n of the users")
+    parser.add_argument("--target", choices=["jsonl", "firestore"], default="jsonl")
+    parser.add_argument("--output", default="./synthetic_data", help="Output directory for jsonl target")
+    parser.add_argument("--gzip", action="store_true", help="Compress jsonl output")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    print("=" * 60)
+    print("Employee Work Assistant - Synthetic Dataset Generator")
+    print("=" * 60)
+    print(f"Seed: {args.seed}  Anchor: {args.anchor.isoformat()}  Users: {args.users}  Shard: {args.shard[0]}/{args.shard[1]}")
+
+    if args.target == "jsonl":
+        counts = write_jsonl(args)
+        print(f"\n✓ Wrote {counts} to {args.output}")
+    else:
+        stats = asyncio.run(write_firestore(args))
+        print(f"\n✓ Ingested {stats['upserted']} items in {stats['elapsed_seconds']}s")
+
+if __name__ == "__main__":
+    main()
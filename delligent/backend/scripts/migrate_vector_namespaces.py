@@ -0,0 +1,38 @@
+"""
+Move vectors from the shared default Pinecone namespace into per-user namespaces
+Run once after upgrading to per-user namespaces
+
+Usage:
+    python scripts/migrate_vector_namespaces.py               # every user in Firestore
+    python scripts/migrate_vector_namespaces.py uid1 uid2     # specific users
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase_service import firebase_service
+from app.services.vector_service import vector_service
+
+async def main():
+    print("=" * 60)
+    print("Employee Work Assistant - Vector Namespace Migration")
+    print("=" * 60)
+    
+    user_ids = sys.argv[1:]
+    if not user_ids:
+        user_ids = [doc.id for doc in firebase_service.db.collection('users').select([]).stream()]
+    
+    total = 0
+    for user_id in user_ids:
+        moved = await vector_service.migrate_user_to_namespace(user_id)
+        total += moved
+        print(f"  ✓ {user_id}: moved {moved} vectors")
+    
+    print(f"\n✓ Migrated {total} vectors for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    asyncio.run(main())
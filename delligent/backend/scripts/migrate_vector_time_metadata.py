@@ -0,0 +1,38 @@
+"""
+Backfill numeric time metadata (receivedAtTs, dueDateTs, startTimeTs) on existing vectors
+Needed for time-range filtered vector search; run after migrate_vector_namespaces.py
+
+Usage:
+    python scripts/migrate_vector_time_metadata.py               # every user in Firestore
+    python scripts/migrate_vector_time_metadata.py uid1 uid2     # specific users
+"""
+
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.firebase_service import firebase_service
+from app.services.vector_service import vector_service
+
+async def main():
+    print("=" * 60)
+    print("Employee Work Assistant - Vector Time Metadata Backfill")
+    print("=" * 60)
+    
+    user_ids = sys.argv[1:]
+    if not user_ids:
+        user_ids = [doc.id for doc in firebase_service.db.collection('users').select([]).stream()]
+    
+    total = 0
+    for user_id in user_ids:
+        updated = await vector_service.backfill_time_metadata(user_id)
+        total += updated
+        print(f"  ✓ {user_id}: updated {updated} vectors")
+    
+    print(f"\n✓ Backfilled {total} vectors for {len(user_ids)} users")
+
+if __name__ == "__main__":
+    asyncio.run(main())